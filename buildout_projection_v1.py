@@ -0,0 +1,193 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from reverse_geocode_v1 import canonical_country
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Projection window (first day of the first and last month); defaults to
+# five years back and ten years ahead of the current month
+PROJECTION_START = os.environ.get("PROJECTION_START", "")
+PROJECTION_END = os.environ.get("PROJECTION_END", "")
+
+# A facility with a construction date but no readyForService date is assumed
+# to come online this many months after construction starts
+CONSTRUCTION_MONTHS = 24
+
+# Scenarios: how capacity ramps up after readyForService, how much of it is
+# used, and how much water each kWh of IT load consumes (WUE, L/kWh).
+#   ramp: "step" (full capacity at once), "linear" or "s_curve" over ramp_months
+#   delay_months: shift every readyForService date (e.g. construction slippage)
+#   undated: "existing" counts facilities without any date as already online,
+#            "drop" leaves them out
+SCENARIOS = [
+    {"name": "baseline", "ramp": "s_curve", "ramp_months": 24, "delay_months": 0,
+     "utilisation": 0.6, "wue_l_per_kwh": 1.8, "undated": "existing"},
+    {"name": "fast_ramp", "ramp": "linear", "ramp_months": 12, "delay_months": 0,
+     "utilisation": 0.75, "wue_l_per_kwh": 1.8, "undated": "existing"},
+    {"name": "delayed_efficient", "ramp": "s_curve", "ramp_months": 36, "delay_months": 12,
+     "utilisation": 0.6, "wue_l_per_kwh": 1.2, "undated": "existing"},
+]
+
+# Columns to project per group (admin-1 only exists after reverse geocoding;
+# "country" is grouped on 'canonical_country', so each country appears once)
+GROUP_COLUMNS = ["country", "geo_admin1"]
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def facility_dates(df, column):
+    """
+    A datetime Series for 'column' whatever stage the frame comes from: the
+    flattened '<column>_dt' column, converted datetimes, epoch milliseconds
+    or date strings from a reloaded CSV. Unparseable values -> NaT.
+    """
+    if f"{column}_dt" in df.columns:
+        return pd.to_datetime(df[f"{column}_dt"], errors="coerce")
+    if column not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    values = df[column]
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.notna().any():
+        numeric = numeric.where(numeric.abs() <= pd.Timestamp.max.value // 10**6)
+        return pd.to_datetime(numeric, unit="ms", errors="coerce")
+    return pd.to_datetime(values, errors="coerce")
+
+def month_numbers(dates):
+    """Months since year 0 (year * 12 + month - 1) as float, NaN for NaT."""
+    dates = pd.to_datetime(dates, errors="coerce")
+    return np.where(dates.notna(), dates.dt.year * 12 + dates.dt.month - 1, np.nan).astype(float)
+
+def ramp_curve(kind, months):
+    """Fraction of capacity online k = 0, 1, ... months after readyForService (ends at 1.0)."""
+    months = max(int(months), 1)
+    x = np.minimum(np.arange(1, months + 1) / months, 1.0)
+    if kind == "step":
+        return np.ones(1)
+    if kind == "linear":
+        return x
+    if kind == "s_curve":
+        return x * x * (3 - 2 * x)  # smoothstep
+    raise ValueError(f"Unknown ramp curve: {kind}")
+
+def project_capacity(group_codes, n_groups, online_month, power, n_months, ramp):
+    """
+    Monthly capacity online per group, as an (n_groups, n_months) array.
+    1) Each facility's capacity lands in its group's arrival bin for its
+       online month (np.bincount over group * n_months + month).
+    2) The ramp is applied as a short convolution with the curve's monthly
+       increments, then a cumulative sum over months turns increments into
+       capacity online. Facilities that went online before the window
+       arrive in bin 0 already fully ramped.
+    """
+    pad = len(ramp)  # months before the window in which a ramp can still be in progress
+    months = np.clip(online_month + pad, 0, n_months + pad)
+    keep = months < n_months + pad
+    arrivals = np.bincount(
+        group_codes[keep] * (n_months + pad) + months[keep].astype(np.int64),
+        weights=power[keep], minlength=n_groups * (n_months + pad),
+    ).reshape(n_groups, n_months + pad)
+    increments = np.diff(np.concatenate(([0.0], ramp)))
+    ramped = np.zeros_like(arrivals)
+    for k, step in enumerate(increments):
+        ramped[:, k:] += arrivals[:, :arrivals.shape[1] - k] * step
+    return np.cumsum(ramped, axis=1)[:, pad:]
+
+def project_buildout(df, scenarios=SCENARIOS, start=None, end=None, group_columns=GROUP_COLUMNS):
+    """
+    Project monthly capacity (MW) and water demand (m3) per country (and
+    admin-1 region, when geocoded) for every scenario. Returns a long
+    DataFrame: scenario, group_by, group, month, capacity_mw,
+    new_capacity_mw, water_m3. Facilities without gross_max_power are
+    left out.
+    """
+    today = pd.Timestamp.now().to_period("M").to_timestamp()
+    start = pd.Timestamp(start or PROJECTION_START or today - pd.DateOffset(years=5)).to_period("M").to_timestamp()
+    end = pd.Timestamp(end or PROJECTION_END or today + pd.DateOffset(years=10)).to_period("M").to_timestamp()
+    months = pd.date_range(start, end, freq="MS")
+    n_months = len(months)
+    hours = (months.days_in_month * 24).to_numpy(dtype=float)
+    # 1) Per-facility arrays, computed once for every scenario
+    # gross_max_power is in kW in the feed; projections are in MW
+    power = pd.to_numeric(df.get("gross_max_power"), errors="coerce").to_numpy(dtype=float, na_value=np.nan) / 1000 \
+        if "gross_max_power" in df.columns else np.full(len(df), np.nan)
+    ready = month_numbers(facility_dates(df, "readyForService"))
+    construction = month_numbers(facility_dates(df, "construction_date"))
+    ready = np.where(np.isnan(ready), construction + CONSTRUCTION_MONTHS, ready)
+    undated = np.isnan(ready)
+    has_power = np.isfinite(power) & (power > 0)
+    first_month = start.year * 12 + start.month - 1
+    groupings = []
+    for column in group_columns:
+        if column == "country" and ("country" in df.columns or "geo_country" in df.columns):
+            values = canonical_country(df)
+        elif column in df.columns:
+            values = df[column]
+        else:
+            continue
+        codes, labels = pd.factorize(values.astype("string").fillna("Unknown"))
+        groupings.append((column, codes.astype(np.int64), np.asarray(labels, dtype=object)))
+    frames = []
+    # 2) Every scenario x grouping: binned arrivals -> ramp -> cumulative capacity -> water
+    for scenario in scenarios:
+        ramp = ramp_curve(scenario.get("ramp", "s_curve"), scenario.get("ramp_months", 24))
+        online = ready - first_month + scenario.get("delay_months", 0)
+        if scenario.get("undated", "existing") == "existing":
+            online = np.where(undated, -np.inf, online)
+            use = has_power
+        else:
+            use = has_power & ~undated
+        online = np.where(np.isinf(online), -len(ramp) - 1, online)
+        for column, codes, labels in groupings:
+            capacity = project_capacity(codes[use], len(labels), online[use], power[use], n_months, ramp)
+            # MW x 1000 kW x utilisation x hours x L/kWh / 1000 L per m3
+            water = capacity * scenario.get("utilisation", 0.6) * hours * scenario.get("wue_l_per_kwh", 1.8)
+            new_capacity = np.diff(capacity, axis=1, prepend=0.0)
+            new_capacity[:, 0] = 0.0
+            active = np.flatnonzero(capacity[:, -1] > 0)
+            n_active = len(active)
+            frames.append(pd.DataFrame({
+                "scenario": scenario["name"],
+                "group_by": column,
+                "group": np.repeat(labels[active], n_months),
+                "month": np.tile(months.strftime("%Y-%m"), n_active),
+                "capacity_mw": capacity[active].ravel().round(3),
+                "new_capacity_mw": new_capacity[active].ravel().round(3),
+                "water_m3": water[active].ravel().round(1),
+            }))
+    columns = ["scenario", "group_by", "group", "month", "capacity_mw", "new_capacity_mw", "water_m3"]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def project_stage(df, path="datacenter_buildout_projection.csv"):
+    """Pipeline stage: write the projection for 'df' and return the path."""
+    project_buildout(df).to_csv(path, index=False)
+    return path
+
+##################################################
+# 4) Run the Projection
+##################################################
+
+# Usage: python buildout_projection_v1.py [datacenter_map_data.csv]
+#   PROJECTION_START=2020-01 PROJECTION_END=2040-12 to change the window
+if __name__ == "__main__":
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else "datacenter_map_data.csv"
+    facilities = pd.read_csv(snapshot_path, low_memory=False)
+    start_time = time.perf_counter()
+    projection = project_buildout(facilities)
+    print(f"Projected {len(facilities)} facilities x {len(SCENARIOS)} scenarios in {time.perf_counter() - start_time:.3f}s")
+    projection.to_csv("datacenter_buildout_projection.csv", index=False)
+    latest = projection[(projection["group_by"] == "country") & (projection["month"] == projection["month"].max())]
+    print(latest.sort_values("water_m3", ascending=False).head(20).to_string(index=False))
@@ -2,10 +2,15 @@
 # 1) Import Packages
 ##################################################
 
-import requests
 import pandas as pd
 import openpyxl
 import json
+import os
+
+import http_transport_v1 as http
+from facility_validation_v1 import QUARANTINE, QUARANTINE_PATH, REPORT_PATH, validate_stage
+from profiling_v1 import profile_stage
+from reverse_geocode_v1 import ADMIN1_BOUNDARIES, COUNTRY_BOUNDARIES, geocode_stage
 
 ##################################################
 # 2) Define Functions
@@ -50,6 +55,8 @@ def convert_data_types(df: pd.DataFrame) -> pd.DataFrame:
     for col in time_stamp_cols:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
+            # Out-of-range values (past year 2262) -> NaT, as in flatten_features
+            df[col] = df[col].where(df[col].abs() <= pd.Timestamp.max.value // 10**6)
             df[col] = pd.to_datetime(df[col], unit="ms", errors="coerce")
     # 5) Date/time columns (string format -> datetime)
     #    (If you have columns like 'readyForService_dmy' or 'construction_date_dmy')
@@ -69,89 +76,115 @@ def convert_data_types(df: pd.DataFrame) -> pd.DataFrame:
         df["id"] = df["id"].astype("string")
     return df
 
+def fetch_world_data(url):
+    """Download the map.datacente.rs GeoJSON feed (raises on a failed request)."""
+    response = http.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"Request failed with status code {response.status_code}")
+    return response.json()   # Parse JSON response
+
+def flatten_features(data: dict) -> pd.DataFrame:
+    """
+    Flatten the feed's GeoJSON features into one row per facility: geometry
+    columns, every property (with the 'certs' dict spread into certs_* columns)
+    and the readyForService/construction_date datetime and dd-mm-yyyy columns.
+    """
+    # We know the top-level JSON has a list at data['features'].
+    features = data["features"]
+    # 1) Figure out all possible top-level property keys (including certs) across all features
+    all_property_keys = set()
+    for feat in features:
+        prop_dict = feat.get("properties", {})
+        for key, val in prop_dict.items():
+            if key == "certs" and isinstance(val, dict):
+                # Flatten out the 'certs' dict keys as separate columns
+                all_property_keys.update(f"certs_{k}" for k in val.keys())
+            else:
+                all_property_keys.add(key)
+    # We’ll also collect columns for geometry info
+    geo_cols = ["geometry_type", "coord_x", "coord_y", "feature_type"]
+    all_columns = list(geo_cols) + sorted(all_property_keys)
+    # 2) Build a "row" for each feature
+    rows = []
+    for feat in features:
+        row = {}
+        # Geometry data
+        geom = feat.get("geometry", {})
+        row["geometry_type"] = geom.get("type")  # e.g., "Point"
+        coords = geom.get("coordinates", [None, None])
+        # You can rename these to latitude/longitude if you prefer
+        row["coord_x"] = coords[0]
+        row["coord_y"] = coords[1]
+        # The "type" key of the Feature itself
+        row["feature_type"] = feat.get("type")
+        # Properties
+        prop_dict = feat.get("properties", {})
+        for key, val in prop_dict.items():
+            if key == "certs" and isinstance(val, dict):
+                # Flatten each certificate key
+                for cert_key, cert_val in val.items():
+                    row[f"certs_{cert_key}"] = cert_val
+            else:
+                row[key] = val
+        # Fill missing columns with None
+        for col in all_columns:
+            row.setdefault(col, None)
+        rows.append(row)
+    # 3) Create a DataFrame with every column
+    df = pd.DataFrame(rows, columns=all_columns)
+    # 4) Convert columns to datetime (assuming milliseconds since epoch)
+    df["readyForService"] = pd.to_numeric(df["readyForService"], errors="coerce") # Convert from string to numeric (integers); non-numeric become NaN
+    df["construction_date"] = pd.to_numeric(df["construction_date"], errors="coerce")
+    # Timestamps outside the datetime64[ns] range (years 1677-2262, e.g. a value with a
+    # stray extra digit) become NaT rather than breaking strftime below
+    max_ms = pd.Timestamp.max.value // 10**6
+    df["readyForService_dt"] = pd.to_datetime(df["readyForService"].where(df["readyForService"].abs() <= max_ms), unit="ms", errors="coerce") # Now convert numeric values (ms since epoch) to datetime
+    df["construction_date_dt"] = pd.to_datetime(df["construction_date"].where(df["construction_date"].abs() <= max_ms), unit="ms", errors="coerce")
+    # 5) Format the date columns as dd-mm-yyyy strings
+    df["readyForService_dmy"] = df["readyForService_dt"].dt.strftime("%d-%m-%Y")
+    df["construction_date_dmy"] = df["construction_date_dt"].dt.strftime("%d-%m-%Y")
+    return df
+
 ##################################################
 # 3) Accessing Web Data
 ##################################################
 
-url = "https://map.datacente.rs/api/geo/world"
+# DATACENTRES_BASE_URL can point at a local stand-in (see mock_upstream_server_v1.py)
+BASE_URL = os.environ.get("DATACENTRES_BASE_URL", "https://map.datacente.rs")
+url = BASE_URL + "/api/geo/world"
 # Note: Alternative dataset (n=5238) is available at: https://www.datacenters.com/locations
 
-response = requests.get(url)
-
-if response.status_code == 200:
-    data = response.json()   # Parse JSON response
+if __name__ == "__main__":
+    # Set PROFILE_DIR to profile each step below (see profiling_v1.py)
+    with profile_stage("datacentres_fetch"):
+        data = fetch_world_data(url)
     print(data)
-else:
-    print(f"Request failed with status code {response.status_code}")
 
-##################################################
-# 3) Extracting Features/Data
-##################################################
+    ##################################################
+    # 3) Extracting Features/Data
+    ##################################################
+
+    # 1) Flatten the features into one row per facility (including date columns)
+    with profile_stage("datacentres_flatten"):
+        df = flatten_features(data)
+
+    # 2) Check coordinates, capacities, ids and dates before they are coerced
+    #    (writes the violation report; VALIDATION_QUARANTINE=1 drops bad rows)
+    with profile_stage("datacentres_validate"):
+        df = validate_stage(df, REPORT_PATH, QUARANTINE_PATH, QUARANTINE)
+
+    # 3) Check/fill 'country' from the coordinates (when a local boundary file exists)
+    with profile_stage("datacentres_geocode"):
+        df = geocode_stage(df, COUNTRY_BOUNDARIES, ADMIN1_BOUNDARIES)
+
+    # 4) Convert all data types
+    with profile_stage("datacentres_convert"):
+        df = convert_data_types(df)
+
+    # 5) Optionally, view a subset of the created DataFrame
+    print(df.head()) # Print top 10 rows
 
-# We know the top-level JSON has a list at data['features'].
-features = data["features"]
-
-# 1) Figure out all possible top-level property keys (including certs) across all features
-all_property_keys = set()
-for feat in features:
-    prop_dict = feat.get("properties", {})
-    for key, val in prop_dict.items():
-        if key == "certs" and isinstance(val, dict):
-            # Flatten out the 'certs' dict keys as separate columns
-            all_property_keys.update(f"certs_{k}" for k in val.keys())
-        else:
-            all_property_keys.add(key)
-
-# We’ll also collect columns for geometry info
-geo_cols = ["geometry_type", "coord_x", "coord_y", "feature_type"]
-all_columns = list(geo_cols) + sorted(all_property_keys)
-
-# 2) Build a "row" for each feature
-rows = []
-for feat in features:
-    row = {}
-    # Geometry data
-    geom = feat.get("geometry", {})
-    row["geometry_type"] = geom.get("type")  # e.g., "Point"
-    coords = geom.get("coordinates", [None, None])
-    # You can rename these to latitude/longitude if you prefer
-    row["coord_x"] = coords[0]
-    row["coord_y"] = coords[1]
-    # The "type" key of the Feature itself
-    row["feature_type"] = feat.get("type")
-    # Properties
-    prop_dict = feat.get("properties", {})
-    for key, val in prop_dict.items():
-        if key == "certs" and isinstance(val, dict):
-            # Flatten each certificate key
-            for cert_key, cert_val in val.items():
-                row[f"certs_{cert_key}"] = cert_val
-        else:
-            row[key] = val
-    # Fill missing columns with None
-    for col in all_columns:
-        row.setdefault(col, None)
-    rows.append(row)
-
-# 3) Create a DataFrame with every column
-df = pd.DataFrame(rows, columns=all_columns)
-
-# 4) Convert columns to datetime (assuming milliseconds since epoch)
-df["readyForService"] = pd.to_numeric(df["readyForService"], errors="coerce") # Convert from string to numeric (integers); non-numeric become NaN
-df["construction_date"] = pd.to_numeric(df["construction_date"], errors="coerce")
-df["readyForService_dt"] = pd.to_datetime(df["readyForService"], unit="ms", errors="coerce") # Now convert numeric values (ms since epoch) to datetime
-df["construction_date_dt"] = pd.to_datetime(df["construction_date"], unit="ms", errors="coerce")
-
-# 5) Format the date columns as dd-mm-yyyy strings
-df["readyForService_dmy"] = df["readyForService_dt"].dt.strftime("%d-%m-%Y")
-df["construction_date_dmy"] = df["construction_date_dt"].dt.strftime("%d-%m-%Y")
-
-# 6) Convert all data types
-df = convert_data_types(df)
-
-# 7) Optionally, view a subset of the created DataFrame
-print(df.head()) # Print top 10 rows
-
-# 8) Optionally, save to CSV or XLSX
-df.to_csv("datacenter_map_data.csv", index=False)
-#df.to_excel("datacenter_map_data.xlsx", index=False)
\ No newline at end of file
+    # 6) Optionally, save to CSV or XLSX
+    with profile_stage("datacentres_write"):
+        df.to_csv("datacenter_map_data.csv", index=False)
+    #df.to_excel("datacenter_map_data.xlsx", index=False)
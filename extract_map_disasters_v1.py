@@ -1,38 +1,550 @@
+import asyncio
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+import shutil
+from datetime import datetime, timezone
+from functools import lru_cache
+
 import requests
 
-BASE_URL = 'https://sppims-dams.dsdiqlgp.qld.gov.au/api/v1/spp'
+import http_transport_v1 as http
+from profiling_v1 import profile_stage
+
+# SPP_BASE_URL can point the script at a local stand-in server (see mock_upstream_server_v1.py)
+BASE_URL = os.environ.get("SPP_BASE_URL", 'https://sppims-dams.dsdiqlgp.qld.gov.au/api/v1/spp')
 
 HEADERS = {
     "Accept": "application/json",
     "User-Agent": "Mozilla/5.0"
 }
 
+# Per-request timeout (seconds) and how many requests may be in flight at once
+REQUEST_TIMEOUT = 60
+MAX_CONCURRENCY = 16
+
+# Data download endpoints (relative to BASE_URL). The API is Django REST
+# Framework style, so list responses may be paginated as
+# {"count": ..., "next": <url or null>, "results": [...]}.
+LAYER_DATA_PATH = "/layer_data/{layer_id}/"
+SUBURB_DATA_PATH = "/suburb_data/"
+
+# Set SPP_RECORD_PATH to save every response for replay by mock_upstream_server_v1.py
+RECORD_PATH = os.environ.get("SPP_RECORD_PATH", "")
+RECORDED_RESPONSES = {} if RECORD_PATH else None
+
+
+class SPPError(Exception):
+    """Base class for errors talking to the SPP API."""
+
+
+class SPPConnectionError(SPPError):
+    """The request never got an HTTP response (DNS, TLS, timeout, reset...)."""
+
+
+class SPPApiError(SPPError):
+    """The API answered with a non-2xx status."""
+
+    def __init__(self, status_code, text, url):
+        super().__init__(f"Error: {status_code}, {text} ({url})")
+        self.status_code = status_code
+        self.text = text
+        self.url = url
+
+
+def make_session(pool_size=MAX_CONCURRENCY):
+    """
+    A keep-alive session whose connection pool fits 'pool_size' concurrent
+    requests, with the shared transport's retries and compression (see
+    http_transport_v1.py).
+    """
+    return http.make_session(pool_size=pool_size, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+
+
+def request_json(session, method, url, **kwargs):
+    """Send one request and return the decoded JSON, raising SPPError subclasses on failure."""
+    try:
+        response = http.request(method, url, session=session, **kwargs)
+    except requests.RequestException as e:
+        raise SPPConnectionError(f"{method} {url} failed: {e}") from e
+    if RECORDED_RESPONSES is not None:
+        # The recorder lives with the stand-in server; only needed when recording
+        from mock_upstream_server_v1 import record_response
+        record_response(RECORDED_RESPONSES, method, response)
+    if not response.ok:
+        raise SPPApiError(response.status_code, response.text, url)
+    return response.json()
+
+
+# Shared session for the synchronous helpers below
+SESSION = make_session()
+
 
 def fetch_suburb_names():
     """Fetch suburb names from the API."""
     url = f"{BASE_URL}/suburb_name/"
-    response = requests.post(url, headers=HEADERS)
-    if response.status_code == 200:
-        return response.json()  # Returns a list of suburb names
-    else:
-        return f"Error: {response.status_code}, {response.text}"
+    return request_json(SESSION, "POST", url)  # Returns a list of suburb names
 
 
 def fetch_layer_categories():
     """Fetch available layer categories from the API."""
     url = f"{BASE_URL}/layer_categories/"
-    response = requests.get(url, headers=HEADERS)
-    if response.status_code == 200:
-        return response.json()  # Returns layer categories
+    return request_json(SESSION, "GET", url)  # Returns layer categories
+
+
+def iter_layer_ids(layer_categories):
+    """
+    Yield the id of every layer in a 'fetch_layer_categories' response.
+    Categories may nest their layers under "layers"; a category without
+    that key is treated as a layer itself.
+    """
+    for category in layer_categories:
+        for layer in category.get("layers") or [category]:
+            layer_id = layer.get("id", layer.get("layer_id"))
+            if layer_id is not None:
+                yield layer_id
+
+
+# --- Suburb name lookup index ---
+# Built once from the 'fetch_suburb_names' list: sorted normalised names for
+# prefix lookups (binary search) plus a character-trigram inverted index for
+# typo-tolerant fuzzy matches. Stored as plain JSON next to the fetched list.
+SUBURB_INDEX_PATH = os.environ.get("SPP_SUBURB_INDEX", "spp_suburb_index.json")
+# Words in free-text addresses that are never part of a suburb name
+ADDRESS_NOISE = {"QLD", "QUEENSLAND", "AUSTRALIA", "AU"}
+
+
+def normalise_place_name(text):
+    """Upper-case, punctuation-free, single-spaced form used for matching ("" for non-strings, e.g. NaN)."""
+    text = text if isinstance(text, str) else ""
+    return " ".join("".join(c if c.isalnum() else " " for c in text.upper()).split())
+
+
+def name_trigrams(key):
+    """Character trigrams of a normalised name, padded so word edges count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_suburb_index(suburb_names):
+    """
+    Build the lookup index. 'suburb_names' is the API response: a list of
+    strings, or of dicts with a "suburb_name"/"name" key.
+    """
+    canonical = {}
+    for item in suburb_names:
+        name = item if isinstance(item, str) else item.get("suburb_name") or item.get("name")
+        if name and normalise_place_name(name):
+            canonical.setdefault(normalise_place_name(name), name)
+    keys = sorted(canonical)
+    grams = {}
+    for i, key in enumerate(keys):
+        for gram in name_trigrams(key):
+            grams.setdefault(gram, []).append(i)
+    return {"keys": keys, "names": [canonical[k] for k in keys], "grams": grams}
+
+
+def load_or_build_suburb_index(index_path=SUBURB_INDEX_PATH, refresh=False):
+    """
+    Load the cached index (which also holds the fetched list), or fetch the
+    suburb names, build the index and cache it at 'index_path'.
+    """
+    if not refresh and os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    index = build_suburb_index(fetch_suburb_names())
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    return index
+
+
+def suburbs_with_prefix(index, prefix, limit=20):
+    """Canonical suburb names starting with 'prefix' (binary search on the sorted keys)."""
+    keys = index["keys"]
+    prefix = normalise_place_name(prefix)
+    start = bisect.bisect_left(keys, prefix)
+    end = bisect.bisect_left(keys, prefix + "\uffff", lo=start)
+    return index["names"][start:min(end, start + limit)]
+
+
+def fuzzy_suburbs(index, text, limit=5, min_score=0.5):
+    """
+    Typo-tolerant matches for 'text' as [(name, score), ...], best first.
+    Score is the Dice coefficient of the two names' trigram sets.
+    """
+    query = name_trigrams(normalise_place_name(text))
+    shared = {}
+    for gram in query:
+        for i in index["grams"].get(gram, ()):
+            shared[i] = shared.get(i, 0) + 1
+    scored = []
+    for i, count in shared.items():
+        score = 2 * count / (len(query) + len(name_trigrams(index["keys"][i])))
+        if score >= min_score:
+            scored.append((score, i))
+    return [(index["names"][i], score) for score, i in heapq.nlargest(limit, scored)]
+
+
+def resolve_locations(index, texts, min_score=0.6, max_words=4):
+    """
+    Resolve many free-text locations (e.g. facility addresses) to canonical
+    suburbs in one call. Each text is first scanned, right to left, for the
+    longest run of words that is exactly a suburb name (addresses end with
+    suburb, state and postcode); failing that, each comma-separated part is
+    fuzzy-matched. Returns [(name or None, score), ...] in input order;
+    repeated texts are only resolved once. Missing texts (None, NaN, or any
+    non-string) resolve to (None, 0.0).
+    """
+    lookup = {key: i for i, key in enumerate(index["keys"])}
+    resolved = {}
+    out = []
+    for text in texts:
+        if not isinstance(text, str):
+            out.append((None, 0.0))
+            continue
+        if text not in resolved:
+            words = [w for w in normalise_place_name(text).split() if w not in ADDRESS_NOISE and not w.isdigit()]
+            match = None
+            for n in range(min(max_words, len(words)), 0, -1):
+                for i in range(len(words) - n, -1, -1):
+                    key = " ".join(words[i:i + n])
+                    if key in lookup:
+                        match = (index["names"][lookup[key]], 1.0)
+                        break
+                if match:
+                    break
+            if match is None:
+                candidates = [
+                    best for part in text.split(",")
+                    for best in fuzzy_suburbs(index, part, limit=1, min_score=min_score)
+                ]
+                match = max(candidates, key=lambda c: c[1]) if candidates else (None, 0.0)
+            resolved[text] = match
+        out.append(resolved[text])
+    return out
+
+
+class AsyncSPPClient:
+    """
+    Async client for the SPP '/api/v1/spp' endpoints. Independent requests
+    run concurrently (at most 'max_concurrency' at a time) over one pooled
+    keep-alive session; blocking I/O runs on worker threads. Use as:
+
+        async with AsyncSPPClient() as client:
+            suburbs, categories = await asyncio.gather(
+                client.suburb_names(), client.layer_categories()
+            )
+    """
+
+    def __init__(self, base_url=BASE_URL, max_concurrency=MAX_CONCURRENCY):
+        self.base_url = base_url.rstrip("/")
+        self.session = make_session(max_concurrency)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.session.close()
+
+    async def request(self, method, path_or_url, **kwargs):
+        """Run one request on a worker thread; raises SPPError subclasses."""
+        url = path_or_url if path_or_url.startswith("http") else self.base_url + path_or_url
+        async with self.semaphore:
+            return await asyncio.to_thread(request_json, self.session, method, url, **kwargs)
+
+    async def paginate(self, path, params=None):
+        """
+        GET 'path' and follow DRF-style "next" links, returning every item.
+        A plain list response is returned as is.
+        """
+        page = await self.request("GET", path, params=params)
+        if not isinstance(page, dict) or "results" not in page:
+            return page
+        items = list(page["results"])
+        while page.get("next"):
+            page = await self.request("GET", page["next"])
+            items.extend(page["results"])
+        return items
+
+    async def suburb_names(self):
+        return await self.request("POST", "/suburb_name/")
+
+    async def layer_categories(self):
+        return await self.request("GET", "/layer_categories/")
+
+    async def layer_data(self, layer_id, suburb=None):
+        """All features of one layer, optionally restricted to one suburb."""
+        params = {"suburb_name": suburb} if suburb else None
+        return await self.paginate(LAYER_DATA_PATH.format(layer_id=layer_id), params)
+
+    async def suburb_data(self, suburb):
+        """Everything the API holds for one suburb."""
+        return await self.paginate(SUBURB_DATA_PATH, {"suburb_name": suburb})
+
+    async def all_layer_data(self, layer_ids, suburbs=None):
+        """
+        Download every layer (for every suburb in 'suburbs', if given)
+        concurrently. Returns (data, errors): data maps (layer_id, suburb) to
+        the downloaded items, errors maps the same keys to the SPPError raised,
+        so one failing request doesn't abort the whole pull.
+        """
+        keys = [(layer_id, suburb) for layer_id in layer_ids for suburb in (suburbs or [None])]
+        outcomes = await asyncio.gather(
+            *(self.layer_data(layer_id, suburb) for layer_id, suburb in keys),
+            return_exceptions=True,
+        )
+        data, errors = {}, {}
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, SPPError):
+                errors[key] = outcome
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                data[key] = outcome
+        return data, errors
+
+
+# --- Local tiled mirror of the hazard layers ---
+# Each layer is stored under <mirror_dir>/<layer_id>/ as one JSON file per
+# grid cell ("<ix>_<iy>.json", cells of MIRROR_TILE_SIZE degrees) holding the
+# GeoJSON features whose bounding box touches that cell. Features spanning
+# more than MIRROR_MAX_TILES_PER_FEATURE cells go to "large.json" instead,
+# which every query of that layer checks. <mirror_dir>/index.json records, per
+# layer, a content hash (for incremental refreshes) and the non-empty cells.
+MIRROR_TILE_SIZE = 0.1
+MIRROR_MAX_TILES_PER_FEATURE = 400
+
+
+def layer_features(layer_data):
+    """The GeoJSON features of a layer download (a list, or a FeatureCollection)."""
+    if isinstance(layer_data, dict):
+        return layer_data.get("features", [])
+    return layer_data
+
+
+def iter_positions(coordinates):
+    """Yield every (lon, lat) position in a nested GeoJSON coordinates array."""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates[0], coordinates[1]
+    else:
+        for part in coordinates or []:
+            yield from iter_positions(part)
+
+
+def geometry_bbox(geometry):
+    """(min_lon, min_lat, max_lon, max_lat) of a GeoJSON geometry, or None if empty."""
+    if not geometry:
+        return None
+    if geometry.get("type") == "GeometryCollection":
+        boxes = [b for b in map(geometry_bbox, geometry.get("geometries", [])) if b]
+    else:
+        positions = list(iter_positions(geometry.get("coordinates")))
+        boxes = [(min(p[0] for p in positions), min(p[1] for p in positions),
+                  max(p[0] for p in positions), max(p[1] for p in positions))] if positions else []
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def tile_range(bbox, tile_size=MIRROR_TILE_SIZE):
+    """Grid cells (ix, iy) covered by 'bbox'."""
+    min_ix, min_iy = math.floor(bbox[0] / tile_size), math.floor(bbox[1] / tile_size)
+    max_ix, max_iy = math.floor(bbox[2] / tile_size), math.floor(bbox[3] / tile_size)
+    return [(ix, iy) for ix in range(min_ix, max_ix + 1) for iy in range(min_iy, max_iy + 1)]
+
+
+def point_in_ring(lon, lat, ring):
+    """Ray-casting test of a point against one linear ring."""
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+def point_in_geometry(lon, lat, geometry):
+    """True if the point lies inside a (Multi)Polygon; other geometry types never contain points."""
+    geometry_type = geometry.get("type") if geometry else None
+    if geometry_type == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry_type == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    elif geometry_type == "GeometryCollection":
+        return any(point_in_geometry(lon, lat, g) for g in geometry.get("geometries", []))
     else:
-        return f"Error: {response.status_code}, {response.text}"
+        return False
+    for rings in polygons:
+        rings = [[tuple(p[:2]) for p in ring] for ring in rings]
+        if rings and point_in_ring(lon, lat, rings[0]) and not any(point_in_ring(lon, lat, hole) for hole in rings[1:]):
+            return True
+    return False
+
+
+def write_layer_tiles(mirror_dir, layer_id, features, tile_size=MIRROR_TILE_SIZE):
+    """(Re)write one layer's tiles and return the list of non-empty tile names."""
+    layer_dir = os.path.join(mirror_dir, str(layer_id))
+    if os.path.isdir(layer_dir):
+        shutil.rmtree(layer_dir)
+    os.makedirs(layer_dir)
+    tiles = {}
+    for i, feature in enumerate(features):
+        bbox = geometry_bbox(feature.get("geometry"))
+        if bbox is None:
+            continue
+        feature = dict(feature, bbox=list(bbox), _mirror_id=i)
+        cells = tile_range(bbox, tile_size)
+        names = ["large"] if len(cells) > MIRROR_MAX_TILES_PER_FEATURE else [f"{ix}_{iy}" for ix, iy in cells]
+        for name in names:
+            tiles.setdefault(name, []).append(feature)
+    for name, tile_features in tiles.items():
+        with open(os.path.join(layer_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(tile_features, f)
+    return sorted(tiles)
+
+
+def load_mirror_index(mirror_dir):
+    """Read <mirror_dir>/index.json (an empty index if the mirror is new)."""
+    index_path = os.path.join(mirror_dir, "index.json")
+    if not os.path.exists(index_path):
+        return {"tile_size": MIRROR_TILE_SIZE, "layers": {}}
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_mirror_index(mirror_dir, index):
+    index_path = os.path.join(mirror_dir, "index.json")
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + ".tmp", index_path)
+
+
+async def refresh_mirror(mirror_dir, layer_ids=None, base_url=BASE_URL):
+    """
+    Download each layer (all layers in 'layer_categories' by default) once and
+    rewrite the tiles of those whose content changed since the last refresh.
+    Returns (changed layer ids, {layer_id: SPPError} for failed downloads).
+    """
+    os.makedirs(mirror_dir, exist_ok=True)
+    index = load_mirror_index(mirror_dir)
+    async with AsyncSPPClient(base_url) as client:
+        if layer_ids is None:
+            layer_ids = list(iter_layer_ids(await client.layer_categories()))
+        downloads, errors = await client.all_layer_data(layer_ids)
+    changed = []
+    for (layer_id, _), layer_data in downloads.items():
+        features = layer_features(layer_data)
+        content_hash = hashlib.sha256(json.dumps(features, sort_keys=True).encode("utf-8")).hexdigest()
+        entry = index["layers"].get(str(layer_id))
+        if entry and entry["hash"] == content_hash:
+            continue
+        tiles = write_layer_tiles(mirror_dir, layer_id, features, index["tile_size"])
+        index["layers"][str(layer_id)] = {
+            "hash": content_hash,
+            "updated": datetime.now(timezone.utc).isoformat(),
+            "feature_count": len(features),
+            "tiles": tiles,
+        }
+        changed.append(layer_id)
+    save_mirror_index(mirror_dir, index)
+    load_tile.cache_clear()
+    return changed, {layer_id: error for (layer_id, _), error in errors.items()}
+
+
+@lru_cache(maxsize=1024)
+def load_tile(mirror_dir, layer_id, tile_name):
+    """Features stored in one tile (cached in memory; [] for empty cells)."""
+    path = os.path.join(mirror_dir, str(layer_id), f"{tile_name}.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def query_mirror_area(mirror_dir, bbox, layer_ids=None, index=None):
+    """
+    Features whose bounding box intersects 'bbox' (min_lon, min_lat, max_lon,
+    max_lat), served from disk. Returns {layer_id: [feature, ...]}.
+    """
+    index = index or load_mirror_index(mirror_dir)
+    results = {}
+    for layer_id, entry in index["layers"].items():
+        if layer_ids is not None and layer_id not in {str(l) for l in layer_ids}:
+            continue
+        tile_names = set(entry["tiles"])
+        wanted = [f"{ix}_{iy}" for ix, iy in tile_range(bbox, index["tile_size"])]
+        found = {}
+        for name in [n for n in wanted if n in tile_names] + (["large"] if "large" in tile_names else []):
+            for feature in load_tile(mirror_dir, layer_id, name):
+                fb = feature["bbox"]
+                if fb[0] <= bbox[2] and fb[2] >= bbox[0] and fb[1] <= bbox[3] and fb[3] >= bbox[1]:
+                    found[feature["_mirror_id"]] = feature
+        if found:
+            results[layer_id] = list(found.values())
+    return results
+
+
+def query_mirror_point(mirror_dir, lon, lat, layer_ids=None, index=None):
+    """Polygon features containing the point, per layer, served from disk."""
+    candidates = query_mirror_area(mirror_dir, (lon, lat, lon, lat), layer_ids, index)
+    results = {}
+    for layer_id, features in candidates.items():
+        hits = [f for f in features if point_in_geometry(lon, lat, f.get("geometry"))]
+        if hits:
+            results[layer_id] = hits
+    return results
+
+
+async def fetch_overview():
+    """Fetch suburb names and layer categories concurrently."""
+    async with AsyncSPPClient() as client:
+        return await asyncio.gather(client.suburb_names(), client.layer_categories())
+
+
+async def download_all_layers(per_suburb=False):
+    """Pull every hazard layer (optionally per suburb) in one concurrent sweep."""
+    async with AsyncSPPClient() as client:
+        suburbs, categories = await asyncio.gather(client.suburb_names(), client.layer_categories())
+        return await client.all_layer_data(list(iter_layer_ids(categories)), suburbs if per_suburb else None)
+
+
+# Set SPP_DOWNLOAD_ALL=1 to also download every layer (SPP_PER_SUBURB=1: for every suburb)
+DOWNLOAD_ALL = os.environ.get("SPP_DOWNLOAD_ALL", "0") == "1"
+PER_SUBURB = os.environ.get("SPP_PER_SUBURB", "0") == "1"
+# Set SPP_MIRROR_DIR to download/refresh the local tiled mirror of every layer
+MIRROR_DIR = os.environ.get("SPP_MIRROR_DIR", "")
 
 
 if __name__ == "__main__":
-    suburb_data = fetch_suburb_names()
+    # Set PROFILE_DIR to profile each stage below (see profiling_v1.py)
+    with profile_stage("spp_overview"):
+        suburb_data, layer_data = asyncio.run(fetch_overview())
 
     print("Suburb Names:", suburb_data)
 
-    layer_data = fetch_layer_categories()
+    print("Layer Categories:", layer_data)
+
+    if DOWNLOAD_ALL:
+        with profile_stage("spp_download_all"):
+            downloads, errors = asyncio.run(download_all_layers(per_suburb=PER_SUBURB))
+        for (layer_id, suburb), error in errors.items():
+            print(f"Layer {layer_id} ({suburb or 'all suburbs'}) failed: {error}")
+        with open("spp_layer_data.json", "w", encoding="utf-8") as f:
+            json.dump(
+                [{"layer_id": k[0], "suburb": k[1], "data": v} for k, v in downloads.items()], f
+            )
+
+    if MIRROR_DIR:
+        with profile_stage("spp_mirror"):
+            changed, errors = asyncio.run(refresh_mirror(MIRROR_DIR))
+        for layer_id, error in errors.items():
+            print(f"Layer {layer_id} failed: {error}")
+        print(f"Mirror refreshed: {len(changed)} layers changed in {MIRROR_DIR}")
 
-    print("Layer Categories:", layer_data)
\ No newline at end of file
+    if RECORD_PATH:
+        from mock_upstream_server_v1 import save_recordings
+        save_recordings(RECORD_PATH, RECORDED_RESPONSES)
@@ -0,0 +1,418 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+import http_transport_v1 as http
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# The snapshot written by datacentres_water_v2.py / the pipeline (.csv, .parquet or .xlsx)
+SNAPSHOT_PATH = os.environ.get("QUERY_SNAPSHOT", "datacenter_map_data.csv")
+QUERY_PORT = int(os.environ.get("QUERY_PORT", "8780"))
+# Responses kept in each snapshot's LRU cache (a new snapshot starts empty)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "4096"))
+# How often (seconds) to check the snapshot file for a newer version
+RELOAD_INTERVAL = float(os.environ.get("QUERY_RELOAD_SECONDS", "2"))
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10_000
+# Cell size (degrees) of the location index
+CELL_DEG = 1.0
+EARTH_RADIUS_KM = 6371.0088
+
+##################################################
+# 3) Load and Index a Snapshot
+##################################################
+
+def read_snapshot(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+    if extension == ".xlsx":
+        return pd.read_excel(path)
+    return pd.read_csv(path, low_memory=False)
+
+def json_records(df):
+    """Rows as JSON-ready dicts (NaN/NaT -> None, timestamps -> ISO strings)."""
+    df = df.astype(object).where(df.notna(), None)
+    records = df.to_dict("records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, pd.Timestamp):
+                record[key] = value.isoformat()
+            elif isinstance(value, np.generic):
+                record[key] = value.item()
+    return records
+
+def postings(values):
+    """Normalised value -> sorted row array, plus per-row integer codes for aggregation."""
+    keys = pd.Series(values, dtype="string").str.strip().str.lower()
+    codes, uniques = pd.factorize(keys, use_na_sentinel=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    index = {key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(uniques)}
+    # Display labels: the first original spelling of each key
+    labels = pd.Series(values).iloc[order[bounds[:-1]]].astype(str).tolist() if len(uniques) else []
+    return index, codes, labels
+
+def build_location_index(lon, lat, cell_deg=CELL_DEG):
+    """CSR grid of row ids by lat/lon cell (rows without coordinates are left out)."""
+    n_lon, n_lat = int(round(360 / cell_deg)), int(round(180 / cell_deg))
+    valid = np.isfinite(lon) & np.isfinite(lat) & (np.abs(lon) <= 180) & (np.abs(lat) <= 90)
+    rows = np.flatnonzero(valid)
+    ix = np.clip(np.floor((lon[rows] + 180) / cell_deg).astype(np.int64), 0, n_lon - 1)
+    iy = np.clip(np.floor((lat[rows] + 90) / cell_deg).astype(np.int64), 0, n_lat - 1)
+    cells = iy * n_lon + ix
+    order = np.argsort(cells, kind="stable")
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=n_lon * n_lat))))
+    return {"indptr": indptr, "rows": rows[order], "n_lon": n_lon, "n_lat": n_lat, "cell_deg": cell_deg}
+
+def numeric_column(df, name):
+    if name not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+def load_dataset(path, version=0):
+    """
+    Load a snapshot and build its indexes: id -> row, country and
+    company_name -> row arrays (case-insensitive), a location grid, and
+    NumPy columns for the numeric filters and aggregates.
+    """
+    df = read_snapshot(path)
+    country_index, country_codes, country_labels = postings(df["country"] if "country" in df.columns else [None] * len(df))
+    company_index, company_name_codes, company_name_labels = postings(df["company_name"] if "company_name" in df.columns else [None] * len(df))
+    lon, lat = numeric_column(df, "coord_x"), numeric_column(df, "coord_y")
+    ids = df["id"].astype(str).tolist() if "id" in df.columns else []
+    return {
+        "version": version,
+        "path": path,
+        "mtime": os.path.getmtime(path),
+        "loaded_at": time.time(),
+        "n": len(df),
+        "records": json_records(df),
+        "ids": {facility_id: row for row, facility_id in enumerate(ids)},
+        "country": country_index, "country_codes": country_codes, "country_labels": country_labels,
+        "company_name": company_index, "company_name_codes": company_name_codes, "company_name_labels": company_name_labels,
+        "lon": lon, "lat": lat,
+        "gross_max_power": numeric_column(df, "gross_max_power"),
+        "m2": numeric_column(df, "m2"),
+        "location": build_location_index(lon, lat),
+    }
+
+##################################################
+# 4) Queries
+##################################################
+
+def haversine_km(lon0, lat0, lon, lat):
+    lon0, lat0, lon, lat = map(np.radians, (lon0, lat0, lon, lat))
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def radius_candidates(ds, lon, lat, km):
+    """Rows in the grid cells overlapping a circle's bounding box."""
+    loc = ds["location"]
+    cell_deg, n_lon, n_lat = loc["cell_deg"], loc["n_lon"], loc["n_lat"]
+    dlat = math.degrees(km / EARTH_RADIUS_KM)
+    iy0 = max(int(math.floor((lat - dlat + 90) / cell_deg)), 0)
+    iy1 = min(int(math.floor((lat + dlat + 90) / cell_deg)), n_lat - 1)
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+    if cos_lat < 1e-6 or km / (EARTH_RADIUS_KM * cos_lat) >= math.pi:
+        ix_list = range(n_lon)  # near a pole, or huge radius: every longitude
+    else:
+        dlon = math.degrees(km / (EARTH_RADIUS_KM * cos_lat))
+        ix0, ix1 = int(math.floor((lon - dlon + 180) / cell_deg)), int(math.floor((lon + dlon + 180) / cell_deg))
+        ix_list = sorted({ix % n_lon for ix in range(ix0, ix1 + 1)})
+    indptr, rows = loc["indptr"], loc["rows"]
+    parts = []
+    for iy in range(iy0, iy1 + 1):
+        for ix in ix_list:
+            cell = iy * n_lon + ix
+            if indptr[cell] != indptr[cell + 1]:
+                parts.append(rows[indptr[cell]:indptr[cell + 1]])
+    return np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+
+def split_values(params, name):
+    values = []
+    for value in params.get(name, []):
+        values.extend(v.strip().lower() for v in value.split(",") if v.strip())
+    return values
+
+def float_param(params, name, default=None):
+    if name not in params:
+        return default
+    try:
+        value = float(params[name][0])
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number") from None
+    if not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number")
+    return value
+
+def count_param(params, name, default, maximum=None):
+    """A non-negative whole-number parameter, clamped to 'maximum'."""
+    if name not in params:
+        return default
+    value = params[name][0].strip()
+    if not value.isdecimal():
+        raise ValueError(f"'{name}' must be a non-negative integer")
+    return min(int(value), maximum) if maximum is not None else int(value)
+
+def filter_rows(ds, params, rows=None):
+    """
+    Apply the filter parameters (country, company, min_power, max_power,
+    min_m2, max_m2) to 'rows' (default: every row) using the indexes for
+    the categorical ones and vectorised comparisons for the numeric ones.
+    """
+    for field, param in (("country", "country"), ("company_name", "company")):
+        values = split_values(params, param)
+        if values:
+            empty = np.array([], dtype=np.int64)
+            matches = np.unique(np.concatenate([ds[field].get(v, empty) for v in values]))
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=False)
+    if rows is None:
+        rows = np.arange(ds["n"])
+    for column, low_name, high_name in (("gross_max_power", "min_power", "max_power"), ("m2", "min_m2", "max_m2")):
+        low, high = float_param(params, low_name), float_param(params, high_name)
+        if low is not None:
+            rows = rows[ds[column][rows] >= low]
+        if high is not None:
+            rows = rows[ds[column][rows] <= high]
+    return rows
+
+def page_of(ds, rows, params, extra=None):
+    limit = count_param(params, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+    offset = count_param(params, "offset", 0)
+    fields = [f for f in ",".join(params.get("fields", [])).split(",") if f]
+    page = rows[offset:offset + limit]
+    results = []
+    for i, row in enumerate(page.tolist()):
+        record = ds["records"][row]
+        if fields:
+            record = {f: record.get(f) for f in fields}
+        if extra is not None:
+            record = dict(record, **{key: values[offset + i] for key, values in extra.items()})
+        results.append(record)
+    return {"count": int(len(rows)), "offset": offset, "limit": limit, "results": results}
+
+def query_facilities(ds, params):
+    return page_of(ds, filter_rows(ds, params), params)
+
+def query_radius(ds, params):
+    lat, lon, km = float_param(params, "lat"), float_param(params, "lon"), float_param(params, "km", 50.0)
+    if lat is None or lon is None:
+        raise ValueError("'lat' and 'lon' are required")
+    candidates = radius_candidates(ds, lon, lat, km)
+    distances = haversine_km(lon, lat, ds["lon"][candidates], ds["lat"][candidates])
+    inside = distances <= km
+    rows, distances = candidates[inside], distances[inside]
+    order = np.argsort(distances, kind="stable")
+    rows, distances = rows[order], distances[order]
+    keep = np.isin(rows, filter_rows(ds, params, rows.copy()))
+    rows, distances = rows[keep], distances[keep]
+    return page_of(ds, rows, params, extra={"distance_km": np.round(distances, 3).tolist()})
+
+def query_aggregate(ds, params):
+    """Count, total power and total floor area per country or company (after filters)."""
+    by = params.get("by", ["country"])[0]
+    if by not in ("country", "company_name"):
+        raise ValueError("'by' must be country or company_name")
+    rows = filter_rows(ds, params)
+    codes = ds[f"{by}_codes"][rows]
+    labels = ds[f"{by}_labels"]
+    known = codes >= 0
+    codes, rows = codes[known], rows[known]
+    n_groups = len(labels)
+    power, m2 = ds["gross_max_power"][rows], ds["m2"][rows]
+    count = np.bincount(codes, minlength=n_groups)
+    total_power = np.bincount(codes, weights=np.nan_to_num(power), minlength=n_groups)
+    total_m2 = np.bincount(codes, weights=np.nan_to_num(m2), minlength=n_groups)
+    groups = [
+        {by: labels[g], "count": int(count[g]),
+         "gross_max_power": round(float(total_power[g]), 3), "m2": round(float(total_m2[g]), 3)}
+        for g in np.flatnonzero(count)
+    ]
+    sort_key = params.get("sort", ["count"])[0]
+    groups.sort(key=lambda g: g.get(sort_key, 0), reverse=True)
+    return {"by": by, "groups": groups}
+
+def query_facility(ds, facility_id):
+    """The full record for one id, or None."""
+    row = ds["ids"].get(facility_id)
+    return None if row is None else ds["records"][row]
+
+def query_health(ds, params):
+    return {"path": ds["path"], "rows": ds["n"], "version": ds["version"],
+            "snapshot_mtime": ds["mtime"], "loaded_at": ds["loaded_at"],
+            "cache": ds["answer"].cache_info()._asdict() if "answer" in ds else None}
+
+ROUTES = {
+    "/facilities": query_facilities,
+    "/radius": query_radius,
+    "/aggregate": query_aggregate,
+}
+
+##################################################
+# 5) Serve
+##################################################
+
+# The live dataset; replaced (never mutated) on reload so each request sees one consistent snapshot
+state = {"dataset": None}
+state_lock = threading.Lock()
+
+def answer(ds, path, query):
+    """
+    (status, JSON bytes) for one request against snapshot 'ds'. Each loaded
+    snapshot gets its own LRU-cached copy ('ds["answer"]'), so a cached
+    response always belongs to the snapshot it was computed from.
+    """
+    params = parse_qs(query)
+    try:
+        if path.startswith("/facility/"):
+            facility_id = unquote(path[len("/facility/"):])
+            body = query_facility(ds, facility_id)
+            if body is None:
+                return 404, json.dumps({"detail": f"No facility {facility_id}"}).encode("utf-8")
+        elif path in ROUTES:
+            body = ROUTES[path](ds, params)
+        else:
+            return 404, json.dumps({"detail": f"Unknown path {path}"}).encode("utf-8")
+    except ValueError as e:
+        return 400, json.dumps({"detail": str(e)}).encode("utf-8")
+    return 200, json.dumps(body).encode("utf-8")
+
+def reload_if_changed(path):
+    """Load 'path' if it is newer than the live snapshot; True if a new version went live."""
+    current = state["dataset"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return False
+    if current is not None and mtime == current["mtime"]:
+        return False
+    with state_lock:
+        current = state["dataset"]
+        if current is not None and mtime == current["mtime"]:
+            return False
+        # Build the new dataset fully before swapping it in; requests keep using the old one meanwhile
+        dataset = load_dataset(path, version=(current["version"] + 1) if current else 1)
+        dataset["answer"] = lru_cache(maxsize=QUERY_CACHE_SIZE)(partial(answer, dataset))
+        state["dataset"] = dataset
+    print(f"Loaded snapshot {path} (version {dataset['version']}, {dataset['n']} rows)")
+    return True
+
+def watch_snapshot(path, interval=RELOAD_INTERVAL, stop=None):
+    """Poll the snapshot file and hot-reload it when a new one lands (run on a daemon thread)."""
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        try:
+            reload_if_changed(path)
+        except Exception as e:  # A half-written file: keep serving the old snapshot, retry next tick
+            print(f"Reload of {path} failed: {e}")
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response waits ~40 ms on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        ds = state["dataset"]
+        if parsed.path == "/health":
+            status, payload = 200, json.dumps(query_health(ds, {})).encode("utf-8")
+        else:
+            # Normalise parameter order so equivalent queries share a cache entry
+            query = "&".join(sorted(parsed.query.split("&"))) if parsed.query else ""
+            status, payload = ds["answer"](parsed.path.rstrip("/") or "/", query)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def serve(snapshot_path=SNAPSHOT_PATH, host="127.0.0.1", port=QUERY_PORT, reload_interval=RELOAD_INTERVAL):
+    """Load the snapshot, start the reload watcher and return the (not yet serving) server."""
+    reload_if_changed(snapshot_path)
+    threading.Thread(target=watch_snapshot, args=(snapshot_path, reload_interval), daemon=True).start()
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    return server
+
+##################################################
+# 6) Load Test
+##################################################
+
+def load_test(base_url, paths, total=10_000, concurrency=32):
+    """
+    Fire 'total' GETs (cycling through 'paths') from 'concurrency' threads
+    over keep-alive connections and report throughput and latency percentiles.
+    """
+    sessions = threading.local()
+    def one(i):
+        if not hasattr(sessions, "session"):
+            sessions.session = http.make_session(pool_size=1, retries=0)
+        start = time.perf_counter()
+        status = sessions.session.get(base_url + paths[i % len(paths)]).status_code
+        return time.perf_counter() - start, status
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([r[0] for r in results]) * 1000
+    errors = sum(1 for r in results if r[1] >= 400)
+    report = {
+        "requests": total, "errors": errors, "seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1),
+        **{f"p{q}_ms": round(float(np.percentile(latencies, q)), 3) for q in (50, 95, 99)},
+        "max_ms": round(float(latencies.max()), 3),
+    }
+    print(json.dumps(report))
+    return report
+
+# Usage:
+#   python facility_query_service_v1.py serve [datacenter_map_data.csv] [--port 8780]
+#   curl 'http://127.0.0.1:8780/facilities?country=Australia&min_power=10&limit=5'
+#   curl 'http://127.0.0.1:8780/radius?lat=-27.47&lon=153.03&km=25'
+#   curl 'http://127.0.0.1:8780/aggregate?by=company_name&sort=gross_max_power'
+#   curl 'http://127.0.0.1:8780/facility/<id>'
+#   python facility_query_service_v1.py loadtest http://127.0.0.1:8780 --requests 20000 --concurrency 64
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only query service over the facility snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("snapshot", nargs="?", default=SNAPSHOT_PATH)
+    serve_parser.add_argument("--port", type=int, default=QUERY_PORT)
+    test_parser = commands.add_parser("loadtest")
+    test_parser.add_argument("base_url")
+    test_parser.add_argument("--requests", type=int, default=10_000)
+    test_parser.add_argument("--concurrency", type=int, default=32)
+    test_parser.add_argument("--paths", nargs="*", default=[
+        "/facilities?limit=20", "/aggregate?by=country", "/radius?lat=-27.47&lon=153.03&km=100",
+        "/facilities?country=australia&min_power=10", "/aggregate?by=company_name&sort=gross_max_power",
+    ])
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = serve(args.snapshot, port=args.port)
+        print(f"Serving {args.snapshot} on http://127.0.0.1:{args.port}")
+        server.serve_forever()
+    else:
+        load_test(args.base_url, args.paths, args.requests, args.concurrency)
@@ -0,0 +1,196 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import os
+
+import numpy as np
+import pandas as pd
+
+##################################################
+# 2) Define Settings and Rules
+##################################################
+
+# Set VALIDATION_QUARANTINE=1 to drop rows with "error" violations (kept in
+# VALIDATION_QUARANTINE_PATH) instead of only reporting them
+QUARANTINE = os.environ.get("VALIDATION_QUARANTINE", "") not in ("", "0")
+REPORT_PATH = os.environ.get("VALIDATION_REPORT_PATH", "datacenter_validation_report.csv")
+QUARANTINE_PATH = os.environ.get("VALIDATION_QUARANTINE_PATH", "datacenter_quarantine.csv")
+
+# Declarative data-quality rules for the flattened datacentre feed (the
+# output of 'flatten_features', i.e. *before* 'convert_data_types' coerces
+# bad values to NaN). Each rule is a dict:
+#   {"name": ..., "check": one of CHECKS, "columns": [...], "severity":
+#    "error" | "warning", plus the check's own options}
+# "error" rows are dropped by 'validate_facilities(..., quarantine=True)';
+# "warning" rows are only reported. coord_x is longitude, coord_y latitude.
+RULES = [
+    {"name": "id_missing", "check": "not_null", "columns": ["id"], "severity": "error"},
+    {"name": "id_duplicate", "check": "unique", "columns": ["id"], "severity": "error"},
+    {"name": "coordinates_missing", "check": "not_null", "columns": ["coord_x", "coord_y"], "severity": "error"},
+    {"name": "coordinates_not_numeric", "check": "numeric", "columns": ["coord_x", "coord_y"], "severity": "error"},
+    {"name": "coordinates_swapped", "check": "swapped", "columns": ["coord_x", "coord_y"], "severity": "error"},
+    {"name": "longitude_out_of_range", "check": "range", "columns": ["coord_x"], "min": -180, "max": 180, "severity": "error"},
+    {"name": "latitude_out_of_range", "check": "range", "columns": ["coord_y"], "min": -90, "max": 90, "severity": "error"},
+    {"name": "null_island", "check": "all_zero", "columns": ["coord_x", "coord_y"], "severity": "error"},
+    {"name": "power_not_numeric", "check": "numeric", "columns": ["gross_max_power"], "severity": "warning"},
+    {"name": "power_not_positive", "check": "range", "columns": ["gross_max_power"], "min": 0, "exclusive_min": True, "severity": "warning"},
+    {"name": "area_not_numeric", "check": "numeric", "columns": ["m2"], "severity": "warning"},
+    {"name": "area_not_positive", "check": "range", "columns": ["m2"], "min": 0, "exclusive_min": True, "severity": "warning"},
+    {"name": "ready_date_unparseable", "check": "date_parsed", "columns": ["readyForService", "readyForService_dt"], "severity": "warning"},
+    {"name": "construction_date_unparseable", "check": "date_parsed", "columns": ["construction_date", "construction_date_dt"], "severity": "warning"},
+    {"name": "ready_date_out_of_range", "check": "date_range", "columns": ["readyForService_dt"], "min": "1980-01-01", "max_years_ahead": 15, "severity": "warning"},
+    {"name": "construction_date_out_of_range", "check": "date_range", "columns": ["construction_date_dt"], "min": "1970-01-01", "max_years_ahead": 15, "severity": "warning"},
+    {"name": "construction_after_ready", "check": "order", "columns": ["construction_date_dt", "readyForService_dt"], "severity": "warning"},
+]
+
+##################################################
+# 3) Define Checks
+##################################################
+
+# Each check takes (columns, rule, numeric) and returns a boolean NumPy array,
+# True where the row violates the rule; 'numeric(name)' is the column as
+# float64 (non-numbers -> NaN), converted once per validation run.
+# Missing values never violate anything but the not_null check.
+
+def raw_present(column):
+    present = column.notna()
+    if not pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_datetime64_any_dtype(column):
+        present &= column.ne("")
+    return present.to_numpy(dtype=bool)
+
+def check_not_null(columns, rule, numeric):
+    return np.logical_or.reduce([~raw_present(c) for c in columns])
+
+def check_unique(columns, rule, numeric):
+    # The first occurrence is kept; later copies are the violations
+    return np.logical_or.reduce([(c.duplicated(keep="first") & c.notna()).to_numpy() for c in columns])
+
+def check_numeric(columns, rule, numeric):
+    return np.logical_or.reduce([raw_present(c) & np.isnan(numeric(c.name)) for c in columns])
+
+def check_range(columns, rule, numeric):
+    violations = []
+    for c in columns:
+        v = numeric(c.name)
+        low = v <= rule["min"] if rule.get("exclusive_min") else v < rule["min"]
+        violations.append(low | (v > rule.get("max", np.inf)))
+    return np.logical_or.reduce(violations)
+
+def check_swapped(columns, rule, numeric):
+    # A latitude outside +/-90 paired with a longitude that would be a valid latitude
+    x, y = numeric(columns[0].name), numeric(columns[1].name)
+    return (np.abs(y) > 90) & (np.abs(y) <= 180) & (np.abs(x) <= 90)
+
+def check_all_zero(columns, rule, numeric):
+    return np.logical_and.reduce([numeric(c.name) == 0 for c in columns])
+
+def as_datetime(column):
+    return pd.to_datetime(column, errors="coerce").to_numpy(dtype="datetime64[ns]")
+
+def check_date_parsed(columns, rule, numeric):
+    # A raw timestamp is present but didn't convert (not a number, or out of datetime bounds)
+    return raw_present(columns[0]) & np.isnat(as_datetime(columns[1]))
+
+def check_date_range(columns, rule, numeric):
+    low = np.datetime64(pd.Timestamp(rule["min"]))
+    high = np.datetime64(pd.Timestamp.now() + pd.DateOffset(years=rule.get("max_years_ahead", 0)))
+    violations = []
+    for c in columns:
+        dates = as_datetime(c)
+        violations.append(~np.isnat(dates) & ((dates < low) | (dates > high)))
+    return np.logical_or.reduce(violations)
+
+def check_order(columns, rule, numeric):
+    first, second = as_datetime(columns[0]), as_datetime(columns[1])
+    return ~np.isnat(first) & ~np.isnat(second) & (first > second)
+
+CHECKS = {
+    "not_null": check_not_null,
+    "unique": check_unique,
+    "numeric": check_numeric,
+    "range": check_range,
+    "swapped": check_swapped,
+    "all_zero": check_all_zero,
+    "date_parsed": check_date_parsed,
+    "date_range": check_date_range,
+    "order": check_order,
+}
+
+##################################################
+# 4) Validate
+##################################################
+
+def validate_facilities(df, rules=RULES, quarantine=False):
+    """
+    Run every rule over whole columns of 'df' and return (kept, report,
+    quarantined):
+      report      - one row per violation: row (index label), id, rule,
+                    severity, column, value (the first column's raw value);
+      kept        - 'df' itself, or with 'quarantine' every row with an
+                    "error" violation removed;
+      quarantined - those removed rows (empty unless 'quarantine').
+    Rules whose columns are absent from 'df' are skipped.
+    """
+    numeric_cache = {}
+    def numeric(name):
+        if name not in numeric_cache:
+            numeric_cache[name] = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        return numeric_cache[name]
+    ids = df["id"].to_numpy(dtype=object) if "id" in df.columns else np.full(len(df), None, dtype=object)
+    index = df.index.to_numpy()
+    parts = []
+    errors = np.zeros(len(df), dtype=bool)
+    # 1) Evaluate each rule to a row mask
+    for rule in rules:
+        if not all(name in df.columns for name in rule["columns"]):
+            continue
+        columns = [df[name] for name in rule["columns"]]
+        mask = np.asarray(CHECKS[rule["check"]](columns, rule, numeric), dtype=bool)
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            continue
+        severity = rule.get("severity", "error")
+        if severity == "error":
+            errors |= mask
+        parts.append(pd.DataFrame({
+            "row": index[rows],
+            "id": ids[rows],
+            "rule": rule["name"],
+            "severity": severity,
+            "column": rule["columns"][0],
+            "value": columns[0].to_numpy(dtype=object)[rows],
+        }))
+    # 2) Assemble the report and split off the quarantined rows
+    report_columns = ["row", "id", "rule", "severity", "column", "value"]
+    report = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=report_columns)
+    if quarantine:
+        return df[~errors], report, df[errors]
+    return df, report, df.iloc[0:0]
+
+def summarise_report(report):
+    """Violation counts per rule (and severity), most frequent first."""
+    if report.empty:
+        return pd.DataFrame(columns=["rule", "severity", "violations"])
+    return (
+        report.groupby(["rule", "severity"], sort=False).size()
+        .rename("violations").reset_index()
+        .sort_values("violations", ascending=False, ignore_index=True)
+    )
+
+def validate_stage(df, report_path="datacenter_validation_report.csv", quarantine_path="", quarantine=False):
+    """
+    Pipeline stage: validate the flattened feed, write the violation report
+    (and the quarantined rows) to CSV, print a per-rule summary and return
+    the rows to carry on with.
+    """
+    kept, report, quarantined = validate_facilities(df, quarantine=quarantine)
+    report.to_csv(report_path, index=False)
+    if quarantine and quarantine_path:
+        quarantined.to_csv(quarantine_path, index=False)
+    summary = summarise_report(report)
+    print(f"Validation: {len(report)} violations in {report['row'].nunique() if len(report) else 0} of {len(df)} rows"
+          + (f", {len(quarantined)} quarantined" if quarantine else ""))
+    if not summary.empty:
+        print(summary.to_string(index=False))
+    return kept
@@ -0,0 +1,181 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import json
+import os
+import sys
+from collections import deque
+
+import numpy as np
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Edge types, stored as small integer codes alongside the CSR arrays
+EDGE_TYPES = ["capability", "design", "policy", "standard", "strategy", "page"]
+EDGE_TYPE_CODES = {name: i for i, name in enumerate(EDGE_TYPES)}
+
+# Export columns of a capability record -> edge type
+LINK_COLUMNS = {
+    "designs": "design",
+    "policies": "policy",
+    "standards": "standard",
+    "strategies": "strategy",
+}
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def build_graph(results, page_chunks=()):
+    """
+    Build a compact cross-reference graph from the government scraper output.
+    Edges run domain -> capability, capability -> design/policy/standard/
+    strategy (from the export) and page -> page (links found on crawled
+    pages). 'page_chunks' is an iterable of {url: {"page_type", "links", ...}}
+    dicts, e.g. [snapshot["pages"]] or a streamed crawl's 'iter_crawl_pages'.
+    Returns a dict of NumPy arrays: forward and reverse CSR adjacency
+    (indptr/indices/edge types) keyed by integer URL id, plus the URL and
+    node-kind tables.
+    """
+    url_ids = {}
+    kinds = []
+    def node(url, kind=""):
+        node_id = url_ids.get(url)
+        if node_id is None:
+            node_id = url_ids[url] = len(kinds)
+            kinds.append(kind)
+        elif kind and not kinds[node_id]:
+            kinds[node_id] = kind
+        return node_id
+    sources, targets, types = [], [], []
+    def edge(source, target, edge_type):
+        sources.append(source)
+        targets.append(target)
+        types.append(EDGE_TYPE_CODES[edge_type])
+    # 1) Edges from the export
+    for row in results:
+        domain = node(row["domain_url"], "domain")
+        capability = node(row["capability_url"], "capability")
+        edge(domain, capability, "capability")
+        for column, edge_type in LINK_COLUMNS.items():
+            for link in row.get(column, []):
+                edge(capability, node(link["url"], edge_type), edge_type)
+    # 2) Edges from crawled pages
+    for chunk in page_chunks:
+        for url, page in chunk.items():
+            source = node(url, page["page_type"])
+            for target_url in page.get("links", []):
+                edge(source, node(target_url), "page")
+    # 3) Deduplicate and pack into CSR (forward) and CSC-as-CSR (reverse)
+    n_nodes = len(kinds)
+    edges = np.unique(np.array([sources, targets, types], dtype=np.int64).reshape(3, -1), axis=1)
+    graph = {
+        "urls": np.array(list(url_ids), dtype=object),
+        "kinds": np.array(kinds, dtype=object),
+    }
+    for prefix, (src, dst) in (("out", (edges[0], edges[1])), ("in", (edges[1], edges[0]))):
+        order = np.lexsort((dst, src))
+        graph[f"{prefix}_indptr"] = np.concatenate(
+            ([0], np.cumsum(np.bincount(src, minlength=n_nodes)))
+        ).astype(np.int64)
+        graph[f"{prefix}_indices"] = dst[order].astype(np.int32)
+        graph[f"{prefix}_types"] = edges[2][order].astype(np.int8)
+    return graph
+
+def save_graph(graph_path, graph):
+    """Persist the graph as a single .npz file (URL table stored as unicode)."""
+    arrays = dict(graph)
+    arrays["urls"] = graph["urls"].astype(str)
+    arrays["kinds"] = graph["kinds"].astype(str)
+    np.savez_compressed(graph_path, **arrays)
+
+def load_graph(graph_path):
+    """Load a graph written by 'save_graph' and rebuild the URL -> id lookup."""
+    with np.load(graph_path, allow_pickle=False) as data:
+        graph = {key: data[key] for key in data.files}
+    graph["url_ids"] = {url: i for i, url in enumerate(graph["urls"].tolist())}
+    return graph
+
+def node_id(graph, url):
+    """Integer id of 'url' (raises KeyError for URLs not in the graph)."""
+    if "url_ids" not in graph:
+        graph["url_ids"] = {u: i for i, u in enumerate(graph["urls"].tolist())}
+    return graph["url_ids"][url]
+
+def neighbours(graph, url, reverse=False, edge_type=None):
+    """
+    URLs linked from 'url' (or, with 'reverse', linking to it), optionally
+    only along one edge type ("standard", "page", ...).
+    """
+    prefix = "in" if reverse else "out"
+    i = node_id(graph, url)
+    start, end = graph[f"{prefix}_indptr"][i], graph[f"{prefix}_indptr"][i + 1]
+    ids = graph[f"{prefix}_indices"][start:end]
+    if edge_type is not None:
+        ids = ids[graph[f"{prefix}_types"][start:end] == EDGE_TYPE_CODES[edge_type]]
+    return graph["urls"][ids].tolist()
+
+def reachable(graph, url, reverse=False, max_depth=None):
+    """
+    Every URL reachable from 'url' by following links (breadth-first), as
+    {url: depth}. With 'reverse', answers "what depends on this page?":
+    e.g. every capability, domain and page that links (transitively) to a
+    standard.
+    """
+    prefix = "in" if reverse else "out"
+    indptr, indices = graph[f"{prefix}_indptr"], graph[f"{prefix}_indices"]
+    start = node_id(graph, url)
+    depths = {start: 0}
+    frontier = deque([start])
+    while frontier:
+        current = frontier.popleft()
+        if max_depth is not None and depths[current] >= max_depth:
+            continue
+        for nxt in indices[indptr[current]:indptr[current + 1]].tolist():
+            if nxt not in depths:
+                depths[nxt] = depths[current] + 1
+                frontier.append(nxt)
+    del depths[start]
+    return {str(graph["urls"][i]): depth for i, depth in depths.items()}
+
+def degree_ranking(graph, reverse=True, kind=None, top_n=20):
+    """
+    Most-linked nodes: by in-degree (default, "most depended on") or, with
+    'reverse=False', out-degree. Optionally only nodes of one 'kind'.
+    Returns [(url, kind, degree), ...].
+    """
+    prefix = "in" if reverse else "out"
+    degrees = np.diff(graph[f"{prefix}_indptr"])
+    if kind is not None:
+        degrees = np.where(graph["kinds"] == kind, degrees, -1)
+    top = np.argsort(-degrees, kind="stable")[:top_n]
+    return [
+        (str(graph["urls"][i]), str(graph["kinds"][i]), int(degrees[i]))
+        for i in top if degrees[i] >= 0
+    ]
+
+##################################################
+# 4) Command Line Queries
+##################################################
+
+# Usage:
+#   python govt_architecture_graph_v1.py                      -> top standards by in-degree
+#   python govt_architecture_graph_v1.py <url>                -> what depends on <url>
+GRAPH_PATH = os.environ.get("GOVT_GRAPH", "govt_digital_infrastructure_graph.npz")
+SNAPSHOT_PATH = "govt_digital_infrastructure_snapshot.json"
+
+if __name__ == "__main__":
+    if not os.path.exists(GRAPH_PATH):
+        with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        save_graph(GRAPH_PATH, build_graph(snapshot["capabilities"], [snapshot["pages"]]))
+    graph = load_graph(GRAPH_PATH)
+    if len(sys.argv) > 1:
+        for url, depth in sorted(reachable(graph, sys.argv[1], reverse=True).items(), key=lambda x: x[1]):
+            print(depth, url)
+    else:
+        for url, kind, degree in degree_ranking(graph, kind="standard"):
+            print(degree, kind, url)
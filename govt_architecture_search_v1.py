@@ -0,0 +1,242 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import sys
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Searchable fields and their BM25F boosts (title matches count most)
+FIELDS = ("title", "headings", "body")
+FIELD_BOOSTS = (3.0, 2.0, 1.0)
+# Standard BM25 parameters: term-frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "with",
+}
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def tokenise(text):
+    """Lower-case alphanumeric tokens of 'text', without stop words."""
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOP_WORDS]
+
+def new_index():
+    """
+    An empty inverted index, as a plain (JSON-serialisable) dict:
+      postings: {term: {doc_id: [tf in title, tf in headings, tf in body]}}
+      docs:     {doc_id: {"title", "kind", "hash", "lengths", "terms"}}
+      total_lengths: summed field lengths, for the BM25 average lengths
+    """
+    return {"postings": {}, "docs": {}, "total_lengths": [0] * len(FIELDS)}
+
+def remove_document(index, doc_id):
+    """Drop 'doc_id' from the index (no-op if it isn't there)."""
+    doc = index["docs"].pop(doc_id, None)
+    if doc is None:
+        return
+    for term in doc["terms"]:
+        postings = index["postings"][term]
+        del postings[doc_id]
+        if not postings:
+            del index["postings"][term]
+    index["total_lengths"] = [t - n for t, n in zip(index["total_lengths"], doc["lengths"])]
+
+def index_document(index, doc_id, fields, kind="page"):
+    """
+    Add or replace one document. 'fields' maps "title"/"headings"/"body" to
+    text. Returns False (and leaves the index alone) when the document's
+    content hash is unchanged, so re-indexing an unchanged crawl is cheap.
+    """
+    content_hash = hashlib.sha256(
+        json.dumps([fields.get(f, "") for f in FIELDS]).encode("utf-8")
+    ).hexdigest()
+    existing = index["docs"].get(doc_id)
+    if existing and existing["hash"] == content_hash:
+        return False
+    remove_document(index, doc_id)
+    counts = {}
+    lengths = []
+    for i, field in enumerate(FIELDS):
+        tokens = tokenise(fields.get(field, ""))
+        lengths.append(len(tokens))
+        for token in tokens:
+            counts.setdefault(token, [0] * len(FIELDS))[i] += 1
+    for term, tfs in counts.items():
+        index["postings"].setdefault(term, {})[doc_id] = tfs
+    index["docs"][doc_id] = {
+        "title": fields.get("title", ""),
+        "kind": kind,
+        "hash": content_hash,
+        "lengths": lengths,
+        "terms": list(counts),
+    }
+    index["total_lengths"] = [t + n for t, n in zip(index["total_lengths"], lengths)]
+    return True
+
+def search(index, query, top_n=10, kind=None):
+    """
+    BM25F-ranked search. Returns [(score, doc_id, title), ...] best first,
+    optionally restricted to one document 'kind' ("capability", "policy", ...).
+    """
+    n_docs = len(index["docs"])
+    if not n_docs:
+        return []
+    avg_lengths = [max(total / n_docs, 1e-9) for total in index["total_lengths"]]
+    scores = {}
+    for term in set(tokenise(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, tfs in postings.items():
+            lengths = index["docs"][doc_id]["lengths"]
+            weighted_tf = sum(
+                boost * tf / (1 - BM25_B + BM25_B * length / avg)
+                for boost, tf, length, avg in zip(FIELD_BOOSTS, tfs, lengths, avg_lengths)
+                if tf
+            )
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted_tf * (BM25_K1 + 1) / (weighted_tf + BM25_K1)
+    if kind:
+        scores = {d: s for d, s in scores.items() if index["docs"][d]["kind"] == kind}
+    best = heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+    return [(score, doc_id, index["docs"][doc_id]["title"]) for doc_id, score in best]
+
+def capability_fields(row):
+    """Searchable fields of a capability record from the government scraper."""
+    return {
+        "title": row["capability_name"],
+        "headings": row["domain_name"],
+        "body": "\n\n".join(
+            str(row.get(col) or "")
+            for col in ("capability_definition", "capability_objective",
+                        "capability_purpose", "capability_WoG_applicability")
+        ),
+    }
+
+def page_fields(record, title=""):
+    """Searchable fields of a parsed domain/policy/standard/design page record."""
+    headings = []
+    body = [record.get("description", "")]
+    for heading, section in record.get("sections", {}).items():
+        headings.append(heading)
+        body.append(section.get("text", "") if isinstance(section, dict) else section)
+    requirements = record.get("policy_requirements", {})
+    body.append(requirements.get("body", ""))
+    for child in requirements.get("children", []):
+        headings.append(child.get("heading", ""))
+        body.append(child.get("content", ""))
+    return {
+        "title": title or record.get("metadata", {}).get("Reference", ""),
+        "headings": "\n".join(headings),
+        "body": "\n\n".join(b for b in body if b),
+    }
+
+def scrape_doc_ids(results, page_urls=()):
+    """Doc ids a scrape indexes: its capabilities, their domains and any crawled page URLs."""
+    doc_ids = set(page_urls)
+    for row in results:
+        doc_ids.add(row["capability_url"])
+        doc_ids.add(row["domain_url"])
+    return doc_ids
+
+def prune_index(index, doc_ids, kinds=None):
+    """
+    Remove every document not in 'doc_ids' (only those of 'kinds', if
+    given), e.g. capabilities and pages gone from the site since the last
+    scrape. Returns how many were removed.
+    """
+    stale = [
+        doc_id for doc_id, doc in index["docs"].items()
+        if doc_id not in doc_ids and (kinds is None or doc["kind"] in kinds)
+    ]
+    for doc_id in stale:
+        remove_document(index, doc_id)
+    return len(stale)
+
+def update_index_from_scrape(index, results, pages=None, prune=False):
+    """
+    Incrementally index the scraper output: capability records, their domain
+    descriptions and (from crawl mode) every parsed linked page. Only
+    documents whose text changed are re-indexed. With 'prune', documents the
+    scrape no longer has are removed: capabilities and domains, plus pages
+    when 'pages' is given (a scrape without a crawl says nothing about them).
+    Returns how many documents were (re)indexed or removed.
+    """
+    changed = 0
+    link_titles = {}
+    for row in results:
+        changed += index_document(index, row["capability_url"], capability_fields(row), kind="capability")
+        changed += index_document(
+            index, row["domain_url"],
+            {"title": row["domain_name"], "headings": "", "body": row.get("domain_description") or ""},
+            kind="domain",
+        )
+        for column in ("designs", "policies", "standards", "strategies"):
+            for link in row.get(column, []):
+                link_titles[link["url"]] = link["text"]
+    for url, page in (pages or {}).items():
+        fields = page_fields(page["record"], link_titles.get(url, ""))
+        changed += index_document(index, url, fields, kind=page["page_type"])
+    if prune:
+        kinds = None if pages is not None else {"capability", "domain"}
+        changed += prune_index(index, scrape_doc_ids(results, pages or ()), kinds)
+    return changed
+
+def load_index(index_path):
+    """Load a saved index, or start a new one if 'index_path' doesn't exist yet."""
+    if not os.path.exists(index_path):
+        return new_index()
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_index(index_path, index):
+    """Write the index atomically (temp file + rename)."""
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+def update_search_index(index_path, results, pages=None):
+    """
+    Load, incrementally update and save the index at 'index_path'; 'results'
+    (and 'pages', if given) are a full scrape, so anything else is pruned.
+    """
+    index = load_index(index_path)
+    changed = update_index_from_scrape(index, results, pages, prune=True)
+    save_index(index_path, index)
+    print(f"Search index: {changed} documents (re)indexed or removed, {len(index['docs'])} total")
+    return index
+
+##################################################
+# 4) Command Line Search
+##################################################
+
+# Usage: python govt_architecture_search_v1.py water sustainability
+# (builds/updates the index from the crawl snapshot first if it exists)
+INDEX_PATH = os.environ.get("GOVT_SEARCH_INDEX", "govt_digital_infrastructure_search.json")
+SNAPSHOT_PATH = "govt_digital_infrastructure_snapshot.json"
+
+if __name__ == "__main__":
+    if os.path.exists(SNAPSHOT_PATH):
+        with open(SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        index = update_search_index(INDEX_PATH, snapshot["capabilities"], snapshot["pages"])
+    else:
+        index = load_index(INDEX_PATH)
+    for score, doc_id, title in search(index, " ".join(sys.argv[1:])):
+        print(f"{score:7.3f}  {title}  <{doc_id}>")
@@ -0,0 +1,219 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import json
+import sqlite3
+
+##################################################
+# 2) Define Schema
+##################################################
+
+# Normalised tables for the architecture.digital.gov.au scrape:
+#   domains / capabilities - one row per page, capabilities point at their domain
+#   documents              - designs, policies, standards, strategies (and any
+#                            other linked page the crawler parsed)
+#   links                  - every link between two URLs, typed by relation
+#                            ("design", "policy", ... for export columns,
+#                            "page" for links found inside a parsed page)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT,
+    reference TEXT,
+    mandate TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS capabilities (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    domain_id INTEGER REFERENCES domains(id),
+    name TEXT,
+    reference TEXT,
+    mandate TEXT,
+    definition TEXT,
+    objective TEXT,
+    purpose TEXT,
+    wog_applicability TEXT
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    doc_type TEXT,
+    title TEXT,
+    reference TEXT,
+    mandate TEXT,
+    description TEXT,
+    record_json TEXT
+);
+CREATE TABLE IF NOT EXISTS links (
+    source_url TEXT NOT NULL,
+    target_url TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    link_text TEXT,
+    PRIMARY KEY (source_url, target_url, relation)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_domains_reference ON domains(reference);
+CREATE INDEX IF NOT EXISTS idx_capabilities_reference ON capabilities(reference);
+CREATE INDEX IF NOT EXISTS idx_capabilities_domain ON capabilities(domain_id);
+CREATE INDEX IF NOT EXISTS idx_documents_reference ON documents(reference);
+CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(doc_type);
+CREATE INDEX IF NOT EXISTS idx_links_target ON links(target_url, relation);
+"""
+
+# Export columns of a capability record -> link relation / document type
+LINK_COLUMNS = {
+    "designs": "design",
+    "policies": "policy",
+    "standards": "standard",
+    "strategies": "strategy",
+}
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def open_store(db_path):
+    """Open (creating if needed) the SQLite store and make sure the schema exists."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def write_store(conn, results, pages=None):
+    """
+    Bulk-write the scraper output in a single transaction.
+    'results' are the capability records built by the government scraper;
+    'pages' is the optional {url: {"page_type", "record", "links"}} dict from
+    its crawl mode. Rows are upserted on URL and a source's links replaced, so
+    re-writing the same scrape is idempotent, and pages can be added in
+    chunks after the records with 'write_store(conn, [], chunk)'.
+    """
+    pages = pages or {}
+    with conn:
+        # 1) Domains (one row per URL, however many capabilities share it)
+        domain_rows = {
+            row["domain_url"]: (
+                row["domain_url"], row["domain_name"], row["domain_reference"],
+                row["domain_mandate"], row["domain_description"],
+            )
+            for row in results
+        }
+        conn.executemany(
+            """INSERT INTO domains (url, name, reference, mandate, description)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET name=excluded.name, reference=excluded.reference,
+                   mandate=excluded.mandate, description=excluded.description""",
+            domain_rows.values(),
+        )
+        domain_ids = dict(conn.execute("SELECT url, id FROM domains"))
+        # 2) Capabilities
+        conn.executemany(
+            """INSERT INTO capabilities (url, domain_id, name, reference, mandate, definition,
+                   objective, purpose, wog_applicability)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET domain_id=excluded.domain_id, name=excluded.name,
+                   reference=excluded.reference, mandate=excluded.mandate,
+                   definition=excluded.definition, objective=excluded.objective,
+                   purpose=excluded.purpose, wog_applicability=excluded.wog_applicability""",
+            (
+                (
+                    row["capability_url"], domain_ids[row["domain_url"]], row["capability_name"],
+                    row["capability_reference"], row["capability_mandate"], row["capability_definition"],
+                    row["capability_objective"], row["capability_purpose"], row["capability_WoG_applicability"],
+                )
+                for row in results
+            ),
+        )
+        # 3) Documents: every export link target, enriched with the crawled page if we have it
+        documents = {}
+        link_rows = []
+        for row in results:
+            for column, relation in LINK_COLUMNS.items():
+                for link in row.get(column, []):
+                    documents.setdefault(link["url"], {"doc_type": relation, "title": link["text"]})
+                    link_rows.append((row["capability_url"], link["url"], relation, link["text"]))
+        for url, page in pages.items():
+            record = page["record"]
+            metadata = record.get("metadata", {})
+            doc = documents.setdefault(url, {"doc_type": page["page_type"], "title": None})
+            doc.update({
+                "doc_type": page["page_type"],
+                "reference": metadata.get("Reference"),
+                "mandate": metadata.get("Mandate"),
+                "description": record.get("description"),
+                "record_json": json.dumps(record),
+            })
+            link_rows.extend((url, target, "page", None) for target in page.get("links", []))
+        conn.executemany(
+            """INSERT INTO documents (url, doc_type, title, reference, mandate, description, record_json)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(url) DO UPDATE SET doc_type=excluded.doc_type,
+                   title=COALESCE(excluded.title, documents.title),
+                   reference=COALESCE(excluded.reference, documents.reference),
+                   mandate=COALESCE(excluded.mandate, documents.mandate),
+                   description=COALESCE(excluded.description, documents.description),
+                   record_json=COALESCE(excluded.record_json, documents.record_json)""",
+            (
+                (url, doc["doc_type"], doc.get("title"), doc.get("reference"), doc.get("mandate"),
+                 doc.get("description"), doc.get("record_json"))
+                for url, doc in documents.items()
+            ),
+        )
+        # 4) Links: replace everything previously recorded for these sources
+        sources = {(source,) for source, _, _, _ in link_rows}
+        sources.update((row["capability_url"],) for row in results)
+        sources.update((url,) for url in pages)
+        conn.executemany("DELETE FROM links WHERE source_url = ?", sources)
+        conn.executemany(
+            "INSERT OR IGNORE INTO links (source_url, target_url, relation, link_text) VALUES (?, ?, ?, ?)",
+            link_rows,
+        )
+
+def write_sqlite_store(db_path, results, pages=None):
+    """Convenience wrapper: open 'db_path', write the scrape, close."""
+    conn = open_store(db_path)
+    try:
+        write_store(conn, results, pages)
+    finally:
+        conn.close()
+
+def documents_linked_from_domain(conn, domain, doc_type=None):
+    """
+    All documents linked from the capabilities of a domain, e.g. every
+    standard linked from AI capabilities:
+        documents_linked_from_domain(conn, "DOM10", "standard")
+    'domain' may be a domain reference or URL. Returns a list of dicts.
+    """
+    query = """
+        SELECT DISTINCT d.url, d.doc_type, d.title, d.reference, c.name AS capability_name
+        FROM domains dm
+        JOIN capabilities c ON c.domain_id = dm.id
+        JOIN links l ON l.source_url = c.url
+        JOIN documents d ON d.url = l.target_url
+        WHERE (dm.reference = ? OR dm.url = ?)
+    """
+    params = [domain, domain]
+    if doc_type:
+        query += " AND d.doc_type = ?"
+        params.append(doc_type)
+    cursor = conn.execute(query + " ORDER BY d.url", params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def capabilities_linking_to(conn, document_url):
+    """Every capability that links to 'document_url' (reverse lookup on the links index)."""
+    cursor = conn.execute(
+        """SELECT c.url, c.name, c.reference, l.relation
+           FROM links l JOIN capabilities c ON c.url = l.source_url
+           WHERE l.target_url = ? ORDER BY c.url""",
+        (document_url,),
+    )
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+# Example usage
+#conn = open_store("govt_digital_infrastructure.sqlite")
+#for doc in documents_linked_from_domain(conn, "https://architecture.digital.gov.au/ai", "standard"):
+#    print(doc["capability_name"], "->", doc["title"], doc["url"])
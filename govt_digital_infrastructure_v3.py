@@ -2,13 +2,26 @@
 # 1) Import Packages
 ##################################################
 
-import requests
 import pandas as pd
 import openpyxl
 import json
+import hashlib
 from bs4 import BeautifulSoup
 import itertools
-from urllib.parse import urljoin
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from govt_architecture_store_v1 import open_store, write_store, write_sqlite_store
+from govt_architecture_search_v1 import (load_index, prune_index, save_index, scrape_doc_ids, update_index_from_scrape,
+                                         update_search_index)
+from govt_architecture_graph_v1 import build_graph, save_graph
+from govt_page_history_v1 import now_iso, open_history, record_pages
+from profiling_v1 import current_stage, profile_call, profile_stage, stage_thread
+import http_transport_v1 as http
+from urllib.parse import urljoin, urlparse, urldefrag
 
 ##################################################
 # 2) Define Functions
@@ -56,10 +69,20 @@ def parse_metadata_card(soup):
                 metadata[label] = ""
     return metadata
 
+# Helper function to build a soup from either pre-fetched HTML or a fresh request
+def fetch_page_soup(url, html=None):
+    """
+    Returns a BeautifulSoup for 'url'. If 'html' is given (e.g. the crawler
+    already fetched the page), it is parsed directly instead of re-fetching.
+    """
+    if html is None:
+        resp = http.get(url)
+        html = resp.content
+    return BeautifulSoup(html, "html.parser")
+
 # Parsing a Domain page
-def parse_domain_page(url):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.content, "html.parser")
+def parse_domain_page(url, html=None):
+    soup = fetch_page_soup(url, html)
     # 1) Parse the metadata card
     domain_metadata = parse_metadata_card(soup)
     # 2) Grab the main domain description. Typically the summary text
@@ -70,15 +93,17 @@ def parse_domain_page(url):
     if desc_div:
         # get_text() merges all child paragraphs, etc.
         domain_description = desc_div.get_text(separator="\n", strip=True)
+    # Free the parse tree now (the record only holds plain strings) rather
+    # than leaving it for the garbage collector
+    soup.decompose()
     return {
         "metadata": domain_metadata,
         "description": domain_description
     }
 
 # Parsing a Capability page
-def parse_capability_page(url):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.content, "html.parser")
+def parse_capability_page(url, html=None):
+    soup = fetch_page_soup(url, html)
     # 1) Parse metadata card
     cap_metadata = parse_metadata_card(soup)
     # 2) Collect <h2> headings and the paragraphs (or lists) underneath
@@ -103,6 +128,7 @@ def parse_capability_page(url):
         # Combine all that text
         section_text = "\n\n".join(content_parts)
         section_texts[heading] = section_text
+    soup.decompose()  # Free the parse tree now
     return {
         "metadata": cap_metadata,
         "sections": section_texts
@@ -166,9 +192,8 @@ def parse_h2_sections(soup):
 
 
 # Parse policy pages
-def parse_policy_page(url):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.content, "html.parser")
+def parse_policy_page(url, html=None):
+    soup = fetch_page_soup(url, html)
     # 1) Extract metadata
     metadata = parse_metadata_card(soup)
     # 2) Grab the main body text
@@ -255,6 +280,7 @@ def parse_policy_page(url):
                 "content": combined_content,
                 "links": children_links
             })
+    soup.decompose()  # Free the parse tree now
     return {
         "metadata": metadata,
         "description": policy_description,
@@ -269,9 +295,8 @@ def parse_policy_page(url):
 
 
 # Parse standard and design pages
-def parse_standard_design_pages(url):
-    resp = requests.get(url)
-    soup = BeautifulSoup(resp.content, "html.parser")
+def parse_standard_design_pages(url, html=None):
+    soup = fetch_page_soup(url, html)
     metadata = parse_metadata_card(soup)
     # Some Design pages might store the main text in a slightly different container.
     # Start with the same guess:
@@ -303,6 +328,7 @@ def parse_standard_design_pages(url):
         sections = {}
         all_text = ""
         design_description = ""
+    soup.decompose()  # Free the parse tree now
     return {
         "metadata": metadata,
         "description": design_description,
@@ -310,82 +336,450 @@ def parse_standard_design_pages(url):
         #"raw_text": all_text,
     }
 
-# Example usage
-#policy_url = "https://architecture.digital.gov.au/einvoicing-policy"
-#policy_data = parse_policy_page(policy_url)
-#print("Policy metadata:", policy_data["metadata"])
-#print("Policy headings => text:", policy_data["sections"])
-#standard_url = "https://architecture.digital.gov.au/einvoicing-standard"
-#standard_data = parse_standard_design_pages(standard_url)
-#design_url = "https://architecture.digital.gov.au/einvoicing-government-entities-govteams-site"
-#design_data = parse_standard_design_pages(design_url)
+# Map each page "Type" (from the metadata card, or the export column a link
+# came from) to the parser that understands that page layout
+PAGE_TYPE_PARSERS = {
+    "domain": parse_domain_page,
+    "capability": parse_capability_page,
+    "policy": parse_policy_page,
+    "design": parse_standard_design_pages,
+    "standard": parse_standard_design_pages,
+    "strategy": parse_standard_design_pages,
+}
 
-##################################################
-# 3) Accessing Web Data
-##################################################
+# Export columns -> page type of the links they contain
+LINK_FIELD_TYPES = {
+    "designs": "design",
+    "policies": "policy",
+    "standards": "standard",
+    "strategies": "strategy",
+}
 
-BASE_URL = "https://architecture.digital.gov.au"
-EXPORT_ENDPOINT = BASE_URL + "/dynamic-data-export"
+def normalise_crawl_url(url):
+    """
+    Canonical form of a URL for the crawl frontier: fragment and trailing
+    slash removed. Returns None for links that leave the architecture site
+    or point at downloads (PDF, DOCX, ...) that the page parsers can't read.
+    """
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or parsed.netloc != urlparse(BASE_URL).netloc:
+        return None
+    if os.path.splitext(parsed.path)[1].lower() in (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".csv", ".zip"):
+        return None
+    return url.rstrip("/") or url
 
-response = requests.get(EXPORT_ENDPOINT)
+def extract_page_links(record):
+    """Collect every {"text", "url"} link found in a parsed page record."""
+    links = []
+    for section in record.get("sections", {}).values():
+        if isinstance(section, dict):
+            links.extend(section.get("links", []))
+    for child in record.get("policy_requirements", {}).get("children", []):
+        links.extend(child.get("links", []))
+    return links
 
-if response.status_code == 200:
-    data = response.json()   # Parse JSON response
-    print(data)
-else:
-    print(f"Request failed with status code {response.status_code}")
+# Helpers for conditional recrawls: remember each page's ETag, Last-Modified
+# and body hash, plus the record extracted from it, keyed by URL. In streaming
+# mode the records live in an on-disk 'record_store' (see 'open_page_records')
+# and the in-memory cache holds only validators and hashes.
+def open_page_records(db_path):
+    """Open (creating if needed) the on-disk {url: record} half of the page cache."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS page_records (url TEXT PRIMARY KEY, record TEXT NOT NULL)")
+    return conn
 
-##################################################
-# 3) Extracting Features/Data
-##################################################
+def store_page_record(record_store, url, record):
+    record_store.execute("INSERT OR REPLACE INTO page_records VALUES (?, ?)", (url, json.dumps(record)))
+
+def load_page_record(record_store, url):
+    row = record_store.execute("SELECT record FROM page_records WHERE url = ?", (url,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def load_page_cache(cache_path, record_store=None):
+    """
+    Load the {url: entry} page cache written by 'save_page_cache' (or {}).
+    With a 'record_store', records found in the file are moved into it, and
+    entries whose record is in neither are dropped (they would be refetched
+    as unchanged with nothing to return); without one, entries must carry
+    their record.
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, "r", encoding="utf-8") as f:
+        page_cache = json.load(f)
+    if record_store is None:
+        return {url: entry for url, entry in page_cache.items() if "record" in entry}
+    with record_store:
+        for url, entry in page_cache.items():
+            if "record" in entry:
+                store_page_record(record_store, url, entry.pop("record"))
+    stored = {url for (url,) in record_store.execute("SELECT url FROM page_records")}
+    return {url: entry for url, entry in page_cache.items() if url in stored}
 
-results = []
+def save_page_cache(cache_path, page_cache, record_store=None):
+    """Write the page cache atomically so a crash never leaves half a file."""
+    if not cache_path:
+        return
+    if record_store is not None:
+        record_store.commit()
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(page_cache, f)
+    os.replace(tmp_path, cache_path)
+
+def fetch_page_conditional(url, page_cache=None):
+    """
+    GET 'url', sending If-None-Match / If-Modified-Since when 'page_cache'
+    holds a previous response. Returns (resp, cached_entry): 'cached_entry'
+    is the previous entry when the page is unchanged (304, or a 200 whose
+    body hashes the same), otherwise None and the caller should parse 'resp'.
+    """
+    cached = page_cache.get(url) if page_cache is not None else None
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    resp = http.get(url, headers=headers)  # shared keep-alive session, retries, timeout
+    if cached and resp.status_code == 304:
+        return resp, cached
+    resp.raise_for_status()
+    if cached and cached.get("sha256") == hashlib.sha256(resp.content).hexdigest():
+        # Same body, but the server may have issued fresh validators
+        cached["etag"] = resp.headers.get("ETag", cached.get("etag"))
+        cached["last_modified"] = resp.headers.get("Last-Modified", cached.get("last_modified"))
+        return resp, cached
+    return resp, None
+
+def remember_page(page_cache, url, resp, page_type, record, record_store=None):
+    """Store the validators, body hash and parsed record for 'url'."""
+    if page_cache is None:
+        return
+    entry = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(resp.content).hexdigest(),
+        "page_type": page_type,
+    }
+    if record_store is not None:
+        store_page_record(record_store, url, record)
+    else:
+        entry["record"] = record
+    page_cache[url] = entry
+
+def parse_fetched_page(url, page_type, html):
+    """
+    Dispatch already-fetched HTML to the right parser. Pages reached from an
+    export column have a known type; pages discovered inside other pages are
+    parsed generically first, then re-parsed (from the same HTML, without a
+    second request) if their metadata card says they are e.g. a Policy.
+    Top-level (picklable) so it can run in a process pool worker.
+    """
+    if page_type not in PAGE_TYPE_PARSERS:
+        record = parse_standard_design_pages(url, html=html)
+        page_type = record["metadata"].get("Type", "").strip().lower() or "page"
+        if PAGE_TYPE_PARSERS.get(page_type, parse_standard_design_pages) is not parse_standard_design_pages:
+            record = PAGE_TYPE_PARSERS[page_type](url, html=html)
+    else:
+        record = PAGE_TYPE_PARSERS[page_type](url, html=html)
+    return page_type, record
+
+def run_page_pipeline(seeds, page_cache=None, fetch_workers=8, parse_workers=None,
+                      queue_size=32, follow_links=False, skip_urls=(), on_page=None,
+                      keep_pages=True, record_store=None):
+    """
+    Fetch and parse pages as a three-stage pipeline:
+      1) 'fetch_workers' threads GET pages (conditionally, via 'page_cache')
+         and put the raw HTML on a queue of at most 'queue_size' pages;
+      2) a dispatcher feeds that queue to a process pool of 'parse_workers'
+         (default: one per core; 0 parses on a single thread instead), with at
+         most 2 x 'parse_workers' pages in flight;
+      3) the calling thread is the writer: it updates the page cache, calls
+         'on_page(url, page_type, record)' and, with 'follow_links', adds any
+         architecture-site links found on the page to the frontier.
+    The bounded queues give backpressure: fetchers block when parsing falls
+    behind instead of piling up HTML in memory. Unchanged pages (304 or same
+    body hash) skip stage 2 entirely; their record comes from the page cache,
+    or from 'record_store' when one holds the records. 'seeds' is an iterable of
+    (url, page_type); 'skip_urls' are treated as already done.
+    Returns {url: {"page_type": ..., "record": ...}} keyed by normalised URL,
+    or {} with 'keep_pages=False' (streaming: 'on_page' is the only output).
+    If the writer stops early (Ctrl-C, or an error in 'on_page'), the
+    unfetched frontier is dropped and queued parses are cancelled, so only
+    pages already in flight finish before it returns.
+    """
+    parse_workers = os.cpu_count() if parse_workers is None else parse_workers
+    stage = current_stage()  # When profiling, parse workers profile into this stage
+    jobs = queue.Queue()
+    fetched = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue()
+    parse_slots = threading.BoundedSemaphore(max(1, parse_workers) * 2)
+    stop = threading.Event()
+    seen = set(skip_urls)
+    pages = {}
+    outstanding = 0
+
+    def enqueue(url, page_type=None):
+        nonlocal outstanding
+        url = normalise_crawl_url(url)
+        if url and url not in seen:
+            seen.add(url)
+            outstanding += 1
+            jobs.put((url, page_type))
+
+    # 1) Fetch stage
+    def fetcher():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            if stop.is_set():
+                continue
+            url, page_type = job
+            try:
+                resp, cached = fetch_page_conditional(url, page_cache)
+            except Exception as e:
+                parsed.put((url, page_type, None, None, e))
+                continue
+            if cached is not None:
+                parsed.put((url, cached["page_type"], cached.get("record"), None, None))
+            else:
+                fetched.put((url, page_type, resp))  # blocks while the parse stage is full
+
+    # 2) Parse stage
+    def dispatcher(pool):
+        while True:
+            item = fetched.get()
+            if item is None:
+                return
+            if stop.is_set():
+                continue
+            url, page_type, resp = item
+            parse_slots.acquire()
+            try:
+                if stage:
+                    future = pool.submit(profile_call, stage, parse_fetched_page, url, page_type, resp.content)
+                else:
+                    future = pool.submit(parse_fetched_page, url, page_type, resp.content)
+            except RuntimeError:  # pool already shut down by a stopping writer
+                parse_slots.release()
+                continue
+            def done(future, url=url, page_type=page_type, resp=resp):
+                parse_slots.release()
+                try:
+                    new_type, record = future.result()
+                except Exception as e:
+                    parsed.put((url, page_type, None, None, e))
+                else:
+                    parsed.put((url, new_type, record, resp, None))
+            future.add_done_callback(done)
+
+    for url, page_type in seeds:
+        enqueue(url, page_type)
+    # Parse workers start while the fetcher threads run, so never fork them
+    # (a fork copies locks other threads hold); forkserver where available
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    pool = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(start_method)) \
+        if parse_workers else ThreadPoolExecutor(max_workers=1)
+    fetch_threads = [threading.Thread(target=stage_thread(fetcher), daemon=True) for _ in range(fetch_workers)]
+    dispatch_thread = threading.Thread(target=stage_thread(dispatcher), args=(pool,), daemon=True)
+    for t in fetch_threads + [dispatch_thread]:
+        t.start()
+    # 3) Writer stage
+    try:
+        while outstanding:
+            url, page_type, record, resp, error = parsed.get()
+            outstanding -= 1
+            if error is not None:
+                # Not recorded, so a resumed crawl will retry it
+                print(f"Failed to fetch/parse {url}: {error}")
+                continue
+            if resp is not None:
+                remember_page(page_cache, url, resp, page_type, record, record_store)
+            elif record is None:
+                record = load_page_record(record_store, url)  # Unchanged page, record on disk
+            if keep_pages:
+                pages[url] = {"page_type": page_type, "record": record}
+            if on_page:
+                on_page(url, page_type, record)
+            if follow_links:
+                for link in extract_page_links(record):
+                    enqueue(link["url"])
+    except BaseException:
+        # Stopping early: cancel queued parses; their results would be dropped
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        # Drop the unfetched frontier so the fetchers see their sentinel next
+        stop.set()
+        while True:
+            try:
+                jobs.get_nowait()
+            except queue.Empty:
+                break
+        for _ in fetch_threads:
+            jobs.put(None)
+        for t in fetch_threads:
+            t.join()
+        fetched.put(None)
+        dispatch_thread.join()
+        pool.shutdown(wait=True)
+    return pages
+
+def iter_crawl_checkpoint(checkpoint_path):
+    """
+    Yield (url, {"page_type": ..., "record": ...}) for each page in a crawl
+    checkpoint (one JSON object per completed page), one line at a time.
+    A partially written last line (e.g. from a killed run) is ignored so that
+    page is simply fetched again.
+    """
+    if not os.path.exists(checkpoint_path):
+        return
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield entry["url"], {"page_type": entry["page_type"], "record": entry["record"]}
+
+def trim_crawl_checkpoint(checkpoint_path, block_size=65536):
+    """
+    Cut a partially written last line (from a killed run) off a crawl
+    checkpoint, so the next appended page starts on a line of its own
+    instead of being glued onto the fragment and lost with it.
+    """
+    if not os.path.exists(checkpoint_path):
+        return
+    with open(checkpoint_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        # Scan back block by block for the last newline
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline != -1:
+                pos = start + newline + 1
+                break
+            pos = start
+        if pos < end:
+            f.truncate(pos)
+
+def load_crawl_checkpoint(checkpoint_path):
+    """Read a whole crawl checkpoint into {url: {"page_type": ..., "record": ...}}."""
+    return dict(iter_crawl_checkpoint(checkpoint_path))
+
+def page_link_urls(record):
+    """Normalised URLs of every link in a parsed page record."""
+    return [normalise_crawl_url(link["url"]) or link["url"] for link in extract_page_links(record)]
+
+def crawl_linked_pages(results, checkpoint_path, page_cache=None, fetch_workers=8,
+                       parse_workers=None, queue_size=32, keep_pages=True, record_store=None):
+    """
+    Follow every design/policy/standard/strategy link in 'results' (and any
+    further architecture-site links found on those pages) through
+    'run_page_pipeline'. Each completed page is appended to 'checkpoint_path'
+    straight away, so an interrupted crawl resumes without refetching finished
+    pages. Pages found unchanged in 'page_cache' are not re-parsed (their
+    records come from 'record_store' if the cache keeps them on disk).
+    Returns {url: {"page_type": ..., "record": ..., "links": [...]}}; with
+    'keep_pages=False' nothing is held in memory and the checkpoint file is
+    the only output (read it back with 'iter_crawl_pages').
+    """
+    # 1) Seed the frontier with the typed links from the export, then with
+    #    links from pages finished in a previous run
+    seeds = [
+        (link["url"], page_type)
+        for row in results
+        for field, page_type in LINK_FIELD_TYPES.items()
+        for link in row.get(field, [])
+    ]
+    pages = {}
+    done_urls = set()
+    for url, page in iter_crawl_checkpoint(checkpoint_path):
+        done_urls.add(url)
+        seeds.extend((link, None) for link in page_link_urls(page["record"]))
+        if keep_pages:
+            pages[url] = page
+    if done_urls:
+        print(f"Resuming crawl: {len(done_urls)} pages already in {checkpoint_path}")
+    # 2) Crawl; the writer stage appends each page to the checkpoint (after
+    #    dropping any half-written line a killed run left at its end)
+    trim_crawl_checkpoint(checkpoint_path)
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        def write_checkpoint(url, page_type, record):
+            checkpoint.write(json.dumps({"url": url, "page_type": page_type, "record": record}) + "\n")
+            checkpoint.flush()
+        pages.update(run_page_pipeline(
+            seeds, page_cache=page_cache, fetch_workers=fetch_workers,
+            parse_workers=parse_workers, queue_size=queue_size,
+            follow_links=True, skip_urls=done_urls, on_page=write_checkpoint,
+            keep_pages=keep_pages, record_store=record_store,
+        ))
+    for page in pages.values():
+        page["links"] = page_link_urls(page["record"])
+    return pages
 
-for item in data:
-    # --- 1) Parse domain/capability ---
+def iter_crawl_pages(checkpoint_path, chunk_size=500):
+    """
+    Stream a finished crawl back from its checkpoint as dicts of at most
+    'chunk_size' pages, {url: {"page_type", "record", "links"}}, so later
+    stages (snapshot, SQLite store, search index) never hold the whole crawl.
+    """
+    chunk = {}
+    for url, page in iter_crawl_checkpoint(checkpoint_path):
+        page["links"] = page_link_urls(page["record"])
+        chunk[url] = page
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+# Helper function to parse a field of multiple <a> links
+def parse_links_field(html_string):
+    """Returns a list of dicts: [{'text': 'Some Link', 'url': '...'}, ...]"""
+    soup = BeautifulSoup(html_string, "html.parser")
+    link_data = []
+    for link in soup.find_all("a"):
+        text = link.get_text(strip=True)
+        url = BASE_URL + link["href"]
+        link_data.append({"text": text, "url": url})
+    return link_data
+
+def parse_export_item(item):
+    """
+    Pull the domain/capability links and the designs/policies/standards/
+    strategies link lists out of one '/dynamic-data-export' row.
+    Returns None when the row has no domain link.
+    """
+    # 1) Parse domain/capability
     domain_html = item["Domain"]  # e.g. "<a href=\"/ai\">Artificial Intelligence (AI)</a>"
     capability_html = item["Capability"]  # e.g. "<a href=\"/generative-artificial-intelligence\">Generative Artificial Intelligence (GenAI)</a>"
     # Parse out the actual link and text from each field
-    domain_soup = BeautifulSoup(domain_html, "html.parser")
-    domain_a = domain_soup.find("a")
+    domain_a = BeautifulSoup(domain_html, "html.parser").find("a")
     if not domain_a:
-        continue  # No domain link found, skip
-    domain_text = domain_a.text.strip()
-    domain_href = domain_a["href"]
-    full_domain_link = BASE_URL + domain_href  # combine to get absolute URL
-    # Similarly for the capability:
-    capability_soup = BeautifulSoup(capability_html, "html.parser")
-    capability_a = capability_soup.find("a")
-    capability_text = capability_a.text.strip()
-    capability_href = capability_a["href"]
-    full_capability_link = BASE_URL + capability_href
-    # --- 2) Helper function to parse a field of multiple <a> links ---
-    def parse_links_field(html_string):
-        """Returns a list of dicts: [{'text': 'Some Link', 'url': '...'}, ...]"""
-        soup = BeautifulSoup(html_string, "html.parser")
-        link_data = []
-        for link in soup.find_all("a"):
-            text = link.get_text(strip=True)
-            url = BASE_URL + link["href"]
-            link_data.append({"text": text, "url": url})
-        return link_data
-        # --- 3) Parse designs/policies/standards/strategies ---
-    designs_html = item.get("Designs", "")
-    policies_html = item.get("Policies", "")
-    standards_html = item.get("Standards", "")
-    strategies_html = item.get("Strategies", "")
-    # Now apply the helper function
-    designs = parse_links_field(designs_html)
-    policies = parse_links_field(policies_html)
-    standards = parse_links_field(standards_html)
-    strategies = parse_links_field(strategies_html)
-    # --- 4) Filter to only the “Data and Analytics” or “AI” domain (if desired) ---
-    # If you only want certain domains, you can do:
-    if ("/data-and-analytics" not in domain_href) and ("/ai" not in domain_href):
-        continue
-    # --- 5) Extract information from the domain capability page ---
-    domain_info = parse_domain_page(full_domain_link)
-    capability_info = parse_capability_page(full_capability_link)
+        return None  # No domain link found, skip
+    capability_a = BeautifulSoup(capability_html, "html.parser").find("a")
+    # 2) Parse designs/policies/standards/strategies
+    return {
+        "domain_name": domain_a.text.strip(),
+        "domain_href": domain_a["href"],
+        "domain_url": BASE_URL + domain_a["href"],  # combine to get absolute URL
+        "capability_name": capability_a.text.strip(),
+        "capability_url": BASE_URL + capability_a["href"],
+        "designs": parse_links_field(item.get("Designs", "")),
+        "policies": parse_links_field(item.get("Policies", "")),
+        "standards": parse_links_field(item.get("Standards", "")),
+        "strategies": parse_links_field(item.get("Strategies", "")),
+    }
+
+def build_capability_record(entry, domain_info, capability_info):
+    """Combine an export entry with its parsed domain and capability pages."""
     capability_sections = capability_info.get("sections", {})
     definition_text = capability_sections.get("Definition")
     if not definition_text:
@@ -399,40 +793,319 @@ for item in data:
     objective_text = capability_sections.get("Objective", "Missing")
     purpose_text = capability_sections.get("Purpose", "Missing")
     wog_applicability_text = capability_sections.get("Whole of government applicability", "Missing")
-    # --- 6) Build the record and append to results ---
-    record = {
-        "domain_name": domain_text,
-        "domain_url": full_domain_link,
+    return {
+        "domain_name": entry["domain_name"],
+        "domain_url": entry["domain_url"],
         "domain_reference": domain_info['metadata']['Reference'],
         "domain_mandate": domain_info['metadata']['Mandate'],
         "domain_description": domain_info['description'],
-        "capability_name": capability_text,
-        "capability_url": full_capability_link,
+        "capability_name": entry["capability_name"],
+        "capability_url": entry["capability_url"],
         "capability_reference": capability_info['metadata']['Reference'],
         "capability_mandate": capability_info['metadata']['Mandate'],
         "capability_definition": definition_text,
         "capability_objective": objective_text,
         "capability_purpose": purpose_text,
         "capability_WoG_applicability": wog_applicability_text,
-        "designs": designs,
-        "policies": policies,
-        "standards": standards,
-        "strategies": strategies
+        "designs": entry["designs"],
+        "policies": entry["policies"],
+        "standards": entry["standards"],
+        "strategies": entry["strategies"]
     }
-    results.append(record)
 
-# --- 7) Convert results to a single DataFrame ---
-df = pd.DataFrame(results)
+# Column order of the capability records built by 'build_capability_record'
+RECORD_COLUMNS = [
+    "domain_name", "domain_url", "domain_reference", "domain_mandate", "domain_description",
+    "capability_name", "capability_url", "capability_reference", "capability_mandate",
+    "capability_definition", "capability_objective", "capability_purpose",
+    "capability_WoG_applicability", "designs", "policies", "standards", "strategies",
+]
+
+def capability_record_assembler(entries, on_record):
+    """
+    Returns an 'on_page' callback for 'run_page_pipeline' that builds each
+    capability record as soon as both its domain and capability pages are
+    parsed and hands it to 'on_record'. Parsed pages are only held until
+    every entry that needs them has been built, then dropped.
+    """
+    waiting = {}  # url -> entries still waiting on that page
+    for entry in entries:
+        for key in ("domain_url", "capability_url"):
+            waiting.setdefault(normalise_crawl_url(entry[key]), []).append(entry)
+    parsed = {}
+    def on_page(url, page_type, record):
+        parsed[url] = record
+        for entry in list(waiting.get(url, [])):
+            domain_url = normalise_crawl_url(entry["domain_url"])
+            capability_url = normalise_crawl_url(entry["capability_url"])
+            if domain_url not in parsed or capability_url not in parsed:
+                continue
+            on_record(build_capability_record(entry, parsed[domain_url], parsed[capability_url]))
+            for page_url in (domain_url, capability_url):
+                waiting[page_url].remove(entry)
+                if not waiting[page_url]:
+                    del waiting[page_url]
+                    del parsed[page_url]
+    return on_page
+
+def iter_jsonl_chunks(jsonl_path, chunk_size=500):
+    """Yield the records of a JSON-lines file as lists of at most 'chunk_size'."""
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = [json.loads(line) for line in itertools.islice(f, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+def write_records_table(records_path, csv_path, parquet_path=None, chunk_size=500):
+    """
+    Build the final CSV (and optionally Parquet) table from the streamed
+    records file one chunk at a time, so the full DataFrame never exists.
+    Parquet needs pyarrow; its link-list columns are stored as JSON strings
+    to keep one schema across chunks.
+    """
+    parquet_writer = None
+    if parquet_path:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("pyarrow is not installed; skipping Parquet output")
+            parquet_path = None
+    try:
+        for i, chunk in enumerate(iter_jsonl_chunks(records_path, chunk_size)):
+            chunk_df = pd.DataFrame(chunk, columns=RECORD_COLUMNS)
+            chunk_df.to_csv(csv_path, index=False, mode="w" if i == 0 else "a", header=(i == 0))
+            if parquet_path:
+                for col in LINK_FIELD_TYPES:
+                    chunk_df[col] = chunk_df[col].apply(json.dumps)
+                table = pa.Table.from_pandas(chunk_df.astype("string"), preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(parquet_path, table.schema)
+                parquet_writer.write_table(table)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+
+def write_snapshot_streaming(snapshot_path, results, checkpoint_path):
+    """Write the crawl snapshot JSON page by page straight from the checkpoint."""
+    with open(snapshot_path, "w", encoding="utf-8") as f:
+        f.write('{"capabilities": ' + json.dumps(results) + ', "pages": {')
+        first = True
+        for chunk in iter_crawl_pages(checkpoint_path):
+            for url, page in chunk.items():
+                f.write(("" if first else ", ") + json.dumps(url) + ": " + json.dumps(page))
+                first = False
+        f.write("}}")
+
+# Example usage
+#policy_url = "https://architecture.digital.gov.au/einvoicing-policy"
+#policy_data = parse_policy_page(policy_url)
+#print("Policy metadata:", policy_data["metadata"])
+#print("Policy headings => text:", policy_data["sections"])
+#standard_url = "https://architecture.digital.gov.au/einvoicing-standard"
+#standard_data = parse_standard_design_pages(standard_url)
+#design_url = "https://architecture.digital.gov.au/einvoicing-government-entities-govteams-site"
+#design_data = parse_standard_design_pages(design_url)
+
+##################################################
+# 3) Accessing Web Data
+##################################################
+
+# GOVT_BASE_URL can point at a local stand-in (see mock_upstream_server_v1.py)
+BASE_URL = os.environ.get("GOVT_BASE_URL", "https://architecture.digital.gov.au")
+EXPORT_ENDPOINT = BASE_URL + "/dynamic-data-export"
+
+# Crawl mode: set GOVT_CRAWL_LINKED=1 to also fetch every linked design,
+# policy, standard and strategy page (resumable via the checkpoint file)
+CRAWL_LINKED_PAGES = os.environ.get("GOVT_CRAWL_LINKED", "0") == "1"
+CRAWL_CHECKPOINT_PATH = os.environ.get("GOVT_CRAWL_CHECKPOINT", "govt_digital_infrastructure_crawl.jsonl")
+
+# Pipeline sizing: fetcher threads, parser processes (default: one per core)
+# and how many fetched-but-unparsed pages may queue up before fetchers wait
+FETCH_WORKERS = int(os.environ.get("GOVT_FETCH_WORKERS", "8"))
+PARSE_WORKERS = int(os.environ["GOVT_PARSE_WORKERS"]) if os.environ.get("GOVT_PARSE_WORKERS") else None
+PIPELINE_QUEUE_SIZE = int(os.environ.get("GOVT_QUEUE_SIZE", "32"))
+
+# Conditional recrawls: ETag/Last-Modified/body hash and parsed record per page.
+# Set GOVT_PAGE_CACHE= (empty) to always fetch and parse everything afresh.
+# In streaming mode only the validators stay in memory; the parsed records go
+# to GOVT_PAGE_RECORDS (default: the cache path + ".records.sqlite").
+PAGE_CACHE_PATH = os.environ.get("GOVT_PAGE_CACHE", "govt_digital_infrastructure_page_cache.json")
+PAGE_RECORDS_PATH = os.environ.get("GOVT_PAGE_RECORDS", PAGE_CACHE_PATH + ".records.sqlite" if PAGE_CACHE_PATH else "")
 
-# For example, show the first few rows
-print(df.head())
+# Relational output: set GOVT_SQLITE_DB to a path to also write normalised,
+# indexed domain/capability/document/link tables (see govt_architecture_store_v1.py)
+SQLITE_DB_PATH = os.environ.get("GOVT_SQLITE_DB", "")
+
+# Full-text search: set GOVT_SEARCH_INDEX to a path to keep a local BM25 index
+# of capability and page text up to date (see govt_architecture_search_v1.py)
+SEARCH_INDEX_PATH = os.environ.get("GOVT_SEARCH_INDEX", "")
+
+# Cross-reference graph: set GOVT_GRAPH to a .npz path to precompute CSR
+# adjacency over domains, capabilities and documents (see govt_architecture_graph_v1.py)
+GRAPH_PATH = os.environ.get("GOVT_GRAPH", "")
+
+# Page history: set GOVT_HISTORY_DB to a path to keep every crawled version of
+# the policy/design/standard/strategy pages as compressed deltas (see
+# govt_page_history_v1.py); needs GOVT_CRAWL_LINKED=1
+HISTORY_DB_PATH = os.environ.get("GOVT_HISTORY_DB", "")
+
+# Streaming mode: set GOVT_STREAM=1 to append records to a JSONL file as they
+# finish and build the CSV (and Parquet, if GOVT_PARQUET is set) from it in
+# chunks, keeping peak memory flat on whole-site crawls
+STREAM_RECORDS = os.environ.get("GOVT_STREAM", "0") == "1"
+RECORDS_PATH = os.environ.get("GOVT_RECORDS_JSONL", "govt_digital_infrastructure_records.jsonl")
+PARQUET_PATH = os.environ.get("GOVT_PARQUET", "")
+
+if __name__ == "__main__":
+    record_store = open_page_records(PAGE_RECORDS_PATH) if PAGE_CACHE_PATH and STREAM_RECORDS else None
+    page_cache = load_page_cache(PAGE_CACHE_PATH, record_store) if PAGE_CACHE_PATH else None
+
+    # Set PROFILE_DIR to profile each stage below (see profiling_v1.py)
+    with profile_stage("govt_export"):
+        response = http.get(EXPORT_ENDPOINT)
+
+    if response.status_code == 200:
+        data = response.json()   # Parse JSON response
+        print(data)
+    else:
+        print(f"Request failed with status code {response.status_code}")
 
-# Optionally, print `results` of your filtered list of domains/capabilities
-for row in results:
-    print(row["domain_text"], "->", row["capability_text"])
-    print("Link:", row["capability_url"])
-    print("------")
+    ##################################################
+    # 4) Extracting Features/Data
+    ##################################################
+
+    # --- 1) Parse the domain/capability and linked-document fields of each row ---
+    entries = [entry for entry in (parse_export_item(item) for item in data) if entry]
+
+    # --- 2) Filter to only the “Data and Analytics” or “AI” domain (if desired) ---
+    # If you only want certain domains, you can do:
+    entries = [
+        entry for entry in entries
+        if ("/data-and-analytics" in entry["domain_href"]) or ("/ai" in entry["domain_href"])
+    ]
+
+    # --- 3) Fetch and parse every domain and capability page through the pipeline ---
+    # (each domain page is fetched once, however many capabilities it has)
+    seeds = [(entry["domain_url"], "domain") for entry in entries]
+    seeds += [(entry["capability_url"], "capability") for entry in entries]
+
+    if STREAM_RECORDS:
+        # --- 4) Streaming: append each record to a JSONL file as soon as its pages are parsed ---
+        with open(RECORDS_PATH, "w", encoding="utf-8") as records_file:
+            def append_record(record):
+                records_file.write(json.dumps(record) + "\n")
+                records_file.flush()
+            with profile_stage("govt_pages"):
+                run_page_pipeline(
+                    seeds, page_cache=page_cache, fetch_workers=FETCH_WORKERS,
+                    parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+                    on_page=capability_record_assembler(entries, append_record), keep_pages=False,
+                    record_store=record_store,
+                )
+        save_page_cache(PAGE_CACHE_PATH, page_cache, record_store)
+        # --- 5) Build the CSV (and Parquet) from the records file in chunks ---
+        write_records_table(RECORDS_PATH, "govt_digital_infrastructure_website.csv", PARQUET_PATH)
+        # One row per capability, so these are small enough to reload for the later stages
+        results = [row for chunk in iter_jsonl_chunks(RECORDS_PATH) for row in chunk]
+        print(f"Streamed {len(results)} capability records to {RECORDS_PATH}")
+    else:
+        with profile_stage("govt_pages"):
+            pages = run_page_pipeline(
+                seeds, page_cache=page_cache, fetch_workers=FETCH_WORKERS,
+                parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE,
+            )
+
+        # --- 4) Build the records from the parsed pages ---
+        results = []
+        for entry in entries:
+            domain_page = pages.get(normalise_crawl_url(entry["domain_url"]))
+            capability_page = pages.get(normalise_crawl_url(entry["capability_url"]))
+            if not domain_page or not capability_page:
+                continue  # Fetch/parse failed (already reported), skip
+            results.append(build_capability_record(entry, domain_page["record"], capability_page["record"]))
+
+        # Persist validators/records so the next run can send conditional requests
+        save_page_cache(PAGE_CACHE_PATH, page_cache)
+
+        # --- 5) Convert results to a single DataFrame ---
+        df = pd.DataFrame(results)
+
+        # For example, show the first few rows
+        print(df.head())
+
+        # Optionally, print `results` of your filtered list of domains/capabilities
+        for row in results:
+            print(row["domain_name"], "->", row["capability_name"])
+            print("Link:", row["capability_url"])
+            print("------")
+
+        # Optionally, save to CSV or XLSX
+        df.to_csv("govt_digital_infrastructure_website.csv", index=False)
+        #df.to_excel("govt_digital_infrastructure_website.xlsx", index=False)
+
+    if SQLITE_DB_PATH:
+        write_sqlite_store(SQLITE_DB_PATH, results)
+    if SEARCH_INDEX_PATH:
+        update_search_index(SEARCH_INDEX_PATH, results)
+
+    # --- 6) Optionally, crawl every linked design/policy/standard/strategy page ---
+    if CRAWL_LINKED_PAGES:
+        with profile_stage("govt_crawl"):
+            linked_pages = crawl_linked_pages(
+                results, CRAWL_CHECKPOINT_PATH, page_cache=page_cache, fetch_workers=FETCH_WORKERS,
+                parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, keep_pages=not STREAM_RECORDS,
+                record_store=record_store,
+            )
+        save_page_cache(PAGE_CACHE_PATH, page_cache, record_store)
+        if STREAM_RECORDS:
+            # Every later stage reads the checkpoint back in chunks
+            write_snapshot_streaming("govt_digital_infrastructure_snapshot.json", results, CRAWL_CHECKPOINT_PATH)
+            conn = open_store(SQLITE_DB_PATH) if SQLITE_DB_PATH else None
+            index = load_index(SEARCH_INDEX_PATH) if SEARCH_INDEX_PATH else None
+            history = open_history(HISTORY_DB_PATH) if HISTORY_DB_PATH else None
+            crawled_at = now_iso()
+            crawled_urls = set()
+            for chunk in iter_crawl_pages(CRAWL_CHECKPOINT_PATH):
+                if conn is not None:
+                    # The capability records were written above; add pages only
+                    write_store(conn, [], chunk)
+                if index is not None:
+                    update_index_from_scrape(index, results, chunk)
+                    crawled_urls.update(chunk)
+                if history is not None:
+                    record_pages(history, chunk, crawled_at)
+            if conn is not None:
+                conn.close()
+            if history is not None:
+                history.close()
+            if index is not None:
+                # Drop capabilities and pages that are gone since the last crawl
+                prune_index(index, scrape_doc_ids(results, crawled_urls))
+                save_index(SEARCH_INDEX_PATH, index)
+            print("Crawl complete; pages streamed from", CRAWL_CHECKPOINT_PATH)
+        else:
+            snapshot = {"capabilities": results, "pages": linked_pages}
+            with open("govt_digital_infrastructure_snapshot.json", "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+            print(f"Crawled {len(linked_pages)} linked pages")
+            if SQLITE_DB_PATH:
+                write_sqlite_store(SQLITE_DB_PATH, results, linked_pages)
+            if SEARCH_INDEX_PATH:
+                update_search_index(SEARCH_INDEX_PATH, results, linked_pages)
+            if HISTORY_DB_PATH:
+                history = open_history(HISTORY_DB_PATH)
+                print("Page history:", record_pages(history, linked_pages))
+                history.close()
+        if GRAPH_PATH:
+            page_chunks = iter_crawl_pages(CRAWL_CHECKPOINT_PATH) if STREAM_RECORDS else [linked_pages]
+            save_graph(GRAPH_PATH, build_graph(results, page_chunks))
+        # The crawl finished, so the next run should recrawl (cheaply, via the
+        # page cache) rather than resume from this checkpoint
+        os.remove(CRAWL_CHECKPOINT_PATH)
+    elif GRAPH_PATH:
+        save_graph(GRAPH_PATH, build_graph(results))
 
-# Optionally, save to CSV or XLSX
-df.to_csv("govt_digital_infrastructure_website.csv", index=False)
-#df.to_excel("govt_digital_infrastructure_website.xlsx", index=False)
\ No newline at end of file
+    if record_store is not None:
+        record_store.close()
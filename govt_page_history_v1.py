@@ -0,0 +1,268 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import difflib
+import hashlib
+import json
+import re
+import sqlite3
+import sys
+import zlib
+from datetime import datetime, timezone
+
+##################################################
+# 2) Define Schema and Settings
+##################################################
+
+# Version history of the parsed policy/design/standard/strategy pages
+# ('parse_policy_page' / 'parse_standard_design_pages' records):
+#   pages    - one row per URL
+#   versions - one row per distinct content of a page, first and last seen:
+#              kind "key"   -> 'data' is the full record (zlib)
+#                   "delta" -> 'data' is a token diff against keyframe
+#                              'base_version' (zlib), so any version is one
+#                              keyframe + at most one delta away
+#                   "same"  -> content identical to 'base_version' (a page
+#                              reverted to an earlier text); no data
+# A recrawl with unchanged content only moves 'last_seen'; 'content_hash'
+# finds earlier identical versions.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    page_type TEXT
+);
+CREATE TABLE IF NOT EXISTS versions (
+    page_id INTEGER NOT NULL REFERENCES pages(id),
+    version INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    base_version INTEGER,
+    data BLOB,
+    raw_size INTEGER NOT NULL,
+    PRIMARY KEY (page_id, version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_versions_hash ON versions(page_id, content_hash);
+CREATE INDEX IF NOT EXISTS idx_versions_seen ON versions(page_id, first_seen);
+"""
+
+HISTORY_PAGE_TYPES = {"policy", "design", "standard", "strategy"}
+
+# A new keyframe after this many versions since the last one, or when a
+# delta would be more than KEYFRAME_RATIO of the compressed full record
+KEYFRAME_INTERVAL = 8
+KEYFRAME_RATIO = 0.5
+
+##################################################
+# 3) Encode Versions
+##################################################
+
+def canonical_text(record):
+    """Stable JSON text of a record (sorted keys, one field per line)."""
+    return json.dumps(record, sort_keys=True, indent=1, ensure_ascii=False)
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def tokens(text):
+    """
+    Split canonical JSON into diffable tokens at real newlines and at
+    escaped ones (so a paragraph of a long body text is its own token).
+    Joining the tokens gives back exactly 'text'.
+    """
+    return [t for t in re.split(r"(\n|\\n)", text) if t]
+
+def make_delta(base_tokens, new_tokens):
+    """Ops rebuilding 'new_tokens' from 'base_tokens': [i1, i2] copies a base range, a list inserts tokens."""
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append(new_tokens[j1:j2])
+    return ops
+
+def apply_delta(base_tokens, ops):
+    out = []
+    for op in ops:
+        if len(op) == 2 and isinstance(op[0], int):
+            out.extend(base_tokens[op[0]:op[1]])
+        else:
+            out.extend(op)
+    return "".join(out)
+
+def pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+##################################################
+# 4) Record and Read Versions
+##################################################
+
+def open_history(db_path):
+    """Open (creating if needed) the history database."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def now_iso():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def version_text(conn, page_id, version):
+    """Full canonical text of one version (keyframe, or keyframe + delta)."""
+    kind, base_version, data = conn.execute(
+        "SELECT kind, base_version, data FROM versions WHERE page_id = ? AND version = ?",
+        (page_id, version),
+    ).fetchone()
+    if kind == "key":
+        return unpack(data)
+    if kind == "same":
+        return version_text(conn, page_id, base_version)
+    return apply_delta(tokens(version_text(conn, page_id, base_version)), unpack(data))
+
+def record_page(conn, url, page_type, record, crawled_at):
+    """
+    Add one crawl of a page; returns "new", "changed", "reverted" or
+    "unchanged". Call inside a transaction (see 'record_pages').
+    """
+    text = canonical_text(record)
+    digest = content_hash(text)
+    conn.execute("INSERT OR IGNORE INTO pages (url, page_type) VALUES (?, ?)", (url, page_type))
+    page_id = conn.execute("SELECT id FROM pages WHERE url = ?", (url,)).fetchone()[0]
+    latest = conn.execute(
+        "SELECT version, content_hash FROM versions WHERE page_id = ? ORDER BY version DESC LIMIT 1",
+        (page_id,),
+    ).fetchone()
+    # 1) Same content as the latest version: just note that it was seen again
+    if latest and latest[1] == digest:
+        conn.execute("UPDATE versions SET last_seen = ? WHERE page_id = ? AND version = ?",
+                     (crawled_at, page_id, latest[0]))
+        return "unchanged"
+    version = latest[0] + 1 if latest else 1
+    row = (page_id, version, crawled_at, crawled_at, digest)
+    # 2) Content seen before (a revert): point at that version
+    earlier = conn.execute(
+        "SELECT version FROM versions WHERE page_id = ? AND content_hash = ? AND kind != 'same' LIMIT 1",
+        (page_id, digest),
+    ).fetchone()
+    if earlier:
+        conn.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?, 'same', ?, NULL, ?)",
+                     row + (earlier[0], len(text)))
+        return "reverted"
+    # 3) New content: a delta against the current keyframe, unless a fresh
+    #    keyframe is due (interval reached, or the delta isn't much smaller)
+    full = pack(text)
+    if latest:
+        key_version = conn.execute(
+            "SELECT MAX(version) FROM versions WHERE page_id = ? AND kind = 'key'", (page_id,)
+        ).fetchone()[0]
+        if version - key_version < KEYFRAME_INTERVAL:
+            delta = pack(make_delta(tokens(version_text(conn, page_id, key_version)), tokens(text)))
+            if len(delta) <= KEYFRAME_RATIO * len(full):
+                conn.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?, 'delta', ?, ?, ?)",
+                             row + (key_version, delta, len(text)))
+                return "changed"
+    conn.execute("INSERT INTO versions VALUES (?, ?, ?, ?, ?, 'key', NULL, ?, ?)", row + (full, len(text)))
+    return "changed" if latest else "new"
+
+def record_pages(conn, pages, crawled_at=None, page_types=HISTORY_PAGE_TYPES):
+    """
+    Add a crawl's parsed pages ({url: {"page_type", "record", ...}}, as from
+    the government scraper's crawl mode) in one transaction. Only
+    'page_types' are kept. Returns counts per outcome.
+    """
+    crawled_at = crawled_at or now_iso()
+    counts = {"new": 0, "changed": 0, "reverted": 0, "unchanged": 0}
+    with conn:
+        for url, page in pages.items():
+            if page.get("page_type") in page_types and page.get("record") is not None:
+                counts[record_page(conn, url, page["page_type"], page["record"], crawled_at)] += 1
+    return counts
+
+def page_id_of(conn, url):
+    row = conn.execute("SELECT id FROM pages WHERE url = ?", (url,)).fetchone()
+    if row is None:
+        raise KeyError(f"No history for {url}")
+    return row[0]
+
+def version_at(conn, page_id, at):
+    """Version current at crawl time 'at' (ISO date or timestamp), or None if the page wasn't seen yet."""
+    row = conn.execute(
+        "SELECT MAX(version) FROM versions WHERE page_id = ? AND first_seen <= ?", (page_id, at_bound(at))
+    ).fetchone()
+    return row[0]
+
+def at_bound(at):
+    # A bare date means "any time that day"
+    return at + "T23:59:59Z" if len(at) == 10 else at
+
+def get_record(conn, url, version=None, at=None):
+    """A page record: the latest version, a given 'version', or the one current 'at' a crawl date."""
+    page_id = page_id_of(conn, url)
+    if version is None:
+        version = version_at(conn, page_id, at) if at else conn.execute(
+            "SELECT MAX(version) FROM versions WHERE page_id = ?", (page_id,)).fetchone()[0]
+    if version is None:
+        return None
+    return json.loads(version_text(conn, page_id, version))
+
+def page_versions(conn, url):
+    """Version list of a page: version, first/last seen, kind, base, stored and raw size, hash."""
+    cursor = conn.execute(
+        """SELECT version, first_seen, last_seen, kind, base_version,
+                  COALESCE(LENGTH(data), 0) AS stored_size, raw_size, content_hash
+           FROM versions WHERE page_id = ? ORDER BY version""",
+        (page_id_of(conn, url),),
+    )
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def diff_versions(conn, url, at_a, at_b, context=2):
+    """
+    Unified diff (list of lines) between the page as crawled at 'at_a' and
+    at 'at_b' (ISO dates/timestamps, or version numbers as ints). Long text
+    fields are split at their line breaks, so the diff shows paragraphs.
+    """
+    page_id = page_id_of(conn, url)
+    sides = []
+    for at in (at_a, at_b):
+        version = at if isinstance(at, int) else version_at(conn, page_id, at)
+        text = version_text(conn, page_id, version) if version else ""
+        lines = "".join("\n" if t == "\\n" else t for t in tokens(text)).splitlines()
+        sides.append((lines, version))
+    (a, version_a), (b, version_b) = sides
+    return list(difflib.unified_diff(a, b, f"{url}@v{version_a}", f"{url}@v{version_b}", n=context, lineterm=""))
+
+def history_summary(conn):
+    """Pages, versions, and stored vs full-copy bytes across the history."""
+    pages, versions, stored, raw = conn.execute(
+        """SELECT (SELECT COUNT(*) FROM pages), COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(raw_size), 0)
+           FROM versions"""
+    ).fetchone()
+    return {"pages": pages, "versions": versions, "stored_bytes": stored, "full_copy_bytes": raw}
+
+##################################################
+# 5) Inspect the History
+##################################################
+
+# Usage: python govt_page_history_v1.py <history.sqlite> [url [date_a date_b]]
+#   no url      -> size summary
+#   url         -> that page's versions
+#   url a b     -> diff between the versions current at crawl dates a and b
+if __name__ == "__main__":
+    conn = open_history(sys.argv[1])
+    if len(sys.argv) == 2:
+        print(history_summary(conn))
+    elif len(sys.argv) == 3:
+        for row in page_versions(conn, sys.argv[2]):
+            print(row)
+    else:
+        print("\n".join(diff_versions(conn, sys.argv[2], sys.argv[3], sys.argv[4])))
+    conn.close()
@@ -0,0 +1,342 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from extract_map_disasters_v1 import load_mirror_index, load_tile
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Rough Queensland bounding box (min_lon, min_lat, max_lon, max_lat)
+QLD_BBOX = (137.9, -29.2, 153.6, -9.0)
+
+# Local equirectangular projection to kilometres (good enough at state scale)
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_AT_EQUATOR = 111.320
+
+# Feature properties that may hold a hazard severity/class, checked in order,
+# and how to rank the usual values when a facility sits in several features
+SEVERITY_PROPERTIES = ["severity", "hazard_level", "hazard_class", "class", "category", "level"]
+SEVERITY_RANK = {"very low": 1, "low": 2, "medium": 3, "moderate": 3, "high": 4, "very high": 5, "extreme": 6}
+
+# Grid cell size (km) of the hazard edge index, and how far to look for the nearest hazard
+HAZARD_CELL_KM = 5.0
+MAX_HAZARD_DISTANCE_KM = 50.0
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def project_km(lon, lat, lat0):
+    """Project lon/lat (degrees, arrays) to x/y kilometres around latitude 'lat0'."""
+    x = np.asarray(lon, dtype=float) * KM_PER_DEG_LON_AT_EQUATOR * np.cos(np.radians(lat0))
+    y = np.asarray(lat, dtype=float) * KM_PER_DEG_LAT
+    return x, y
+
+def load_mirror_layer(mirror_dir, layer_id, index=None):
+    """Every feature of one mirrored layer, read once from its tiles (deduplicated)."""
+    index = index or load_mirror_index(mirror_dir)
+    features = {}
+    for tile_name in index["layers"][str(layer_id)]["tiles"]:
+        for feature in load_tile(mirror_dir, str(layer_id), tile_name):
+            features[feature["_mirror_id"]] = feature
+    return [features[k] for k in sorted(features)]
+
+def feature_severity(feature):
+    """The feature's severity/class label (first of SEVERITY_PROPERTIES present), or None."""
+    properties = feature.get("properties") or {}
+    for key in SEVERITY_PROPERTIES:
+        if properties.get(key) not in (None, ""):
+            return str(properties[key])
+    return None
+
+def geometry_parts(geometry):
+    """Yield (coordinate list, is_area) for each ring/line/point of a GeoJSON geometry."""
+    geometry_type = geometry.get("type") if geometry else None
+    coords = geometry.get("coordinates") if geometry else None
+    if geometry_type == "Polygon":
+        for ring in coords:
+            yield ring, True
+    elif geometry_type == "MultiPolygon":
+        for polygon in coords:
+            for ring in polygon:
+                yield ring, True
+    elif geometry_type == "LineString":
+        yield coords, False
+    elif geometry_type == "MultiLineString":
+        for line in coords:
+            yield line, False
+    elif geometry_type == "Point":
+        yield [coords, coords], False
+    elif geometry_type == "MultiPoint":
+        for point in coords:
+            yield [point, point], False
+    elif geometry_type == "GeometryCollection":
+        for part in geometry.get("geometries", []):
+            yield from geometry_parts(part)
+
+def build_hazard_index(features, lat0, cell_km=HAZARD_CELL_KM):
+    """
+    Flatten a layer's geometries into edge arrays (in km) and index them:
+      - edges x1/y1/x2/y2 with their feature id and whether they bound an area
+        (polygon rings, used for containment) or not (lines/points);
+      - per-feature bounding boxes and severity labels;
+      - a uniform grid of 'cell_km' cells, stored CSR-style (cell -> edge ids),
+        for nearest-edge searches, and its rows (row -> area edge ids whose
+        y-range touches the row), for containment tests.
+    """
+    x1, y1, x2, y2, feature_ids, is_area = [], [], [], [], [], []
+    for f, feature in enumerate(features):
+        for coords, area in geometry_parts(feature.get("geometry")):
+            pts = np.asarray([p[:2] for p in coords], dtype=float)
+            if len(pts) < 2:
+                continue
+            if area and not np.array_equal(pts[0], pts[-1]):
+                pts = np.vstack([pts, pts[:1]])
+            px, py = project_km(pts[:, 0], pts[:, 1], lat0)
+            x1.append(px[:-1]); y1.append(py[:-1]); x2.append(px[1:]); y2.append(py[1:])
+            feature_ids.append(np.full(len(pts) - 1, f))
+            is_area.append(np.full(len(pts) - 1, area))
+    if not x1:
+        return None
+    hz = {
+        "x1": np.concatenate(x1), "y1": np.concatenate(y1),
+        "x2": np.concatenate(x2), "y2": np.concatenate(y2),
+        "feature": np.concatenate(feature_ids), "is_area": np.concatenate(is_area),
+        "severity": np.array([feature_severity(f) for f in features], dtype=object),
+        "n_features": len(features), "cell_km": cell_km,
+    }
+    # Uniform grid over all edges: each edge is registered in every cell its bbox touches
+    ex0 = np.minimum(hz["x1"], hz["x2"]); ex1 = np.maximum(hz["x1"], hz["x2"])
+    ey0 = np.minimum(hz["y1"], hz["y2"]); ey1 = np.maximum(hz["y1"], hz["y2"])
+    hz["origin"] = (ex0.min(), ey0.min())
+    cx0 = ((ex0 - hz["origin"][0]) // cell_km).astype(np.int64); cx1 = ((ex1 - hz["origin"][0]) // cell_km).astype(np.int64)
+    cy0 = ((ey0 - hz["origin"][1]) // cell_km).astype(np.int64); cy1 = ((ey1 - hz["origin"][1]) // cell_km).astype(np.int64)
+    hz["nx"], hz["ny"] = int(cx1.max()) + 1, int(cy1.max()) + 1
+    spans_x, spans_y = cx1 - cx0 + 1, cy1 - cy0 + 1
+    counts = spans_x * spans_y
+    edge_ids = np.repeat(np.arange(len(ex0)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = (cx0[edge_ids] + offsets // spans_y[edge_ids]) * hz["ny"] + (cy0[edge_ids] + offsets % spans_y[edge_ids])
+    order = np.argsort(cells, kind="stable")
+    hz["cell_edges"] = edge_ids[order]
+    hz["cell_indptr"] = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=hz["nx"] * hz["ny"]))))
+    # Area edges by (feature, grid row): a ray cast in +x from a point only
+    # crosses edges of its own row, and only features whose cells cover the
+    # point can contain it
+    area_ids = np.nonzero(hz["is_area"])[0]
+    counts = cy1[area_ids] - cy0[area_ids] + 1
+    row_ids = np.repeat(area_ids, counts)
+    rows = cy0[row_ids] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keys = hz["feature"][row_ids] * hz["ny"] + rows
+    order = np.argsort(keys, kind="stable")
+    hz["row_edges"] = row_ids[order]
+    hz["row_keys"], hz["row_starts"], hz["row_counts"] = np.unique(keys[order], return_index=True, return_counts=True)
+    features_bbox = np.full((len(features), 4), -1, dtype=np.int64)
+    if len(area_ids):
+        area_features = hz["feature"][area_ids]
+        for col, values, init, reducer in ((0, cx0, np.iinfo(np.int64).max, np.minimum),
+                                           (1, cy0, np.iinfo(np.int64).max, np.minimum),
+                                           (2, cx1, -1, np.maximum), (3, cy1, -1, np.maximum)):
+            column = np.full(len(features), init, dtype=np.int64)
+            reducer.at(column, area_features, values[area_ids])
+            features_bbox[:, col] = column
+        features_bbox[features_bbox[:, 2] < 0] = -1
+    hz["cell_bbox"] = features_bbox  # per feature: first/last cell column and row of its area edges (-1: none)
+    return hz
+
+def contained_features(px, py, hz, max_pairs=5_000_000):
+    """
+    Even-odd (ray casting) containment of all points against every area
+    feature at once. Candidates come from the grid: points are bucketed by
+    cell, and each feature only takes the points in the cells its area
+    edges span. A ray cast in +x can only cross edges of the point's own
+    grid row, so each (point, feature) candidate is tested against just
+    that feature's edges in that row (in batches of at most 'max_pairs').
+    Returns (point index array, feature index array) of containing pairs.
+    """
+    empty = np.array([], dtype=np.int64)
+    cell, nx, ny = hz["cell_km"], hz["nx"], hz["ny"]
+    # 1) Points sorted by cell (row-major, so a row of cells is one key range)
+    col = np.floor((px - hz["origin"][0]) / cell)
+    row = np.floor((py - hz["origin"][1]) / cell)
+    on_grid = np.nonzero((col >= 0) & (col < nx) & (row >= 0) & (row < ny))[0]
+    point_keys = row[on_grid].astype(np.int64) * nx + col[on_grid].astype(np.int64)
+    order = np.argsort(point_keys, kind="stable")
+    sorted_points, point_keys = on_grid[order], point_keys[order]
+    # 2) (point, feature) candidates: every point in each row of a feature's cells
+    bbox = hz["cell_bbox"]
+    features = np.nonzero(bbox[:, 0] >= 0)[0]
+    span = bbox[features, 3] - bbox[features, 1] + 1
+    feature_rows = np.repeat(features, span)
+    rows = bbox[feature_rows, 1] + np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+    first = np.searchsorted(point_keys, rows * nx + bbox[feature_rows, 0], side="left")
+    last = np.searchsorted(point_keys, rows * nx + bbox[feature_rows, 2], side="right")
+    counts = last - first
+    candidate = np.repeat(np.arange(len(counts)), counts)
+    slots = np.repeat(first, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_point, pair_feature, pair_row = sorted_points[slots], feature_rows[candidate], rows[candidate]
+    # 3) Each candidate's edges: its feature's area edges in its row
+    keys = pair_feature * ny + pair_row
+    slot = np.minimum(np.searchsorted(hz["row_keys"], keys), max(len(hz["row_keys"]) - 1, 0))
+    found = hz["row_keys"][slot] == keys if len(hz["row_keys"]) else np.zeros(len(keys), dtype=bool)
+    starts = np.where(found, hz["row_starts"][slot], 0)
+    counts = np.where(found, hz["row_counts"][slot], 0)
+    totals = np.cumsum(counts)
+    hit_points, hit_features = [], []
+    begin = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        while begin < len(keys):
+            # Whole candidates per batch, so each one's crossings are counted together
+            base = totals[begin - 1] if begin else 0
+            end = max(int(np.searchsorted(totals, base + max_pairs, side="right")), begin + 1)
+            batch_counts = counts[begin:end]
+            owner = np.repeat(np.arange(end - begin), batch_counts)
+            edges = hz["row_edges"][np.repeat(starts[begin:end], batch_counts) + np.arange(batch_counts.sum())
+                                    - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)]
+            x1, y1, x2, y2 = (hz[k][edges] for k in ("x1", "y1", "x2", "y2"))
+            cx, cy = px[pair_point[begin:end][owner]], py[pair_point[begin:end][owner]]
+            crosses = ((y1 > cy) != (y2 > cy)) & (cx < x1 + (cy - y1) * (x2 - x1) / (y2 - y1))
+            inside = np.bincount(owner[crosses], minlength=end - begin) % 2 == 1
+            hit_points.append(pair_point[begin:end][inside])
+            hit_features.append(pair_feature[begin:end][inside])
+            begin = end
+    if not hit_points:
+        return empty, empty
+    return np.concatenate(hit_points), np.concatenate(hit_features)
+
+def nearest_hazard(px, py, hz, max_distance_km=MAX_HAZARD_DISTANCE_KM):
+    """
+    Distance (km) from every point to the nearest hazard edge and that edge's
+    feature, searching the grid in growing rings of cells for all unresolved
+    points at once. Points with nothing within 'max_distance_km' get NaN / -1.
+    """
+    n = len(px)
+    best = np.full(n, np.inf)
+    best_feature = np.full(n, -1)
+    cell = hz["cell_km"]
+    ix = np.floor((px - hz["origin"][0]) / cell).astype(np.int64)
+    iy = np.floor((py - hz["origin"][1]) / cell).astype(np.int64)
+    max_ring = int(np.ceil(max_distance_km / cell)) + 1
+    # Points far outside the grid can start at the first ring that reaches it
+    start_ring = np.maximum.reduce([-ix, ix - (hz["nx"] - 1), -iy, iy - (hz["ny"] - 1), np.zeros(n, dtype=np.int64)])
+    for ring in range(max_ring + 1):
+        # Unprocessed edges are at least (ring - 1) cells away
+        active = np.nonzero((best > max(ring - 1, 0) * cell) & (start_ring <= ring))[0]
+        if not len(active):
+            break
+        if ring == 0:
+            offsets = np.array([[0, 0]])
+        else:
+            r = np.arange(-ring, ring + 1)
+            offsets = np.unique(np.vstack([
+                np.column_stack([r, np.full_like(r, -ring)]), np.column_stack([r, np.full_like(r, ring)]),
+                np.column_stack([np.full_like(r, -ring), r]), np.column_stack([np.full_like(r, ring), r]),
+            ]), axis=0)
+        cx = (ix[active, None] + offsets[:, 0]).ravel()
+        cy = (iy[active, None] + offsets[:, 1]).ravel()
+        owner = np.repeat(active, len(offsets))
+        valid = (cx >= 0) & (cx < hz["nx"]) & (cy >= 0) & (cy < hz["ny"])
+        cells, owner = cx[valid] * hz["ny"] + cy[valid], owner[valid]
+        counts = hz["cell_indptr"][cells + 1] - hz["cell_indptr"][cells]
+        if not counts.sum():
+            continue
+        pair_point = np.repeat(owner, counts)
+        pair_edge = hz["cell_edges"][
+            np.repeat(hz["cell_indptr"][cells], counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        ]
+        x1, y1, x2, y2 = (hz[k][pair_edge] for k in ("x1", "y1", "x2", "y2"))
+        qx, qy = px[pair_point], py[pair_point]
+        dx, dy = x2 - x1, y2 - y1
+        length2 = dx * dx + dy * dy
+        t = np.clip(((qx - x1) * dx + (qy - y1) * dy) / np.where(length2 > 0, length2, 1), 0, 1)
+        dist = np.hypot(qx - (x1 + t * dx), qy - (y1 + t * dy))
+        order = np.lexsort((dist, pair_point))
+        first = order[np.r_[True, pair_point[order][1:] != pair_point[order][:-1]]]
+        points, dists = pair_point[first], dist[first]
+        better = dists < best[points]
+        best[points[better]] = dists[better]
+        best_feature[points[better]] = hz["feature"][pair_edge[first][better]]
+    too_far = best > max_distance_km
+    best[too_far] = np.nan
+    best_feature[too_far] = -1
+    return best, best_feature
+
+def severity_rank(labels):
+    """Numeric rank of severity labels (unknown labels rank 0)."""
+    return np.array([SEVERITY_RANK.get(str(l).strip().lower(), 0) if l is not None else -1 for l in labels])
+
+def score_facilities(df, mirror_dir, layer_ids=None, layer_names=None, max_distance_km=MAX_HAZARD_DISTANCE_KM):
+    """
+    Add hazard exposure columns to 'df' (facilities with coord_x = longitude,
+    coord_y = latitude) for every mirrored layer (or 'layer_ids'):
+      <name>_contained    - facility lies inside a hazard polygon
+      <name>_distance_km  - distance to the nearest hazard geometry (0 inside)
+      <name>_severity     - severity of the containing (or else nearest) feature
+    Each layer's geometries are loaded and indexed once; all facilities are
+    scored together with array operations. Column prefix defaults to
+    "hazard_<layer_id>" unless 'layer_names' maps the id to a name.
+    """
+    index = load_mirror_index(mirror_dir)
+    layer_ids = [str(l) for l in (layer_ids or index["layers"])]
+    layer_names = {str(k): v for k, v in (layer_names or {}).items()}
+    lon = pd.to_numeric(df["coord_x"], errors="coerce").to_numpy()
+    lat = pd.to_numeric(df["coord_y"], errors="coerce").to_numpy()
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    lat0 = np.nanmean(lat[valid]) if valid.any() else 0.0
+    px, py = project_km(lon[valid], lat[valid], lat0)
+    out = df.copy()
+    for layer_id in layer_ids:
+        name = layer_names.get(layer_id, f"hazard_{layer_id}")
+        contained = np.zeros(len(df), dtype=bool)
+        distance = np.full(len(df), np.nan)
+        severity = np.full(len(df), None, dtype=object)
+        hz = build_hazard_index(load_mirror_layer(mirror_dir, layer_id, index), lat0)
+        if hz is not None and valid.any():
+            dist, nearest = nearest_hazard(px, py, hz, max_distance_km)
+            sev = np.where(nearest >= 0, hz["severity"][np.maximum(nearest, 0)], None)
+            # Containment overrides distance/severity; keep the most severe containing feature
+            points, features = contained_features(px, py, hz)
+            if len(points):
+                order = np.lexsort((-severity_rank(hz["severity"][features]), points))
+                first = order[np.r_[True, points[order][1:] != points[order][:-1]]]
+                dist[points[first]] = 0.0
+                sev[points[first]] = hz["severity"][features[first]]
+                inside = np.zeros(len(px), dtype=bool)
+                inside[points] = True
+                contained[valid] = inside
+            distance[valid] = dist
+            severity[valid] = sev
+        out[f"{name}_contained"] = contained
+        out[f"{name}_distance_km"] = distance
+        out[f"{name}_severity"] = severity
+    return out
+
+def queensland_facilities(df):
+    """Facilities whose coordinates fall inside the Queensland bounding box."""
+    lon = pd.to_numeric(df["coord_x"], errors="coerce")
+    lat = pd.to_numeric(df["coord_y"], errors="coerce")
+    in_box = lon.between(QLD_BBOX[0], QLD_BBOX[2]) & lat.between(QLD_BBOX[1], QLD_BBOX[3])
+    if "country" in df.columns:
+        in_box &= df["country"].astype(str).eq("Australia")
+    return df[in_box]
+
+##################################################
+# 4) Score the Data Centres
+##################################################
+
+# Usage: SPP_MIRROR_DIR=spp_mirror python hazard_exposure_v1.py
+# (build the mirror first with extract_map_disasters_v1.py)
+MIRROR_DIR = os.environ.get("SPP_MIRROR_DIR", "spp_mirror")
+
+if __name__ == "__main__":
+    facilities = queensland_facilities(pd.read_csv("datacenter_map_data.csv"))
+    scored = score_facilities(facilities, MIRROR_DIR)
+    print(scored.filter(regex="^(name|company_name|hazard_)").head())
+    scored.to_csv("datacenter_hazard_exposure.csv", index=False)
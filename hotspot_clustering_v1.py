@@ -0,0 +1,222 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from buildout_projection_v1 import SCENARIOS
+from reverse_geocode_v1 import expand_ranges
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# DBSCAN parameters: facilities within HOTSPOT_EPS_KM of each other are
+# neighbours; a facility with at least HOTSPOT_MIN_FACILITIES neighbours
+# (itself included) is a core point, and connected core points form a hotspot
+HOTSPOT_EPS_KM = float(os.environ.get("HOTSPOT_EPS_KM", "10"))
+HOTSPOT_MIN_FACILITIES = int(os.environ.get("HOTSPOT_MIN_FACILITIES", "5"))
+HOTSPOT_PATH = os.environ.get("HOTSPOT_PATH", "datacenter_hotspots.csv")
+# Candidate pairs expanded per batch (bounds memory on very dense campuses)
+PAIR_CHUNK = 4_000_000
+
+EARTH_RADIUS_KM = 6371.0088
+HOURS_PER_YEAR = 8766
+# Water estimate uses the baseline projection scenario's utilisation and WUE
+BASELINE = SCENARIOS[0]
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def unit_vectors(lon, lat):
+    """Points on the unit sphere (n, 3): chord distance is monotone in great-circle distance, no wrap-around."""
+    lon, lat = np.radians(lon), np.radians(lat)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+def chord_length(km):
+    return 2 * np.sin(km / (2 * EARTH_RADIUS_KM))
+
+def neighbour_pairs(xyz, eps_km, chunk=PAIR_CHUNK):
+    """
+    Every pair (i, j), i != j, within 'eps_km', each pair once, as two int64
+    arrays. Points are bucketed into a 3-D grid of cells one chord-eps wide,
+    so a point's neighbours can only sit in its own cell or the 26 around
+    it; only half of those offsets are visited (the other half is the same
+    pair seen from the other side). Cost is linear in the number of
+    candidate pairs, never n^2.
+    """
+    eps = chord_length(eps_km)
+    n = len(xyz)
+    # 1) Cell keys, points sorted by cell, and each occupied cell's range
+    cells = np.floor((xyz + 1) / eps).astype(np.int64)
+    span = int(cells.max()) + 3 if n else 3
+    cells += 1
+    keys = (cells[:, 0] * span + cells[:, 1]) * span + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_xyz = xyz[order]
+    cell_keys, cell_starts, cell_counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+    point_cell = np.repeat(np.arange(len(cell_keys)), cell_counts)
+    offsets = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)]
+    pairs_i, pairs_j = [], []
+    # 2) Same cell (later points only), then the 13 forward neighbour cells
+    for offset in [None] + offsets:
+        if offset is None:
+            starts = np.arange(1, n + 1)
+            counts = cell_starts[point_cell] + cell_counts[point_cell] - starts
+        else:
+            target = cell_keys + (offset[0] * span + offset[1]) * span + offset[2]
+            slot = np.minimum(np.searchsorted(cell_keys, target), len(cell_keys) - 1)
+            found = cell_keys[slot] == target
+            starts = np.where(found, cell_starts[slot], 0)[point_cell]
+            counts = np.where(found, cell_counts[slot], 0)[point_cell]
+        # 3) Expand candidate ranges in bounded batches and keep pairs within eps
+        totals = np.cumsum(counts)
+        begin = 0
+        while begin < n:
+            base = totals[begin - 1] if begin else 0
+            end = max(int(np.searchsorted(totals, base + chunk, side="right")), begin + 1)
+            owners, candidates = expand_ranges(starts[begin:end], counts[begin:end])
+            owners += begin
+            d = sorted_xyz[owners] - sorted_xyz[candidates]
+            close = np.einsum("ij,ij->i", d, d) <= eps * eps
+            pairs_i.append(order[owners[close]])
+            pairs_j.append(order[candidates[close]])
+            begin = end
+    if not pairs_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+def connected_labels(n, a, b):
+    """
+    Connected components of the graph with edges (a, b): every node ends up
+    labelled with the smallest node index in its component. Vectorised
+    hook-and-compress (union-find over all edges at once): after pointer
+    jumping every label is a root, so hooking the larger root of each
+    unsatisfied edge onto the smaller one is a plain scatter (whichever
+    write wins, labels only decrease), repeated until no edge is left.
+    """
+    labels = np.arange(n)
+    while True:
+        la, lb = labels[a], labels[b]
+        pending = la != lb
+        if not pending.any():
+            return labels
+        a, b, la, lb = a[pending], b[pending], la[pending], lb[pending]
+        labels[np.maximum(la, lb)] = np.minimum(la, lb)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+def dbscan(lon, lat, eps_km=HOTSPOT_EPS_KM, min_samples=HOTSPOT_MIN_FACILITIES):
+    """
+    DBSCAN over lon/lat degrees with great-circle 'eps_km'. Returns a cluster
+    label per point (0, 1, ... by descending size; -1 for noise). Points
+    without coordinates are noise.
+    """
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    result = np.full(len(lon), -1, dtype=np.int64)
+    if not len(valid):
+        return result
+    n = len(valid)
+    i, j = neighbour_pairs(unit_vectors(lon[valid], lat[valid]), eps_km)
+    # 1) Core points: enough neighbours, counting the point itself
+    neighbours = 1 + np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+    core = neighbours >= min_samples
+    # 2) Clusters are the connected components of core-core edges
+    both = core[i] & core[j]
+    labels = connected_labels(n, i[both], j[both])
+    # 3) Border points join (one of) their core neighbours' clusters
+    labels = np.where(core, labels, -1)
+    border = core[i] & ~core[j]
+    labels[j[border]] = labels[i[border]]
+    border = core[j] & ~core[i]
+    labels[i[border]] = labels[j[border]]
+    # 4) Renumber clusters by descending size
+    clustered = labels >= 0
+    if clustered.any():
+        roots, inverse, sizes = np.unique(labels[clustered], return_inverse=True, return_counts=True)
+        rank = np.empty(len(roots), dtype=np.int64)
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(roots))
+        labels[clustered] = rank[inverse]
+    result[valid] = labels
+    return result
+
+def cluster_facilities(df, eps_km=HOTSPOT_EPS_KM, min_samples=HOTSPOT_MIN_FACILITIES):
+    """A copy of 'df' with a 'hotspot' column (cluster number, -1 for none)."""
+    lon = pd.to_numeric(df["coord_x"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    lat = pd.to_numeric(df["coord_y"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    out = df.copy()
+    out["hotspot"] = dbscan(lon, lat, eps_km, min_samples)
+    return out
+
+def summarise_hotspots(df, utilisation=BASELINE["utilisation"], wue=BASELINE["wue_l_per_kwh"]):
+    """
+    One row per hotspot: facility count, centre (mean position on the
+    sphere), radius to the farthest member, summed gross_max_power (kW) and
+    m2, estimated annual water use (m3, power x utilisation x hours x WUE),
+    facilities with a known power figure, and the countries involved.
+    """
+    clustered = df[df["hotspot"] >= 0]
+    columns = ["hotspot", "facilities", "lon", "lat", "radius_km", "gross_max_power", "m2",
+               "water_m3_per_year", "facilities_with_power", "countries"]
+    if clustered.empty:
+        return pd.DataFrame(columns=columns)
+    lon = pd.to_numeric(clustered["coord_x"], errors="coerce").to_numpy(dtype=float)
+    lat = pd.to_numeric(clustered["coord_y"], errors="coerce").to_numpy(dtype=float)
+    power = pd.to_numeric(clustered.get("gross_max_power"), errors="coerce") if "gross_max_power" in clustered else pd.Series(np.nan, index=clustered.index)
+    area = pd.to_numeric(clustered.get("m2"), errors="coerce") if "m2" in clustered else pd.Series(np.nan, index=clustered.index)
+    xyz = unit_vectors(lon, lat)
+    frame = pd.DataFrame({"hotspot": clustered["hotspot"].to_numpy(), "x": xyz[:, 0], "y": xyz[:, 1], "z": xyz[:, 2],
+                          "power": power.to_numpy(dtype=float), "m2": area.to_numpy(dtype=float),
+                          "country": clustered["country"].to_numpy() if "country" in clustered else None})
+    grouped = frame.groupby("hotspot", sort=True)
+    summary = grouped.agg(facilities=("x", "size"), x=("x", "mean"), y=("y", "mean"), z=("z", "mean"),
+                          gross_max_power=("power", "sum"), m2=("m2", "sum"),
+                          facilities_with_power=("power", "count"))
+    centre = summary[["x", "y", "z"]].to_numpy()
+    centre /= np.linalg.norm(centre, axis=1, keepdims=True)
+    summary["lon"] = np.degrees(np.arctan2(centre[:, 1], centre[:, 0]))
+    summary["lat"] = np.degrees(np.arcsin(np.clip(centre[:, 2], -1, 1)))
+    # Farthest member from the centre, as a great-circle distance
+    member_centre = centre[np.searchsorted(summary.index.to_numpy(), frame["hotspot"].to_numpy())]
+    cos_angle = np.clip(np.einsum("ij,ij->i", xyz, member_centre), -1, 1)
+    frame["distance_km"] = np.arccos(cos_angle) * EARTH_RADIUS_KM
+    summary["radius_km"] = frame.groupby("hotspot", sort=True)["distance_km"].max().round(2)
+    # kW x utilisation x hours x L/kWh / 1000 L per m3
+    summary["water_m3_per_year"] = (summary["gross_max_power"] * utilisation * HOURS_PER_YEAR * wue / 1000).round(0)
+    summary["countries"] = frame.dropna(subset=["country"]).groupby("hotspot")["country"].agg(
+        lambda c: ", ".join(sorted(set(map(str, c))))).reindex(summary.index).fillna("")
+    return summary.reset_index()[columns]
+
+def hotspot_stage(df, path=HOTSPOT_PATH, eps_km=HOTSPOT_EPS_KM, min_samples=HOTSPOT_MIN_FACILITIES):
+    """Pipeline stage: cluster 'df', write the hotspot summary and return the path."""
+    summarise_hotspots(cluster_facilities(df, eps_km, min_samples)).to_csv(path, index=False)
+    return path
+
+##################################################
+# 4) Run the Clustering
+##################################################
+
+# Usage: python hotspot_clustering_v1.py [datacenter_map_data.csv]
+#   HOTSPOT_EPS_KM=5 HOTSPOT_MIN_FACILITIES=10 for tighter hubs
+if __name__ == "__main__":
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else "datacenter_map_data.csv"
+    facilities = pd.read_csv(snapshot_path, low_memory=False)
+    start_time = time.perf_counter()
+    clustered = cluster_facilities(facilities)
+    hotspots = summarise_hotspots(clustered)
+    print(f"{len(hotspots)} hotspots ({(clustered['hotspot'] >= 0).sum()} of {len(clustered)} facilities) "
+          f"in {time.perf_counter() - start_time:.3f}s")
+    hotspots.to_csv(HOTSPOT_PATH, index=False)
+    print(hotspots.sort_values("water_m3_per_year", ascending=False).head(20).to_string(index=False))
@@ -0,0 +1,173 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util import Retry
+
+# Brotli is optional: urllib3 only decodes "br" responses when a decoder is installed
+try:
+    import brotli  # noqa: F401
+    BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI = True
+    except ImportError:
+        BROTLI = False
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Every fetch path in the repo (datacentre feed, architecture export and
+# pages, SPP API) goes through this module, so these apply everywhere.
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "30"))         # seconds, connect and read
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "5"))
+HTTP_BACKOFF = float(os.environ.get("HTTP_BACKOFF", "0.5"))        # seconds, doubled per retry (plus jitter)
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "32"))       # keep-alive connections per host
+# On-disk response cache for development runs: set HTTP_CACHE_DIR to reuse
+# successful responses younger than HTTP_CACHE_TTL seconds without any request
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", "")
+HTTP_CACHE_TTL = float(os.environ.get("HTTP_CACHE_TTL", "86400"))
+
+ACCEPT_ENCODING = "gzip, deflate, br" if BROTLI else "gzip, deflate"
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# All upstream calls here are reads (the SPP suburb list is a POST), so POST is retried too
+RETRY_METHODS = ("GET", "HEAD", "OPTIONS", "POST")
+
+##################################################
+# 3) Define Functions
+##################################################
+
+class TimeoutAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request sent through it."""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+def make_session(pool_size=HTTP_POOL_SIZE, headers=None, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF, timeout=HTTP_TIMEOUT):
+    """
+    A keep-alive session: a connection pool sized for 'pool_size' concurrent
+    requests per host, gzip (and brotli, if installed) encoding, a default
+    timeout, and retries with jittered exponential backoff on connection
+    errors and 429/5xx responses (honouring Retry-After). Once retries run
+    out the last response is returned, so callers still see the status.
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=backoff, backoff_jitter=backoff,
+        status_forcelist=RETRY_STATUSES, allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True, raise_on_status=False,
+    )
+    adapter = TimeoutAdapter(timeout=timeout, pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+session_lock = threading.Lock()
+shared_session = None
+
+def get_session():
+    """The process-wide shared session (created on first use)."""
+    global shared_session
+    with session_lock:
+        if shared_session is None:
+            shared_session = make_session()
+        return shared_session
+
+def cache_key(method, url, params=None, data=None, json=None):
+    """Hash of the request as it would be sent (method, full URL with query, body)."""
+    prepared = requests.Request(method.upper(), url, params=params, data=data, json=json).prepare()
+    body = prepared.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(f"{prepared.method} {prepared.url}\n".encode("utf-8") + body).hexdigest()
+
+def cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + ".pkl")
+
+def load_cached_response(cache_dir, key, ttl):
+    """A cached response younger than 'ttl' seconds, rebuilt as a requests.Response, or None."""
+    path = cache_path(cache_dir, key)
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, "rb") as f:
+            entry = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.url = entry["url"]
+    response.encoding = entry["encoding"]
+    response._content = entry["content"]
+    response.reason = "OK (cached)"
+    return response
+
+def store_cached_response(cache_dir, key, response):
+    """Write a response to the cache atomically (concurrent fetchers may share a key)."""
+    path = cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "url": response.url,
+        "encoding": response.encoding,
+        "content": response.content,
+    }
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(entry, f, protocol=4)
+    os.replace(tmp_path, path)
+
+def request(method, url, session=None, cache_dir=None, cache_ttl=None, **kwargs):
+    """
+    Send a request on 'session' (default: the shared session) and return the
+    requests.Response. With a cache directory ('cache_dir', default
+    HTTP_CACHE_DIR) a 200 response is stored on disk and replayed for the
+    same method, URL, query and body for 'cache_ttl' seconds; conditional
+    headers (If-None-Match...) are ignored for the lookup, since a fresh
+    cached copy answers the request without touching the network.
+    """
+    cache_dir = HTTP_CACHE_DIR if cache_dir is None else cache_dir
+    cache_ttl = HTTP_CACHE_TTL if cache_ttl is None else cache_ttl
+    session = session or get_session()
+    key = None
+    if cache_dir and cache_ttl > 0:
+        key = cache_key(method, url, kwargs.get("params"), kwargs.get("data"), kwargs.get("json"))
+        cached = load_cached_response(cache_dir, key, cache_ttl)
+        if cached is not None:
+            return cached
+    response = session.request(method, url, **kwargs)
+    if key is not None and response.status_code == 200:
+        store_cached_response(cache_dir, key, response)
+    return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
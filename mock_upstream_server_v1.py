@@ -0,0 +1,329 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+##################################################
+# 2) Define Functions
+##################################################
+
+# Recordings are a JSON object keyed by "<METHOD> <path>?<query>", e.g.
+#   {"GET /api/v1/spp/layer_categories/": {"status": 200,
+#       "headers": {"Content-Type": "application/json"}, "body": [...]}}
+# A JSON 'body' is re-serialised on replay; a string body (HTML) is sent as is.
+# One server can stand in for every upstream at once, since their paths don't
+# overlap: map.datacente.rs (/api/geo/world), architecture.digital.gov.au
+# (/dynamic-data-export and the HTML pages) and the QLD SPP API (/api/v1/spp/...).
+
+# Response headers worth keeping in a recording (validators matter for conditional requests)
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+def recording_key(method, url):
+    """Key a request by method, path and query (scheme and host are ignored)."""
+    parsed = urlparse(url)
+    return f"{method.upper()} {parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+
+def record_response(recordings, method, response):
+    """Add a 'requests' response to 'recordings' (a dict) so it can be replayed later."""
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text
+    headers = {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers}
+    headers.setdefault("Content-Type", "application/json")
+    recordings[recording_key(method, response.url)] = {
+        "status": response.status_code,
+        "headers": headers,
+        "body": body,
+    }
+
+def record_urls(recordings_path, urls, method="GET"):
+    """Fetch 'urls' from the live services and merge their responses into a recordings file."""
+    import http_transport_v1 as http
+    recordings = {}
+    with http.make_session() as session:
+        for url in urls:
+            record_response(recordings, method, http.request(method, url, session=session, cache_ttl=0))
+    save_recordings(recordings_path, recordings)
+
+def load_recordings(recordings_path):
+    """Load a recordings file (or {} if it doesn't exist yet)."""
+    if not os.path.exists(recordings_path):
+        return {}
+    with open(recordings_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_recordings(recordings_path, recordings):
+    """Merge 'recordings' into the file at 'recordings_path'."""
+    merged = load_recordings(recordings_path)
+    merged.update(recordings)
+    with open(recordings_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f)
+
+def scale_body(body, scale):
+    """
+    Multiply the items of a JSON payload by 'scale' (e.g. 10 -> ten times the
+    facilities/rows/features) to load-test with bigger responses. Handles
+    plain lists, GeoJSON FeatureCollections and DRF "results" pages; copies
+    get an "id" suffix so they stay distinct.
+    """
+    if scale == 1:
+        return body
+    def scaled(items):
+        n = max(0, math.floor(len(items) * scale))
+        out = []
+        for i in range(n):
+            item = items[i % len(items)]
+            copy_no = i // len(items)
+            if copy_no and isinstance(item, dict):
+                item = dict(item)
+                properties = item.get("properties")
+                if isinstance(properties, dict) and "id" in properties:
+                    item["properties"] = dict(properties, id=f"{properties['id']}-{copy_no}")
+                elif "id" in item:
+                    item["id"] = f"{item['id']}-{copy_no}"
+            out.append(item)
+        return out
+    if isinstance(body, list) and body:
+        return scaled(body)
+    if isinstance(body, dict):
+        for key in ("features", "results"):
+            if isinstance(body.get(key), list) and body[key]:
+                return dict(body, **{key: scaled(body[key])})
+    return body
+
+def make_handler(recordings, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503,
+                 scale=1.0, seed=0):
+    """
+    Build a request handler class that replays 'recordings' (404 for anything
+    else) with simulated conditions:
+      latency_ms/jitter_ms - delay before each response (uniform jitter);
+      error_rate           - fraction of requests answered with 'error_status'
+                             (with Retry-After for 429/503);
+      scale                - payload scaling factor, see 'scale_body'.
+    Delays and injected errors are drawn from a generator seeded by 'seed'
+    and the request's sequence number, so a run is reproducible.
+    """
+    counter = {"n": 0}
+    lock = threading.Lock()
+    encoded = {}  # (key, scale) -> payload bytes, so big scaled bodies are built once
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real upstreams
+        disable_nagle_algorithm = True  # no delayed-ACK stalls between headers and body
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_payload(self, status, headers, payload):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def replay(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            with lock:
+                counter["n"] += 1
+                rng = random.Random(seed * 1_000_003 + counter["n"])
+            delay = latency_ms + rng.uniform(0, jitter_ms)
+            if delay:
+                time.sleep(delay / 1000)
+            if rng.random() < error_rate:
+                self.send_payload(error_status, {"Content-Type": "application/json", "Retry-After": "1"},
+                                  json.dumps({"detail": "Injected error"}).encode("utf-8"))
+                return
+            key = recording_key(self.command, self.path)
+            recorded = recordings.get(key)
+            if recorded is None:
+                self.send_payload(404, {"Content-Type": "application/json"},
+                                  json.dumps({"detail": "No recorded response"}).encode("utf-8"))
+                return
+            headers = dict(recorded.get("headers", {}))
+            etag = headers.get("ETag")
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_payload(304, {"ETag": etag}, b"")
+                return
+            if key not in encoded:
+                body = recorded["body"]
+                if isinstance(body, dict) and str(body.get("next") or "").startswith("/"):
+                    # DRF pagination links are absolute; make them point back at this server
+                    body = dict(body, next=f"http://{self.headers.get('Host')}{body['next']}")
+                encoded[key] = (
+                    body.encode("utf-8") if isinstance(body, str)
+                    else json.dumps(scale_body(body, scale)).encode("utf-8")
+                )
+            self.send_payload(recorded["status"], headers, encoded[key])
+
+        do_GET = replay
+        do_POST = replay
+    return ReplayHandler
+
+def make_server(recordings, host="127.0.0.1", port=0, **conditions):
+    """A threaded replay server; port 0 picks a free port (see server.server_address)."""
+    return ThreadingHTTPServer((host, port), make_handler(recordings, **conditions))
+
+def serve_in_background(recordings, host="127.0.0.1", port=0, **conditions):
+    """
+    Start a replay server on a daemon thread and return (server, base_url),
+    e.g. to point a script's BASE_URL at it. Call server.shutdown() when done.
+    """
+    server = make_server(recordings, host, port, **conditions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{server.server_address[0]}:{server.server_address[1]}"
+
+##################################################
+# 3) Synthetic Recordings
+##################################################
+
+def json_response(body):
+    return {"status": 200, "headers": {"Content-Type": "application/json"}, "body": body}
+
+def html_response(html):
+    etag = '"' + hashlib.sha256(html.encode("utf-8")).hexdigest()[:16] + '"'
+    return {"status": 200, "headers": {"Content-Type": "text/html; charset=utf-8", "ETag": etag}, "body": html}
+
+def architecture_page(title, page_type, reference, paragraphs, links=()):
+    """A minimal page in the architecture.digital.gov.au layout the parsers expect."""
+    link_html = "".join(f'<li><a href="{href}">{text}</a></li>' for href, text in links)
+    return (
+        f"<html><head><title>{title}</title></head><body><h1>{title}</h1>"
+        '<div class="metadata-card">'
+        f'<p class="title">Type</p><p>{page_type}</p>'
+        f'<p class="title">Reference</p><div class="codification-data">{reference}</div>'
+        '<p class="title">Mandate</p><p>Recommended</p></div>'
+        '<div class="clearfix text-formatted field field--name-body field--type-text-with-summary field--label-hidden field__item">'
+        f"<p>{paragraphs[0]}</p>"
+        + "".join(f"<h2>{heading}</h2><p>{text}</p>" for heading, text in paragraphs[1:])
+        + (f"<h2>Related</h2><ul>{link_html}</ul>" if link_html else "")
+        + "</div></body></html>"
+    )
+
+def synthetic_recordings(n_facilities=1000, n_capabilities=40, n_documents=120, n_suburbs=200,
+                         n_layers=6, features_per_layer=300, page_size=100, seed=0):
+    """
+    A consistent, made-up recording set covering every upstream endpoint the
+    scripts use, for load and regression tests on a machine with no network:
+    the world facility GeoJSON, the architecture export plus every domain,
+    capability and document page it links to (documents cross-link), and the
+    SPP suburb list, layer categories and paginated hazard layers.
+    """
+    rng = random.Random(seed)
+    recordings = {}
+    # 1) map.datacente.rs
+    countries = [("Australia", (138.0, 153.5, -29.0, -10.0)), ("Germany", (6.0, 15.0, 47.5, 55.0)),
+                 ("United States", (-122.0, -71.0, 26.0, 48.0)), ("Singapore", (103.6, 104.0, 1.2, 1.45))]
+    features = []
+    for i in range(n_facilities):
+        country, (x0, x1, y0, y1) = rng.choice(countries)
+        ready = rng.randint(1_300_000_000_000, 1_900_000_000_000)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [rng.uniform(x0, x1), rng.uniform(y0, y1)]},
+            "properties": {
+                "id": f"fac-{i:06d}", "name": f"Facility {i}", "company_name": f"Operator {i % 97}",
+                "country": country, "gross_max_power": rng.choice([None, rng.uniform(1, 300)]),
+                "m2": rng.choice([None, rng.uniform(500, 100000)]),
+                "readyForService": rng.choice([None, str(ready)]),
+                "construction_date": rng.choice([None, str(ready - rng.randint(10**10, 10**11))]),
+                "certs": {"LEED": rng.choice(["TRUE", "FALSE", None]), "UT_level": rng.choice([None, "III", "IV"])},
+                "cdns": [], "clouds": [], "fibres": [], "ixps": [], "networks": [],
+            },
+        })
+    recordings["GET /api/geo/world"] = json_response({"type": "FeatureCollection", "features": features})
+    # 2) architecture.digital.gov.au
+    doc_types = [("design", "Design"), ("policy", "Policy"), ("standard", "Standard"), ("strategy", "Strategy")]
+    documents = [(f"/{t}-{j}", f"{label} {j}", t, label) for j in range(n_documents) for t, label in [doc_types[j % 4]]]
+    domains = [("/ai", "Artificial Intelligence (AI)"), ("/data-and-analytics", "Data and Analytics"), ("/cloud", "Cloud")]
+    rows = []
+    for d, (href, name) in enumerate(domains):
+        recordings[f"GET {href}"] = html_response(
+            architecture_page(name, "Domain", f"DOM{d}", [f"{name} covers water and sustainability reporting."]))
+    for c in range(n_capabilities):
+        domain_href, domain_name = domains[c % len(domains)]
+        cap_href = f"/capability-{c}"
+        linked = rng.sample(documents, k=min(6, len(documents)))
+        recordings[f"GET {cap_href}"] = html_response(architecture_page(
+            f"Capability {c}", "Capability", f"DOM{c % len(domains)}.CAP{c}",
+            ["Capability summary.", ("Definition", f"Definition of capability {c}."),
+             ("Objective", "Reduce water use."), ("Purpose", "Sustainability."),
+             ("Whole of government applicability", "All agencies.")]))
+        row = {"Domain": f'<a href="{domain_href}">{domain_name}</a>',
+               "Capability": f'<a href="{cap_href}">Capability {c}</a>'}
+        for t, column in (("design", "Designs"), ("policy", "Policies"), ("standard", "Standards"), ("strategy", "Strategies")):
+            row[column] = "".join(f'<a href="{href}">{title}</a>' for href, title, dt, _ in linked if dt == t)
+        rows.append(row)
+    recordings["GET /dynamic-data-export"] = json_response(rows)
+    for href, title, _, label in documents:
+        links = [(h, t) for h, t, _, _ in rng.sample(documents, k=min(3, len(documents)))]
+        recordings[f"GET {href}"] = html_response(architecture_page(
+            title, label, f"{label[:3].upper()}{href.rsplit('-', 1)[1]}",
+            [f"{title} description.", ("Scope", "Applies to data centre water reporting.")], links))
+    # 3) QLD SPP API
+    spp = "/api/v1/spp"
+    recordings[f"POST {spp}/suburb_name/"] = json_response([f"Suburb {s}" for s in range(n_suburbs)])
+    recordings[f"GET {spp}/layer_categories/"] = json_response([
+        {"id": 1, "name": "Natural hazards", "layers": [{"id": 100 + l, "name": f"Hazard layer {l}"} for l in range(n_layers)]}
+    ])
+    severities = ["Low", "Medium", "High", "Very High"]
+    for l in range(n_layers):
+        layer_features = []
+        for f in range(features_per_layer):
+            cx, cy, r = rng.uniform(138.5, 153.0), rng.uniform(-28.5, -10.5), rng.uniform(0.01, 0.3)
+            ring = [[cx + r * math.cos(a * math.pi / 6), cy + r * math.sin(a * math.pi / 6)] for a in range(12)]
+            layer_features.append({"type": "Feature", "id": f,
+                                   "properties": {"severity": rng.choice(severities)},
+                                   "geometry": {"type": "Polygon", "coordinates": [ring + ring[:1]]}})
+        path = f"{spp}/layer_data/{100 + l}/"
+        pages = [layer_features[i:i + page_size] for i in range(0, len(layer_features), page_size)] or [[]]
+        for p, page in enumerate(pages):
+            key = f"GET {path}" + (f"?page={p + 1}" if p else "")
+            next_url = f"{path}?page={p + 2}" if p + 1 < len(pages) else None
+            recordings[key] = json_response({"count": len(layer_features), "next": next_url, "results": page})
+    return recordings
+
+##################################################
+# 4) Run the Stand-in Server
+##################################################
+
+# Usage:
+#   python mock_upstream_server_v1.py --synthetic --port 8766 --latency-ms 50 --error-rate 0.05 --scale 10
+#   python mock_upstream_server_v1.py spp_recordings.json --port 8766
+# then point the scripts at it:
+#   DATACENTRES_BASE_URL=http://127.0.0.1:8766 GOVT_BASE_URL=http://127.0.0.1:8766
+#   SPP_BASE_URL=http://127.0.0.1:8766/api/v1/spp
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the upstream APIs")
+    parser.add_argument("recordings", nargs="*", help="recordings JSON files to replay")
+    parser.add_argument("--synthetic", action="store_true", help="also serve generated responses for every endpoint")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--scale", type=float, default=1.0, help="payload scaling factor")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    recordings = synthetic_recordings(seed=args.seed) if args.synthetic else {}
+    for path in args.recordings:
+        recordings.update(load_recordings(path))
+    server = make_server(
+        recordings, port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status, scale=args.scale, seed=args.seed,
+    )
+    print(f"Replaying {len(recordings)} responses on http://127.0.0.1:{args.port}")
+    server.serve_forever()
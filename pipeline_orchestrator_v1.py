@@ -0,0 +1,275 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from profiling_v1 import profile_stage, stage_thread
+from datacentres_water_v2 import convert_data_types, fetch_world_data, flatten_features, url as WORLD_URL
+from facility_validation_v1 import QUARANTINE, QUARANTINE_PATH, REPORT_PATH, validate_stage
+from reverse_geocode_v1 import ADMIN1_BOUNDARIES, COUNTRY_BOUNDARIES, geocode_stage
+from buildout_projection_v1 import project_stage
+from hotspot_clustering_v1 import HOTSPOT_PATH, hotspot_stage
+from water_sources_v1 import WATER_SOURCES, WATER_SOURCES_PATH, water_sources_stage
+
+##################################################
+# 2) Define the DAG Runner
+##################################################
+
+# A stage is a dict:
+#   {"name": ..., "func": callable, "deps": [upstream stage names],
+#    "params": {keyword arguments}, "volatile": bool, "max_age": seconds,
+#    "outputs": [files the stage writes], "files": [files/directories it
+#    reads], "modules": [modules it imports lazily]}
+# 'func' is called as func(*upstream outputs, **params). Its output is cached
+# in CACHE_DIR under a key hashing the stage's code (the source of its
+# module, every project module that module imports, and "modules"), its
+# params, fingerprints (size + mtime) of its "files" and the *content*
+# hashes of its upstream outputs, so a rerun only recomputes stages
+# downstream of something that actually changed. Volatile stages (fetches
+# from live services) always run, but if they return the same content as
+# last time everything downstream is still served from the cache. A volatile
+# stage with "max_age" reuses its last output while it is younger than that.
+# A stage listing "outputs" also reruns if any of those files is missing.
+# Only the CACHE_KEEP most recently written entries per stage are kept.
+CACHE_DIR = os.environ.get("PIPELINE_CACHE_DIR", ".pipeline_cache")
+CACHE_KEEP = int(os.environ.get("PIPELINE_CACHE_KEEP", "3"))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def project_modules(module, found=None):
+    """'module' and every module of this project it imports, directly or through another one."""
+    found = {} if found is None else found
+    path = getattr(module, "__file__", None)
+    if module is None or module.__name__ in found or not path or \
+            os.path.dirname(os.path.abspath(path)) != PROJECT_DIR:
+        return found
+    found[module.__name__] = module
+    for value in list(vars(module).values()):
+        imported = value if inspect.ismodule(value) else sys.modules.get(getattr(value, "__module__", None) or "")
+        project_modules(imported, found)
+    return found
+
+def code_hash(func, extra_modules=()):
+    """
+    Hash of the source of the module defining 'func', of the project
+    modules it imports and of 'extra_modules' (names), so an edit to any
+    helper a stage calls invalidates it (falls back to the qualified name).
+    """
+    modules = project_modules(sys.modules.get(func.__module__))
+    for name in extra_modules:
+        project_modules(__import__(name), modules)
+    h = hashlib.sha256(f"{func.__module__}.{getattr(func, '__qualname__', repr(func))}".encode("utf-8"))
+    for name in sorted(modules):
+        try:
+            h.update(inspect.getsource(modules[name]).encode("utf-8"))
+        except (OSError, TypeError):
+            h.update(name.encode("utf-8"))
+    return h.hexdigest()
+
+def file_fingerprint(path):
+    """Size and mtime of a file, or of every file under a directory (None if missing)."""
+    if not path or not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            h.update(f"{os.path.relpath(os.path.join(root, name), path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def content_hash(obj):
+    """Stable hash of a stage output (DataFrames hashed by value, others via pickle)."""
+    h = hashlib.sha256()
+    if isinstance(obj, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in obj.columns]).encode("utf-8"))
+        h.update(json.dumps([str(t) for t in obj.dtypes]).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(obj.astype("string"), index=True).values.tobytes())
+    else:
+        h.update(pickle.dumps(obj, protocol=4))
+    return h.hexdigest()
+
+def stage_key(stage, upstream_hashes):
+    """Cache key: stage name + code + params + input file fingerprints + upstream content hashes."""
+    payload = json.dumps({
+        "name": stage["name"],
+        "code": code_hash(stage["func"], stage.get("modules", ())),
+        "params": stage.get("params", {}),
+        "files": {path: file_fingerprint(path) for path in stage.get("files", [])},
+        "inputs": upstream_hashes,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def load_cached(stage_name, key, max_age=None):
+    """(output, output hash) for a cached stage run (no older than 'max_age' seconds), or None."""
+    path = os.path.join(CACHE_DIR, f"{stage_name}-{key}.pkl")
+    if not os.path.exists(path):
+        return None
+    if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def store_cached(stage_name, key, output, output_hash):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{stage_name}-{key}.pkl")
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump((output, output_hash), f, protocol=4)
+    os.replace(path + ".tmp", path)
+    prune_cache(stage_name)
+
+def prune_cache(stage_name, keep=CACHE_KEEP):
+    """Delete all but the 'keep' most recently written cache entries of a stage."""
+    pattern = re.compile(rf"{re.escape(stage_name)}-[0-9a-f]{{24}}\.pkl")
+    paths = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if pattern.fullmatch(name)]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True)[keep:]:
+        os.remove(path)
+
+def run_stage(stage, inputs, upstream_hashes, force=False):
+    """Run (or load from cache) one stage; returns (output, output hash, status)."""
+    key = stage_key(stage, upstream_hashes)
+    outputs_exist = all(os.path.exists(path) for path in stage.get("outputs", []))
+    if not force and outputs_exist and (not stage.get("volatile") or stage.get("max_age")):
+        cached = load_cached(stage["name"], key, stage.get("max_age") if stage.get("volatile") else None)
+        if cached is not None:
+            return cached[0], cached[1], "cached"
+    start = time.perf_counter()
+    with profile_stage(stage["name"]):  # no-op unless PROFILE_DIR is set
+        output = stage["func"](*inputs, **stage.get("params", {}))
+    output_hash = content_hash(output)
+    store_cached(stage["name"], key, output, output_hash)
+    return output, output_hash, f"ran in {time.perf_counter() - start:.2f}s"
+
+def run_pipeline(stages, targets=None, max_workers=4, force=()):
+    """
+    Run a DAG of stages, starting every stage whose upstreams are done on a
+    thread pool so independent branches (e.g. the datacentre feed and the
+    government scrape) run in parallel. 'targets' limits the run to those
+    stages and their ancestors; 'force' names stages to recompute regardless
+    of the cache. Returns {stage name: output}.
+    """
+    by_name = {stage["name"]: stage for stage in stages}
+    # 1) Work out which stages are needed
+    needed, todo = set(), list(targets or by_name)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].get("deps", []))
+    outputs, hashes = {}, {}
+    pending = {name for name in needed}
+    # 2) Schedule stages as their upstreams finish
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for name in sorted(pending):
+                deps = by_name[name].get("deps", [])
+                if all(d in outputs for d in deps):
+                    future = pool.submit(
+                        stage_thread(run_stage), by_name[name], [outputs[d] for d in deps],
+                        [hashes[d] for d in deps], name in force,
+                    )
+                    running[future] = name
+                    pending.discard(name)
+            if not running:
+                raise ValueError(f"Unsatisfiable stage dependencies: {sorted(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                outputs[name], hashes[name], status = future.result()
+                print(f"[{name}] {status}")
+    return outputs
+
+##################################################
+# 3) Define the Stages
+##################################################
+
+def enrich_facilities(df, mirror_dir=""):
+    """
+    Enrichment stage: add hazard exposure columns for Queensland facilities
+    when a local SPP mirror is available (see hazard_exposure_v1.py).
+    """
+    if not mirror_dir or not os.path.exists(os.path.join(mirror_dir, "index.json")):
+        return df
+    from hazard_exposure_v1 import queensland_facilities, score_facilities
+    qld = queensland_facilities(df)
+    scored = score_facilities(qld, mirror_dir)
+    new_cols = [c for c in scored.columns if c not in df.columns]
+    return df.join(scored[new_cols])
+
+def write_table(df, path, file_format="csv"):
+    """Write stage: save 'df' as CSV, XLSX or Parquet and return the path."""
+    if file_format == "csv":
+        df.to_csv(path, index=False)
+    elif file_format == "xlsx":
+        df.to_excel(path, index=False)
+    elif file_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unknown output format: {file_format}")
+    return path
+
+def run_govt_scrape(csv_path="govt_digital_infrastructure_website.csv"):
+    """Run the government architecture scraper script and load its CSV."""
+    subprocess.run([sys.executable, "govt_digital_infrastructure_v3.py"], check=True)
+    return pd.read_csv(csv_path)
+
+OUTPUT_FORMAT = os.environ.get("PIPELINE_FORMAT", "csv")
+MIRROR_DIR = os.environ.get("SPP_MIRROR_DIR", "")
+# Reuse fetched/scraped data younger than this many seconds (0: always refetch)
+FETCH_MAX_AGE = int(os.environ.get("PIPELINE_FETCH_MAX_AGE", "0"))
+
+STAGES = [
+    # Datacentre feed: fetch -> flatten -> validate -> geocode -> convert_data_types -> enrich -> write (+ project, hotspots, water_sources)
+    {"name": "fetch", "func": fetch_world_data, "params": {"url": WORLD_URL},
+     "volatile": True, "max_age": FETCH_MAX_AGE},
+    {"name": "flatten", "func": flatten_features, "deps": ["fetch"]},
+    {"name": "validate", "func": validate_stage, "deps": ["flatten"],
+     "params": {"report_path": REPORT_PATH, "quarantine_path": QUARANTINE_PATH, "quarantine": QUARANTINE},
+     "outputs": [REPORT_PATH]},
+    {"name": "geocode", "func": geocode_stage, "deps": ["validate"],
+     "params": {"boundary_path": COUNTRY_BOUNDARIES, "admin1_path": ADMIN1_BOUNDARIES},
+     "files": [COUNTRY_BOUNDARIES, ADMIN1_BOUNDARIES]},
+    {"name": "convert", "func": convert_data_types, "deps": ["geocode"]},
+    {"name": "enrich", "func": enrich_facilities, "deps": ["convert"], "params": {"mirror_dir": MIRROR_DIR},
+     "files": [MIRROR_DIR], "modules": ["hazard_exposure_v1"]},
+    {"name": "write", "func": write_table, "deps": ["enrich"],
+     "params": {"path": f"datacenter_map_data.{OUTPUT_FORMAT}", "file_format": OUTPUT_FORMAT},
+     "outputs": [f"datacenter_map_data.{OUTPUT_FORMAT}"]},
+    {"name": "project", "func": project_stage, "deps": ["enrich"],
+     "params": {"path": "datacenter_buildout_projection.csv"},
+     "outputs": ["datacenter_buildout_projection.csv"]},
+    {"name": "hotspots", "func": hotspot_stage, "deps": ["enrich"],
+     "params": {"path": HOTSPOT_PATH}, "outputs": [HOTSPOT_PATH]},
+    {"name": "water_sources", "func": water_sources_stage, "deps": ["enrich"],
+     "params": {"path": WATER_SOURCES_PATH}, "outputs": [WATER_SOURCES_PATH],
+     "files": [source["path"] for source in WATER_SOURCES]},
+    # Government architecture scrape (independent, so it runs in parallel)
+    {"name": "govt_scrape", "func": run_govt_scrape, "volatile": True, "max_age": FETCH_MAX_AGE},
+]
+
+##################################################
+# 4) Run the Pipeline
+##################################################
+
+# Usage: python pipeline_orchestrator_v1.py [stage ...]
+#   PIPELINE_FORMAT=xlsx  -> only the write stage reruns (upstream outputs come from the cache)
+#   PIPELINE_FORCE=flatten,convert -> recompute those stages regardless of the cache
+#   PROFILE_DIR=profiles -> cProfile + sampled stacks for every stage that runs (see profiling_v1.py)
+if __name__ == "__main__":
+    force = {s for s in os.environ.get("PIPELINE_FORCE", "").split(",") if s}
+    run_pipeline(STAGES, targets=sys.argv[1:] or None, force=force)
@@ -0,0 +1,279 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import argparse
+import cProfile
+import glob
+import os
+import pstats
+import re
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Profiling is opt-in: set PROFILE_DIR (or run a script through this module,
+# see the usage below) and every named stage writes
+#   <PROFILE_DIR>/<stage>.prof       - cProfile stats (open with pstats/snakeviz)
+#   <PROFILE_DIR>/<stage>.collapsed  - sampled stacks, one "a;b;c count" line per
+#                                      stack (flamegraph.pl / speedscope input)
+# and prints its top hot functions when it finishes. With PROFILE_DIR unset,
+# 'profile_stage' returns a shared no-op context manager.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "15"))
+
+NO_PROFILE = nullcontext()
+
+##################################################
+# 3) Define Functions
+##################################################
+
+# Active stages per thread, innermost last: [(name, cProfile.Profile or None, [child .prof paths])]
+stage_stack = threading.local()
+# Worker-side profilers for 'profile_call', keyed by (stage, thread id)
+worker_profiles = {}
+# Threads working for each stage (see 'stage_thread'), sampled with its own: {stage: {thread id: count}}
+stage_threads = {}
+stage_threads_lock = threading.Lock()
+frame_labels = {}
+
+def stage_file(profile_dir, stage, suffix):
+    return os.path.join(profile_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", stage) + suffix)
+
+def current_stage():
+    """Name of the innermost stage being profiled on this thread, or None."""
+    stack = getattr(stage_stack, "stages", None)
+    return stack[-1][0] if stack else None
+
+@contextmanager
+def working_for(stages):
+    """Register the calling thread with 'stages' while the block runs."""
+    ident = threading.get_ident()
+    with stage_threads_lock:
+        for stage in stages:
+            idents = stage_threads.setdefault(stage, Counter())
+            idents[ident] += 1
+    try:
+        yield
+    finally:
+        with stage_threads_lock:
+            for stage in stages:
+                idents = stage_threads[stage]
+                idents[ident] -= 1
+                if idents[ident] <= 0:
+                    del idents[ident]
+                if not idents:
+                    del stage_threads[stage]
+
+def stage_thread(target):
+    """
+    Wrap a thread's 'target' so the stages active on the calling thread also
+    sample that thread while it runs (stages run concurrently, so a stage
+    only samples threads it started itself):
+
+        threading.Thread(target=stage_thread(fetcher)).start()
+
+    Returns 'target' unchanged when no stage is being profiled.
+    """
+    stages = [name for name, _, _ in getattr(stage_stack, "stages", [])]
+    if not stages:
+        return target
+
+    def run(*args, **kwargs):
+        with working_for(stages):
+            return target(*args, **kwargs)
+    return run
+
+def frame_label(code):
+    label = frame_labels.get(code)
+    if label is None:
+        label = frame_labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+class StackSampler:
+    """
+    Sample the stack of the stage's thread, and of the threads working for
+    it (fetch workers, dispatchers, ... registered with 'stage_thread' or
+    running 'profile_call'), every 'interval' seconds and count identical
+    stacks. Unlike cProfile this sees time spent on other threads, and its
+    overhead does not grow with the number of calls.
+    """
+    def __init__(self, stage, interval=PROFILE_INTERVAL):
+        self.stage = stage
+        self.interval = interval
+        self.counts = Counter()
+        self.target = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            with stage_threads_lock:
+                idents = {self.target, *stage_threads.get(self.stage, ())}
+            for ident, frame in sys._current_frames().items():
+                if ident not in idents:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+def write_collapsed(path, counts):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+def print_summary(stage, stats, counts, elapsed, top_n=PROFILE_TOP_N):
+    """Print the stage's hottest functions by own time (or by leaf samples without cProfile)."""
+    print(f"[profile] {stage}: {elapsed:.2f}s, {sum(counts.values())} samples")
+    if stats is not None:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_n]
+        print(f"  {'tottime':>9} {'cumtime':>9} {'ncalls':>9}  function")
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in rows:
+            print(f"  {tottime:9.3f} {cumtime:9.3f} {ncalls:9d}  {func} ({os.path.basename(filename)}:{line})")
+    else:
+        leaves = Counter()
+        for stack, count in counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        for leaf, count in leaves.most_common(top_n):
+            print(f"  {count:9d}  {leaf}")
+
+@contextmanager
+def profiled_stage(name, profile_dir):
+    stack = stage_stack.__dict__.setdefault("stages", [])
+    for path in glob.glob(stage_file(profile_dir, name, ".*.prof")):
+        os.remove(path)  # stale worker stats from an earlier run
+    # 1) Pause the enclosing stage's profiler (one profiler per thread); its
+    #    stats get this stage's merged in when it finishes
+    if stack and stack[-1][1] is not None:
+        stack[-1][1].disable()
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        profile = None  # Python 3.12+: another thread's stage holds the profiler; sample only
+    children = []
+    stack.append((name, profile, children))
+    sampler = StackSampler(name)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # 2) Stop, merge nested stages and pool-worker stats, write the artefacts
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            profile.disable()
+        sampler.stop()
+        stack.pop()
+        prof_path = stage_file(profile_dir, name, ".prof")
+        worker_paths = glob.glob(stage_file(profile_dir, name, ".*.prof"))
+        sources = ([profile] if profile is not None else []) + children + worker_paths
+        stats = None
+        if sources:
+            stats = pstats.Stats(sources[0])
+            if len(sources) > 1:
+                stats.add(*sources[1:])
+            stats.dump_stats(prof_path)
+        for path in worker_paths:
+            os.remove(path)
+        write_collapsed(stage_file(profile_dir, name, ".collapsed"), sampler.counts)
+        print_summary(name, stats, sampler.counts, elapsed)
+        # 3) Resume the enclosing stage
+        if stack:
+            if stats is not None:
+                stack[-1][2].append(prof_path)
+            if stack[-1][1] is not None:
+                stack[-1][1].enable()
+
+def profile_stage(name, profile_dir=None):
+    """
+    Context manager that profiles the enclosed block as stage 'name' when
+    profiling is on (see PROFILE_DIR), and does nothing otherwise:
+
+        with profile_stage("convert"):
+            df = convert_data_types(df)
+
+    Stages nest: an outer stage's .prof includes its inner stages.
+    """
+    profile_dir = PROFILE_DIR if profile_dir is None else profile_dir
+    if not profile_dir:
+        return NO_PROFILE
+    os.makedirs(profile_dir, exist_ok=True)
+    return profiled_stage(name, profile_dir)
+
+def profile_call(stage, func, *args, profile_dir=None, **kwargs):
+    """
+    Run 'func(*args, **kwargs)' under cProfile in a pool worker (process or
+    thread), accumulating into '<stage>.<pid>-<thread>.prof'; the stage
+    running in the parent merges those files into its own .prof when it
+    finishes. A worker thread is sampled with the stage meanwhile. Submit it
+    in place of 'func', e.g.
+        pool.submit(profile_call, current_stage(), parse_fetched_page, url, ...)
+    """
+    profile_dir = PROFILE_DIR if profile_dir is None else profile_dir
+    key = (stage, threading.get_ident())
+    profile = worker_profiles.get(key)
+    if profile is None:
+        profile = worker_profiles[key] = cProfile.Profile()
+    with working_for([stage]):
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args, **kwargs)  # Python 3.12+: profiler busy on another thread
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            profile.dump_stats(stage_file(profile_dir, stage, f".{os.getpid()}-{key[1]}.prof"))
+
+##################################################
+# 4) Profile a Script
+##################################################
+
+# Usage:
+#   python profiling_v1.py datacentres_water_v2.py          -> profiles/<script>.prof + each stage inside it
+#   python profiling_v1.py --dir prof_out --top 30 govt_digital_infrastructure_v3.py
+#   python profiling_v1.py --summary profiles               -> re-print the summaries of saved .prof files
+#   PROFILE_DIR=profiles python pipeline_orchestrator_v1.py -> one set of files per pipeline stage
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a script stage by stage")
+    parser.add_argument("--dir", default=PROFILE_DIR or "profiles")
+    parser.add_argument("--top", type=int, default=PROFILE_TOP_N)
+    parser.add_argument("--summary", action="store_true", help="summarise the .prof files in --dir (or the given dir)")
+    parser.add_argument("script", nargs="?")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.summary:
+        for path in sorted(glob.glob(os.path.join(args.script or args.dir, "*.prof"))):
+            print_summary(os.path.basename(path)[:-5], pstats.Stats(path), Counter(), 0.0, args.top)
+    else:
+        # Set before the import below so the script's own stages (and any
+        # subprocesses, e.g. the orchestrator's govt_scrape stage) see it
+        os.environ["PROFILE_DIR"] = args.dir
+        os.environ["PROFILE_TOP_N"] = str(args.top)
+        # Use the importable module, not this __main__ copy, so the script's
+        # stages nest inside this one
+        import profiling_v1
+        sys.argv = [args.script] + args.args
+        sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+        with profiling_v1.profile_stage(os.path.splitext(os.path.basename(args.script))[0]):
+            runpy.run_path(args.script, run_name="__main__")
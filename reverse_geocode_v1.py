@@ -0,0 +1,389 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from hazard_exposure_v1 import geometry_parts
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Local boundary files (GeoJSON FeatureCollections), e.g. Natural Earth
+# "Admin 0 - Countries" and, optionally, "Admin 1 - States, Provinces"
+COUNTRY_BOUNDARIES = os.environ.get("COUNTRY_BOUNDARIES", "ne_10m_admin_0_countries.geojson")
+ADMIN1_BOUNDARIES = os.environ.get("ADMIN1_BOUNDARIES", "")
+
+# Grid cell size in degrees (0.1 -> a 3600 x 1800 int16 raster, ~13 MB)
+GRID_RESOLUTION = float(os.environ.get("GEOCODE_GRID_RES", "0.1"))
+
+# Grid cell values besides region ids
+OCEAN = -1    # no region covers the cell
+BORDER = -2   # a boundary passes through the cell: resolve with exact polygon tests
+
+# Properties holding a region's display name and code, checked in order, and
+# every property whose value counts as an acceptable spelling of the region
+NAME_PROPERTIES = ["NAME_LONG", "NAME", "ADMIN", "name", "name_en"]
+CODE_PROPERTIES = ["ISO_A2_EH", "ISO_A2", "iso_a2", "iso_3166_2", "ISO_A3", "adm0_a3"]
+ALIAS_PROPERTIES = NAME_PROPERTIES + ["ABBREV", "FORMAL_EN", "NAME_SORT", "SOVEREIGNT", "GEOUNIT",
+                                      "BRK_NAME", "ISO_A2", "ISO_A2_EH", "ISO_A3", "ISO_A3_EH", "ADM0_A3",
+                                      "name_alt"]
+
+# Spellings the datacentre feed uses that boundary files don't carry
+# (common short forms, local-language and former names), by the country's
+# ISO 3166-1 alpha-3 code; added to the aliases of the region whose
+# ISO_A3 / ISO_A3_EH / ADM0_A3 property has that code
+COUNTRY_ALIASES = {
+    "USA": ["USA", "US", "United States", "United States of America", "America"],
+    "GBR": ["UK", "GB", "Great Britain", "Britain", "England", "Scotland", "Wales", "Northern Ireland"],
+    "NLD": ["Nederland", "Niederlande", "Holland", "Netherlands Antilles"],
+    "DEU": ["Deutschland", "Allemagne"],
+    "FRA": ["Frankreich"],
+    "ITA": ["Italia", "Italien"],
+    "ESP": ["España", "Espana", "Spanien"],
+    "CHE": ["Schweiz", "Suisse", "Svizzera", "Swiss Confederation"],
+    "SWE": ["Sverige", "Schweden"],
+    "NOR": ["Norge", "Norwegen", "Noorwegen"],
+    "DNK": ["Danmark", "Dänemark"],
+    "FIN": ["Suomi"],
+    "BEL": ["België", "Belgique", "Belgien"],
+    "AUT": ["Österreich"],
+    "POL": ["Polska"],
+    "CZE": ["Czech Republic", "Czechia", "Česko"],
+    "BRA": ["Brasil"],
+    "MEX": ["México"],
+    "TUR": ["Türkiye", "Turkiye", "Turkey"],
+    "RUS": ["Russia", "Russian Federation", "Россия"],
+    "BGR": ["България"],
+    "UKR": ["Україна"],
+    "MDA": ["Moldova", "Moldávia", "Republic of Moldova"],
+    "HKG": ["Hong Kong", "香港"],
+    "CHN": ["中国", "PRC"],
+    "JPN": ["日本"],
+    "KOR": ["South Korea", "Korea", "Republic of Korea"],
+    "TWN": ["Taiwan", "台灣", "台湾"],
+    "VNM": ["Vietnam", "Viet Nam"],
+    "MMR": ["Myanmar", "Myanmar (Burma)", "Burma"],
+    "ARE": ["UAE", "United Arab Emirates"],
+    "CIV": ["Ivory Coast", "Côte d'Ivoire"],
+    "SWZ": ["Swaziland", "eSwatini"],
+    "MKD": ["Macedonia", "North Macedonia"],
+    "CPV": ["Cape Verde", "Cabo Verde"],
+    "COG": ["Republic of the Congo", "Congo"],
+    "COD": ["Democratic Republic of the Congo", "DR Congo", "DRC"],
+    "SRB": ["Serbia and Montenegro"],
+    "MNE": ["Serbia and Montenegro"],
+    "CUW": ["Netherlands Antilles"],
+    "SXM": ["Netherlands Antilles"],
+}
+
+# One name per COUNTRY_ALIASES code, which that code's spellings (and the
+# name itself) collapse to when facilities are grouped by country; a
+# spelling shared by several codes is left as it is
+COUNTRY_NAMES = {
+    "USA": "United States", "GBR": "United Kingdom", "NLD": "Netherlands", "DEU": "Germany",
+    "FRA": "France", "ITA": "Italy", "ESP": "Spain", "CHE": "Switzerland", "SWE": "Sweden",
+    "NOR": "Norway", "DNK": "Denmark", "FIN": "Finland", "BEL": "Belgium", "AUT": "Austria",
+    "POL": "Poland", "CZE": "Czechia", "BRA": "Brazil", "MEX": "Mexico", "TUR": "Turkey",
+    "RUS": "Russia", "BGR": "Bulgaria", "UKR": "Ukraine", "MDA": "Moldova", "HKG": "Hong Kong",
+    "CHN": "China", "JPN": "Japan", "KOR": "South Korea", "TWN": "Taiwan", "VNM": "Vietnam",
+    "MMR": "Myanmar", "ARE": "United Arab Emirates", "CIV": "Côte d'Ivoire", "SWZ": "Eswatini",
+    "MKD": "North Macedonia", "CPV": "Cape Verde", "COG": "Republic of the Congo",
+    "COD": "Democratic Republic of the Congo", "SRB": "Serbia", "MNE": "Montenegro",
+    "CUW": "Curaçao", "SXM": "Sint Maarten",
+}
+
+# Points in no region (e.g. a coastal site just off a generalised coastline)
+# take the nearest region cell within this many cells
+NEAREST_CELLS = 2
+
+##################################################
+# 3) Define Functions
+##################################################
+
+def normalise_country(name):
+    """Lower-case, accent- and punctuation-free form used to compare country spellings (any script)."""
+    name = "".join(c for c in unicodedata.normalize("NFKD", str(name).casefold()) if not unicodedata.combining(c))
+    name = re.sub(r"[\W_]", " ", name)
+    name = re.sub(r"^the ", "", re.sub(r"\s+", " ", name).strip())
+    return name
+
+def country_name_lookup():
+    """{normalised spelling: COUNTRY_NAMES name} over every unambiguous alias."""
+    lookup = {}
+    ambiguous = set()
+    for code, name in COUNTRY_NAMES.items():
+        for alias in [name] + COUNTRY_ALIASES.get(code, []):
+            key = normalise_country(alias)
+            if lookup.setdefault(key, name) != name:
+                ambiguous.add(key)
+    return {key: name for key, name in lookup.items() if key not in ambiguous}
+
+CANONICAL_COUNTRIES = country_name_lookup()
+
+def canonical_country(df):
+    """
+    Country to group facilities by: 'geo_country' where the coordinates were
+    geocoded, else the feed's 'country', with every spelling of a
+    COUNTRY_ALIASES country mapped to its COUNTRY_NAMES name (so "USA", "US"
+    and "United States of America" are all "United States"). Other names
+    are kept as given; a missing or blank country is None.
+    """
+    missing = pd.Series(None, index=df.index, dtype=object)
+    geo = df["geo_country"] if "geo_country" in df.columns else missing
+    feed = df["country"] if "country" in df.columns else missing
+    names = geo.where(geo.notna(), feed).astype("string").str.strip()
+    names = names.where(names != "")
+    spellings = names.dropna().unique()
+    canonical = {name: CANONICAL_COUNTRIES.get(normalise_country(name), name) for name in spellings}
+    return names.map(canonical).astype(object).where(names.notna(), None)
+
+def first_property(properties, keys):
+    for key in keys:
+        value = properties.get(key)
+        if value not in (None, "", "-99"):
+            return str(value)
+    return ""
+
+def region_aliases(properties):
+    """Normalised spellings of a region: its alias properties plus COUNTRY_ALIASES for its ISO alpha-3 code."""
+    aliases = {normalise_country(properties[k]) for k in ALIAS_PROPERTIES if properties.get(k) not in (None, "", "-99")}
+    for key in ("ISO_A3", "ISO_A3_EH", "ADM0_A3"):
+        aliases.update(normalise_country(name) for name in COUNTRY_ALIASES.get(properties.get(key), ()))
+    return aliases
+
+def feature_edges(geometry):
+    """(x0, y0, x1, y1) arrays of every ring edge of a (Multi)Polygon."""
+    parts = []
+    for ring, is_area in geometry_parts(geometry):
+        if is_area and len(ring) > 1:
+            points = np.asarray([p[:2] for p in ring], dtype=float)
+            parts.append(np.hstack([points, np.roll(points, -1, axis=0)]))
+    if not parts:
+        return None
+    edges = np.vstack(parts)
+    return edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+
+def expand_ranges(starts, counts):
+    """For ranges (start, count): (range index, value) of every member, vectorised."""
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, starts[owners] + offsets
+
+def fill_feature(grid, edges, code, res):
+    """
+    Scanline-fill one region into 'grid' by the even-odd rule (holes and
+    multiple parts come out right without tracking which ring is which):
+    a cell is inside when an odd number of edges cross its row to the left
+    of its centre. Cells already claimed by another region become BORDER.
+    """
+    x0, y0, x1, y1 = edges
+    n_rows, n_cols = grid.shape
+    # 1) Crossings of each edge with the row centres it spans
+    ylo, yhi = np.minimum(y0, y1), np.maximum(y0, y1)
+    j_start = np.ceil((ylo + 90) / res - 0.5).astype(np.int64)
+    j_end = np.ceil((yhi + 90) / res - 0.5).astype(np.int64)  # exclusive
+    counts = np.maximum(j_end - j_start, 0)
+    edge_ids, rows = expand_ranges(j_start, counts)
+    if not len(rows):
+        return
+    yc = -90 + (rows + 0.5) * res
+    t = (yc - y0[edge_ids]) / (y1[edge_ids] - y0[edge_ids])
+    xc = x0[edge_ids] + t * (x1[edge_ids] - x0[edge_ids])
+    cols = np.clip(np.ceil((xc + 180) / res - 0.5).astype(np.int64), 0, n_cols)
+    # 2) Parity of crossings left of each cell centre, within the region's bounding box
+    row0, row1 = max(rows.min(), 0), min(rows.max() + 1, n_rows)
+    col0, col1 = cols.min(), min(cols.max(), n_cols)
+    keep = (rows >= row0) & (rows < row1)
+    toggles = np.zeros((row1 - row0, col1 - col0 + 1), dtype=np.int32)
+    np.add.at(toggles, (rows[keep] - row0, cols[keep] - col0), 1)
+    inside = (np.cumsum(toggles, axis=1)[:, :-1] % 2) == 1
+    # 3) Claim the cells
+    window = grid[row0:row1, col0:col1]
+    window[inside & (window == OCEAN)] = code
+    window[inside & (window != code) & (window != BORDER)] = BORDER
+
+def points_in_edges(px, py, edges, chunk=2_000_000):
+    """
+    Even-odd test of many points against one region's edges at once (the
+    same rule the grid was filled with), in chunks of points x edges.
+    """
+    x0, y0, x1, y1 = edges
+    inside = np.zeros(len(px), dtype=bool)
+    step = max(1, chunk // max(len(x0), 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start in range(0, len(px), step):
+            qx, qy = px[start:start + step, None], py[start:start + step, None]
+            spans = (y0 > qy) != (y1 > qy)
+            crosses = spans & (qx < x0 + (qy - y0) * (x1 - x0) / (y1 - y0))
+            inside[start:start + step] = crosses.sum(axis=1) % 2 == 1
+    return inside
+
+def mark_border_cells(grid, edges, res):
+    """Mark every cell a boundary edge passes through (sampled at a quarter cell) as BORDER."""
+    x0, y0, x1, y1 = edges
+    n_rows, n_cols = grid.shape
+    steps = np.ceil(np.hypot(x1 - x0, y1 - y0) / (res / 4)).astype(np.int64) + 1
+    edge_ids, k = expand_ranges(np.zeros(len(steps), dtype=np.int64), steps)
+    t = k / steps[edge_ids]
+    xs = x0[edge_ids] + t * (x1[edge_ids] - x0[edge_ids])
+    ys = y0[edge_ids] + t * (y1[edge_ids] - y0[edge_ids])
+    cols = np.clip(np.floor((xs + 180) / res).astype(np.int64), 0, n_cols - 1)
+    rows = np.clip(np.floor((ys + 90) / res).astype(np.int64), 0, n_rows - 1)
+    grid[rows, cols] = BORDER
+
+def build_grid(features, res=GRID_RESOLUTION):
+    """
+    Rasterise boundary features into an int16 grid of region ids (index
+    into 'features'), OCEAN or BORDER. Pure cells answer lookups on their
+    own; only BORDER cells need an exact polygon test.
+    """
+    n_rows, n_cols = int(round(180 / res)), int(round(360 / res))
+    grid = np.full((n_rows, n_cols), OCEAN, dtype=np.int16)
+    all_edges = [feature_edges(feature.get("geometry")) for feature in features]
+    for code, edges in enumerate(all_edges):
+        if edges is not None:
+            fill_feature(grid, edges, code, res)
+    for edges in all_edges:
+        if edges is not None:
+            mark_border_cells(grid, edges, res)
+    return grid
+
+def load_geocoder(boundary_path, res=GRID_RESOLUTION, name_keys=NAME_PROPERTIES, code_keys=CODE_PROPERTIES):
+    """
+    Load a boundary file and its precomputed grid, building and caching the
+    grid next to the file ('<file>.grid<res>.npz') the first time. The cache
+    is keyed by the file's hash, so replacing the boundaries rebuilds it.
+    Returns a dict with the grid, per-region names/codes/aliases/bounding
+    boxes and the ring edges for exact tests.
+    """
+    with open(boundary_path, "rb") as f:
+        raw = f.read()
+    source_hash = hashlib.sha256(raw).hexdigest()
+    features = json.loads(raw)["features"]
+    cache_path = f"{boundary_path}.grid{res:g}.npz"
+    grid = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            if str(data["source_hash"]) == source_hash:
+                grid = data["grid"]
+    if grid is None:
+        grid = build_grid(features, res)
+        np.savez_compressed(cache_path, grid=grid, source_hash=np.array(source_hash))
+    edges = [feature_edges(feature.get("geometry")) for feature in features]
+    bboxes = np.full((len(features), 4), np.nan)
+    for i, e in enumerate(edges):
+        if e is not None:
+            bboxes[i] = (e[0].min(), e[1].min(), e[0].max(), e[1].max())
+    properties = [feature.get("properties") or {} for feature in features]
+    return {
+        "grid": grid,
+        "res": res,
+        "names": np.array([first_property(p, name_keys) for p in properties], dtype=object),
+        "codes": np.array([first_property(p, code_keys) for p in properties], dtype=object),
+        "aliases": [region_aliases(p) for p in properties],
+        "bboxes": bboxes,
+        "edges": edges,
+    }
+
+def reverse_geocode(geocoder, lon, lat, nearest_cells=NEAREST_CELLS):
+    """
+    Region id (or -1) for each point, plus how it was found: "grid" (one
+    array lookup), "polygon" (exact even-odd test, for points in BORDER cells),
+    "nearest" (closest region cell within 'nearest_cells') or "" (none).
+    """
+    grid, res = geocoder["grid"], geocoder["res"]
+    n_rows, n_cols = grid.shape
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    valid = np.isfinite(lon) & np.isfinite(lat) & (np.abs(lon) <= 180) & (np.abs(lat) <= 90)
+    rows = np.clip(np.floor((np.where(valid, lat, 0) + 90) / res).astype(np.int64), 0, n_rows - 1)
+    cols = np.clip(np.floor((np.where(valid, lon, 0) + 180) / res).astype(np.int64), 0, n_cols - 1)
+    # 1) One lookup for every point
+    codes = np.where(valid, grid[rows, cols], OCEAN).astype(np.int64)
+    method = np.where(codes >= 0, "grid", "").astype(object)
+    # 2) Exact tests for points on border cells, region by region against the
+    #    points inside its bounding box
+    border = np.flatnonzero(codes == BORDER)
+    codes[border] = OCEAN
+    bboxes = geocoder["bboxes"]
+    for region, edges in enumerate(geocoder["edges"]):
+        if edges is None or not len(border):
+            continue
+        bx, by = lon[border], lat[border]
+        box = bboxes[region]
+        candidates = np.flatnonzero((bx >= box[0]) & (bx <= box[2]) & (by >= box[1]) & (by <= box[3]))
+        if not len(candidates):
+            continue
+        hit = candidates[points_in_edges(bx[candidates], by[candidates], edges)]
+        codes[border[hit]] = region
+        method[border[hit]] = "polygon"
+        border = np.delete(border, hit)
+    # 3) Nearest region cell for what is left (closest offsets first)
+    offsets = sorted(
+        ((dr, dc) for dr in range(-nearest_cells, nearest_cells + 1) for dc in range(-nearest_cells, nearest_cells + 1)),
+        key=lambda o: o[0] ** 2 + o[1] ** 2,
+    )
+    todo = np.flatnonzero(valid & (codes < 0))
+    for dr, dc in offsets[1:]:
+        if not len(todo):
+            break
+        found = grid[np.clip(rows[todo] + dr, 0, n_rows - 1), (cols[todo] + dc) % n_cols]
+        hit = found >= 0
+        codes[todo[hit]] = found[hit]
+        method[todo[hit]] = "nearest"
+        todo = todo[~hit]
+    return codes, method
+
+def geocode_facilities(df, geocoder, admin1=None, fill=True):
+    """
+    Add geo_country, geo_country_code and geo_method (and geo_admin1 with an
+    'admin1' geocoder) from coord_x/coord_y, flag rows whose 'country'
+    disagrees with the coordinates in 'country_mismatch', and, with 'fill',
+    fill a missing 'country' from the coordinates.
+    """
+    lon = pd.to_numeric(df["coord_x"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    lat = pd.to_numeric(df["coord_y"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    codes, method = reverse_geocode(geocoder, lon, lat)
+    found = codes >= 0
+    df = df.copy()
+    df["geo_country"] = np.where(found, geocoder["names"][np.maximum(codes, 0)], None)
+    df["geo_country_code"] = np.where(found, geocoder["codes"][np.maximum(codes, 0)], None)
+    df["geo_method"] = method
+    if admin1 is not None:
+        admin1_codes, _ = reverse_geocode(admin1, lon, lat)
+        df["geo_admin1"] = np.where(admin1_codes >= 0, admin1["names"][np.maximum(admin1_codes, 0)], None)
+    # 1) Compare the feed's country against every known spelling of the geocoded one
+    feed = df["country"] if "country" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    feed_present = feed.notna().to_numpy() & (feed.astype("string").fillna("").str.strip() != "").to_numpy()
+    mismatch = np.zeros(len(df), dtype=bool)
+    feed_values = feed.to_numpy(dtype=object)
+    for i in np.flatnonzero(feed_present & found):
+        mismatch[i] = normalise_country(feed_values[i]) not in geocoder["aliases"][codes[i]]
+    df["country_mismatch"] = mismatch
+    # 2) Fill the gaps
+    if fill:
+        df["country"] = np.where(feed_present, feed_values, df["geo_country"].to_numpy(dtype=object))
+    return df
+
+def geocode_stage(df, boundary_path=COUNTRY_BOUNDARIES, admin1_path=ADMIN1_BOUNDARIES):
+    """
+    Pipeline stage: geocode the facilities when the boundary file exists
+    locally (otherwise pass 'df' through unchanged) and report mismatches.
+    """
+    if not boundary_path or not os.path.exists(boundary_path):
+        return df
+    geocoder = load_geocoder(boundary_path)
+    admin1 = load_geocoder(admin1_path) if admin1_path and os.path.exists(admin1_path) else None
+    before = df["country"] if "country" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    df = geocode_facilities(df, geocoder, admin1)
+    filled = int((before.isna() & df["country"].notna()).sum())
+    print(f"Geocoding: {filled} missing countries filled, {int(df['country_mismatch'].sum())} mismatches flagged")
+    return df
@@ -0,0 +1,277 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Published datasets live here, one file per snapshot version. /dev/shm is
+# RAM-backed on Linux, so the file *is* shared memory; elsewhere the OS page
+# cache plays the same role for a file on disk.
+SHARED_DIR = os.environ.get(
+    "SHARED_DATASET_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "datacentres_shared"),
+)
+SHARED_WORKERS = int(os.environ.get("SHARED_WORKERS", str(os.cpu_count() or 1)))
+
+MAGIC = b"FACSHM1\0"
+ALIGN = 64  # every buffer starts on a cache line (and is valid for any dtype)
+
+##################################################
+# 3) Publish
+##################################################
+
+# File layout: MAGIC, uint64 header length, JSON header, then aligned raw
+# buffers. The header lists each column's kind and where its buffers are:
+#   "numeric"/"bool" - one array of 'dtype' (int64 for integer columns
+#                      without missing values, else float64 with NaN)
+#   "datetime"       - datetime64 in the column's own unit (UTC for tz-aware)
+#   "string"         - int32 codes (-1 = missing) into a dictionary stored
+#                      Arrow-style as int64 offsets + one UTF-8 blob
+
+def dataset_version(df):
+    """Content hash of a DataFrame (values and column names), used as its snapshot version."""
+    digest = hashlib.sha256(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    try:
+        hashes = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:  # unhashable cells (lists from the raw feed): hash their text
+        hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def column_buffers(series):
+    """(kind, {buffer name: contiguous array}) for one column."""
+    if pd.api.types.is_bool_dtype(series) and not series.isna().any():
+        return "bool", {"values": series.to_numpy(dtype=bool)}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert(None)
+        return "datetime", {"values": series.to_numpy()}
+    if pd.api.types.is_integer_dtype(series) and not series.isna().any():
+        return "numeric", {"values": series.to_numpy(dtype=np.int64)}
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric", {"values": series.to_numpy(dtype=float, na_value=np.nan)}
+    codes, labels = pd.factorize(series.astype("string"), use_na_sentinel=True)
+    encoded = [str(label).encode("utf-8") for label in labels]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return "string", {
+        "codes": codes.astype(np.int32),
+        "offsets": offsets,
+        "blob": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    }
+
+def publish_dataset(df, directory=SHARED_DIR, version=None):
+    """
+    Write 'df' once as '<directory>/facilities-<version>.bin' and return the
+    path. Publishing a version that already exists returns at once, and the
+    file is written under a temporary name and renamed, so workers never
+    attach to a half-written snapshot.
+    """
+    version = version or dataset_version(df)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"facilities-{version}.bin")
+    if os.path.exists(path):
+        return path
+    # 1) Lay out every buffer
+    columns, buffers, offset = [], [], 0
+    for name in df.columns:
+        kind, arrays = column_buffers(df[name])
+        spec = {"name": str(name), "kind": kind, "buffers": {}}
+        for buffer_name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            spec["buffers"][buffer_name] = {"dtype": array.dtype.str, "offset": offset, "count": len(array)}
+            buffers.append((offset, array))
+            offset += -(-array.nbytes // ALIGN) * ALIGN
+        columns.append(spec)
+    header = json.dumps({"version": version, "n_rows": len(df), "columns": columns}).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+    # 2) Write header and buffers, then publish atomically
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+        for buffer_offset, array in buffers:
+            f.seek(data_start + buffer_offset)
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return path
+
+def file_version(snapshot_path):
+    """Snapshot version of a file from its path, size and modification time (no read needed)."""
+    stat = os.stat(snapshot_path)
+    key = f"{os.path.abspath(snapshot_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def publish_snapshot(snapshot_path, directory=SHARED_DIR):
+    """
+    Publish a snapshot file (CSV, Parquet or XLSX, as written by the
+    pipeline). An unchanged file maps to an existing version, so it is
+    neither read nor hashed again.
+    """
+    version = file_version(snapshot_path)
+    path = os.path.join(directory, f"facilities-{version}.bin")
+    if os.path.exists(path):
+        return path
+    if snapshot_path.endswith(".parquet"):
+        df = pd.read_parquet(snapshot_path)
+    elif snapshot_path.endswith(".xlsx"):
+        df = pd.read_excel(snapshot_path)
+    else:
+        df = pd.read_csv(snapshot_path, low_memory=False)
+    return publish_dataset(df, directory, version)
+
+def remove_old_versions(directory=SHARED_DIR, keep=()):
+    """Delete published snapshots not in 'keep' (paths); attached workers keep their mapping."""
+    if not os.path.isdir(directory):
+        return
+    keep = {os.path.abspath(p) for p in keep}
+    for name in os.listdir(directory):
+        path = os.path.abspath(os.path.join(directory, name))
+        if name.startswith("facilities-") and path not in keep:
+            os.remove(path)
+
+##################################################
+# 4) Attach
+##################################################
+
+attached = {}  # path -> dataset, per process: attaching again is free
+
+def attach_dataset(path):
+    """
+    Map a published snapshot read-only and return a dict: version, n_rows,
+    path and "columns" {name: {"kind", buffer name: NumPy view}}. The views
+    point straight into the mapping (no copy), so every process attached to
+    the same file shares one resident copy through the page cache.
+    """
+    if path in attached:
+        return attached[path]
+    mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mapping[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"Not a published facility dataset: {path}")
+    header_length = int(mapping[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(mapping[header_start:header_start + header_length]))
+    data_start = -(-(header_start + header_length) // ALIGN) * ALIGN
+    columns = {}
+    for spec in header["columns"]:
+        column = {"kind": spec["kind"]}
+        for buffer_name, buffer in spec["buffers"].items():
+            dtype = np.dtype(buffer["dtype"])
+            start = data_start + buffer["offset"]
+            column[buffer_name] = mapping[start:start + buffer["count"] * dtype.itemsize].view(dtype)
+        columns[spec["name"]] = column
+    dataset = {"version": header["version"], "n_rows": header["n_rows"], "path": path,
+               "columns": columns, "labels": {}}
+    attached[path] = dataset
+    return dataset
+
+def column_labels(dataset, name):
+    """The decoded dictionary of a string column (decoded once per process, on first use)."""
+    if name not in dataset["labels"]:
+        column = dataset["columns"][name]
+        blob, offsets = column["blob"].tobytes(), column["offsets"]
+        dataset["labels"][name] = np.array(
+            [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)], dtype=object)
+    return dataset["labels"][name]
+
+def column_values(dataset, name):
+    """
+    A column as an array: numeric, bool and datetime columns are zero-copy
+    views; string columns are materialised from codes and dictionary.
+    """
+    column = dataset["columns"][name]
+    if column["kind"] == "string":
+        labels = column_labels(dataset, name)
+        codes = column["codes"]
+        return np.where(codes >= 0, labels[np.maximum(codes, 0)] if len(labels) else None, None)
+    return column["values"]
+
+def to_frame(dataset, columns=None):
+    """A DataFrame of 'columns' (default: all); string columns become Categoricals over the shared codes."""
+    data = {}
+    for name in columns or dataset["columns"]:
+        column = dataset["columns"][name]
+        if column["kind"] == "string":
+            data[name] = pd.Categorical.from_codes(column["codes"], categories=pd.Index(column_labels(dataset, name)),
+                                                   validate=False)
+        else:
+            data[name] = column_values(dataset, name)
+    return pd.DataFrame(data, copy=False)
+
+def unpublish_dataset(path):
+    """Forget this process's mapping of a snapshot and delete its file (workers still attached keep theirs)."""
+    attached.pop(path, None)
+    if os.path.exists(path):
+        os.remove(path)
+
+##################################################
+# 5) Process Pool Helpers
+##################################################
+
+worker_path = None
+
+def init_worker(path):
+    """ProcessPoolExecutor initializer: attach the snapshot once per worker."""
+    global worker_path
+    worker_path = path
+    attach_dataset(path)
+
+def worker_dataset():
+    """The snapshot this worker was started with (see 'init_worker')."""
+    return attach_dataset(worker_path)
+
+def call_with_dataset(func, *args):
+    return func(worker_dataset(), *args)
+
+def row_chunks(n_rows, n_chunks):
+    """(start, stop) bounds splitting n_rows into n_chunks near-equal ranges."""
+    bounds = np.linspace(0, n_rows, max(min(n_chunks, n_rows), 1) + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def map_row_chunks(func, path, n_chunks=None, workers=SHARED_WORKERS, extra_args=()):
+    """
+    Run func(dataset, start, stop, *extra_args) over row ranges of a
+    published snapshot in a process pool and return the results in order.
+    Only the path and row bounds cross the process boundary; every worker
+    maps the same file instead of unpickling its own copy of the frame.
+    'func' must be a module-level function (it is pickled by name).
+    """
+    n_rows = attach_dataset(path)["n_rows"]
+    chunks = row_chunks(n_rows, n_chunks or workers * 4)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(path,)) as pool:
+        futures = [pool.submit(call_with_dataset, func, start, stop, *extra_args) for start, stop in chunks]
+        return [future.result() for future in futures]
+
+##################################################
+# 6) Publish a Snapshot
+##################################################
+
+def chunk_power(dataset, start, stop):
+    """Example worker task: total gross_max_power of a row range."""
+    return float(np.nansum(column_values(dataset, "gross_max_power")[start:stop]))
+
+# Usage: python shared_dataset_v1.py [datacenter_map_data.csv]
+#   Publishes the snapshot (printing its path), then sums gross_max_power in a
+#   process pool over the shared copy as a check.
+if __name__ == "__main__":
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else "datacenter_map_data.csv"
+    start_time = time.perf_counter()
+    shared_path = publish_snapshot(snapshot_path)
+    print(f"Published {attach_dataset(shared_path)['n_rows']} rows to {shared_path} "
+          f"({os.path.getsize(shared_path) / 1e6:.1f} MB) in {time.perf_counter() - start_time:.2f}s")
+    start_time = time.perf_counter()
+    total = sum(map_row_chunks(chunk_power, shared_path))
+    print(f"gross_max_power total {total:,.0f} from {SHARED_WORKERS} workers in {time.perf_counter() - start_time:.2f}s")
@@ -0,0 +1,370 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from hazard_exposure_v1 import KM_PER_DEG_LAT, KM_PER_DEG_LON_AT_EQUATOR, geometry_parts
+from reverse_geocode_v1 import expand_ranges, first_property
+
+##################################################
+# 2) Define Settings
+##################################################
+
+# Local hydrography, one file per kind of source: GeoJSON (LineString rivers,
+# Polygon reservoirs - their shorelines are used - or Point features), or a
+# CSV of points with lon/lat columns (e.g. desalination plants). Missing
+# files are skipped.
+WATER_SOURCES = [
+    {"kind": "river", "path": os.environ.get("WATER_RIVERS", "water_rivers.geojson")},
+    {"kind": "reservoir", "path": os.environ.get("WATER_RESERVOIRS", "water_reservoirs.geojson")},
+    {"kind": "desalination", "path": os.environ.get("WATER_DESALINATION", "water_desalination.csv")},
+]
+NAME_PROPERTIES = ["name", "NAME", "name_en", "NAME_EN", "river_name", "RIVER_NAME", "title"]
+LON_COLUMNS = ["lon", "longitude", "coord_x", "x", "LON", "Longitude"]
+LAT_COLUMNS = ["lat", "latitude", "coord_y", "y", "LAT", "Latitude"]
+
+# Index cell size in degrees (segments longer than a cell are split), and
+# how far to search before giving up
+WATER_CELL_DEG = float(os.environ.get("WATER_CELL_DEG", "0.05"))
+WATER_MAX_DISTANCE_KM = float(os.environ.get("WATER_MAX_DISTANCE_KM", "100"))
+WATER_SOURCES_PATH = os.environ.get("WATER_SOURCES_PATH", "datacenter_water_sources.csv")
+# Candidate (facility, segment) pairs evaluated per batch, and how much
+# coarser the occupancy grid used to skip empty rings is
+PAIR_CHUNK = 4_000_000
+COARSE_FACTOR = 16
+# Part of the cached index signature; bump when the index layout changes
+INDEX_VERSION = 2
+
+##################################################
+# 3) Build (or Load) the Segment Index
+##################################################
+
+def read_parts(path):
+    """
+    (coordinates (n, 2), part id per coordinate, feature id per part, feature
+    names) for a hydrography file. Points become zero-length parts.
+    """
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path, low_memory=False)
+        lon_col = next(c for c in LON_COLUMNS if c in df.columns)
+        lat_col = next(c for c in LAT_COLUMNS if c in df.columns)
+        name_col = next((c for c in NAME_PROPERTIES if c in df.columns), None)
+        coords = df[[lon_col, lat_col]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        n = len(df)
+        names = df[name_col].fillna("").astype(str).to_numpy(dtype=object) if name_col else np.full(n, "", dtype=object)
+        return coords, np.arange(n), np.arange(n), names
+    with open(path, "rb") as f:
+        features = json.load(f)["features"]
+    coords, part_ids, part_features, names = [], [], [], []
+    for feature_id, feature in enumerate(features):
+        names.append(first_property(feature.get("properties") or {}, NAME_PROPERTIES))
+        for line, is_area in geometry_parts(feature.get("geometry")):
+            points = np.asarray([p[:2] for p in line], dtype=float).reshape(-1, 2)
+            coords.append(points)
+            part_ids.append(np.full(len(points), len(part_features)))
+            part_features.append(feature_id)
+    if not coords:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.array(names, dtype=object)
+    return np.vstack(coords), np.concatenate(part_ids), np.asarray(part_features), np.array(names, dtype=object)
+
+def build_segment_index(coords, part_ids, part_features, cell=WATER_CELL_DEG):
+    """
+    Segment arrays plus a sparse cell -> segments index:
+    1) consecutive coordinates of the same part form a segment, a lone
+       point a zero-length one;
+    2) segments longer than a cell are split, so each piece touches at most
+       2 x 2 cells;
+    3) each piece is listed under every cell its bounding box touches, and
+       the (cell, piece) entries are sorted by cell (CSR-style).
+    """
+    valid = np.isfinite(coords).all(axis=1)
+    coords, part_ids = coords[valid], part_ids[valid]
+    if not len(coords):
+        empty, none = np.empty(0), np.empty(0, dtype=np.int64)
+        return {"x1": empty, "y1": empty, "x2": empty, "y2": empty, "feature": none, "cell_keys": none,
+                "cell_starts": none, "cell_counts": none, "cell_segments": none, "cell": np.array(cell)}
+    same = part_ids[1:] == part_ids[:-1]
+    first = np.r_[True, ~same]
+    last = np.r_[~same, True]
+    lone = first & last
+    x1 = np.concatenate([coords[:-1][same, 0], coords[lone, 0]])
+    y1 = np.concatenate([coords[:-1][same, 1], coords[lone, 1]])
+    x2 = np.concatenate([coords[1:][same, 0], coords[lone, 0]])
+    y2 = np.concatenate([coords[1:][same, 1], coords[lone, 1]])
+    feature = part_features[np.concatenate([part_ids[:-1][same], part_ids[lone]])]
+    # A segment crossing the antimeridian goes the short way (x2 may pass ±180)
+    x2 = x1 + (x2 - x1 + 180) % 360 - 180
+    # 2) Split long segments into equal pieces
+    pieces = np.maximum(np.ceil(np.maximum(np.abs(x2 - x1), np.abs(y2 - y1)) / cell), 1).astype(np.int64)
+    owner, k = expand_ranges(np.zeros(len(pieces), dtype=np.int64), pieces)
+    t0, t1 = k / pieces[owner], (k + 1) / pieces[owner]
+    dx, dy = x2 - x1, y2 - y1
+    seg = {
+        "x1": x1[owner] + t0 * dx[owner], "y1": y1[owner] + t0 * dy[owner],
+        "x2": x1[owner] + t1 * dx[owner], "y2": y1[owner] + t1 * dy[owner],
+        "feature": feature[owner],
+    }
+    # 3) Cells touched by each piece's bounding box (at most 2 x 2), with
+    #    columns wrapped around the antimeridian
+    ix0 = np.floor(np.minimum(seg["x1"], seg["x2"]) / cell).astype(np.int64)
+    iy0 = np.floor(np.minimum(seg["y1"], seg["y2"]) / cell).astype(np.int64)
+    ix1 = np.floor(np.maximum(seg["x1"], seg["x2"]) / cell).astype(np.int64)
+    iy1 = np.floor(np.maximum(seg["y1"], seg["y2"]) / cell).astype(np.int64)
+    entries_cell, entries_piece = [], []
+    for ox in (0, 1):
+        for oy in (0, 1):
+            use = (ix0 + ox <= ix1) & (iy0 + oy <= iy1)
+            entries_cell.append(cell_key((ix0[use] + ox) % grid_columns(cell), iy0[use] + oy))
+            entries_piece.append(np.flatnonzero(use))
+    entries_cell = np.concatenate(entries_cell)
+    order = np.argsort(entries_cell, kind="stable")
+    cell_keys, cell_starts, cell_counts = np.unique(entries_cell[order], return_index=True, return_counts=True)
+    seg.update({
+        "cell_keys": cell_keys, "cell_starts": cell_starts, "cell_counts": cell_counts,
+        "cell_segments": np.concatenate(entries_piece)[order], "cell": np.array(cell),
+    })
+    return seg
+
+def grid_columns(cell):
+    """Cell columns around the globe; column indices are taken modulo this."""
+    return int(round(360 / cell))
+
+def cell_key(ix, iy):
+    """One int64 per (column, row) cell; offsets keep negative indices positive."""
+    return (ix + 4_000_000) * 8_000_000 + (iy + 4_000_000)
+
+def load_segment_index(path, cell=WATER_CELL_DEG):
+    """
+    The segment index for a hydrography file, built once and cached next to
+    it ('<file>.segments<cell>.npz') together with the feature names, so a
+    cached run never parses the source file. The cache is keyed by the
+    file's size and modification time (hashing national-scale hydrography
+    costs as much as parsing it).
+    """
+    stat = os.stat(path)
+    signature = np.array(f"{stat.st_size}-{stat.st_mtime_ns}-v{INDEX_VERSION}")
+    cache_path = f"{path}.segments{cell:g}.npz"
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            if str(data["signature"]) == str(signature):
+                index = {key: data[key] for key in data.files}
+                index["names"] = index["names"].astype(object)
+                return index
+    coords, part_ids, part_features, names = read_parts(path)
+    index = build_segment_index(coords, part_ids, part_features, cell)
+    index["names"] = np.asarray(names, dtype=str)
+    np.savez(cache_path, signature=signature, **index)
+    index["names"] = index["names"].astype(object)
+    return index
+
+##################################################
+# 4) Nearest Segment Search
+##################################################
+
+def segment_distance_km(lon, lat, x1, y1, x2, y2):
+    """
+    Distance (km) from each point to its paired segment, and the nearest
+    point on it, in an equirectangular projection centred on the point (so
+    accuracy does not depend on how far the dataset spans).
+    """
+    km_x = KM_PER_DEG_LON_AT_EQUATOR * np.cos(np.radians(lat))
+    ax, ay = ((x1 - lon + 180) % 360 - 180) * km_x, (y1 - lat) * KM_PER_DEG_LAT
+    bx, by = ((x2 - lon + 180) % 360 - 180) * km_x, (y2 - lat) * KM_PER_DEG_LAT
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    t = np.clip(-(ax * dx + ay * dy) / np.where(length2 > 0, length2, 1), 0, 1)
+    return np.hypot(ax + t * dx, ay + t * dy), t
+
+def ring_offsets(ring):
+    """(dx, dy) cell offsets of the square ring at Chebyshev distance 'ring'."""
+    if ring == 0:
+        return np.zeros((1, 2), dtype=np.int64)
+    r = np.arange(-ring, ring + 1)
+    return np.unique(np.vstack([
+        np.column_stack([r, np.full_like(r, -ring)]), np.column_stack([r, np.full_like(r, ring)]),
+        np.column_stack([np.full_like(r, -ring), r]), np.column_stack([np.full_like(r, ring), r]),
+    ]), axis=0)
+
+def reach_km(lat, ring, cell):
+    """
+    Lower bound (km) on the distance from each point to any cell of ring
+    'ring' or beyond: (ring - 1) cells, with a degree of longitude taken at
+    the high-latitude edge of the ring, where it is shortest.
+    """
+    edge_lat = np.minimum(np.abs(lat) + ring * cell, 89.9)
+    return max(ring - 1, 0) * cell * np.minimum(KM_PER_DEG_LAT, KM_PER_DEG_LON_AT_EQUATOR * np.cos(np.radians(edge_lat)))
+
+def first_rings(lon, lat, cell_keys, cell, max_distance_km, factor=COARSE_FACTOR):
+    """
+    The first fine ring worth searching for each point (a huge number when
+    nothing lies within 'max_distance_km'), found by the same ring search
+    on a grid 'factor' times coarser that only records which coarse cells
+    are occupied. Fine cells within (rc - 1) * factor rings of a point whose
+    first occupied coarse ring is rc are all empty, so sparse sources (a
+    handful of desalination plants) don't cost a full fine search per point.
+    """
+    n = len(lon)
+    start = np.full(n, np.iinfo(np.int64).max)
+    fine_x = cell_keys // 8_000_000 - 4_000_000
+    fine_y = cell_keys % 8_000_000 - 4_000_000
+    coarse_keys = np.unique(cell_key(fine_x // factor, fine_y // factor))
+    coarse = cell * factor
+    # Coarse columns wrap too; the last one is 'short' fine columns narrower
+    # when 'factor' doesn't divide the fine columns, so rings across the
+    # antimeridian may reach that much closer
+    n_cols = grid_columns(cell)
+    n_coarse = -(-n_cols // factor)
+    short = n_coarse * factor - n_cols
+    cx = np.floor(lon / cell).astype(np.int64) % n_cols // factor
+    cy = np.floor(lat / coarse).astype(np.int64)
+    ring = 0
+    while True:
+        pending = np.flatnonzero((start == np.iinfo(np.int64).max) & (reach_km(lat, ring, coarse) <= max_distance_km))
+        if not len(pending):
+            return start
+        offsets = ring_offsets(ring)
+        keys = cell_key((cx[pending, None] + offsets[:, 0]) % n_coarse, (cy[pending, None] + offsets[:, 1]))
+        slot = np.minimum(np.searchsorted(coarse_keys, keys), len(coarse_keys) - 1)
+        hit = (coarse_keys[slot] == keys).any(axis=1)
+        start[pending[hit]] = max((ring - 1) * factor - short, 0)
+        ring += 1
+
+def nearest_segments(lon, lat, index, max_distance_km=WATER_MAX_DISTANCE_KM, chunk=PAIR_CHUNK):
+    """
+    Nearest segment (-1 if none within 'max_distance_km'), its distance and
+    the nearest point on it for every point, searching growing square rings
+    of cells around all unresolved points at once. A point is finished once
+    its best distance is below the closest any unsearched cell can be; empty
+    rings before a point's first occupied coarse cell are skipped.
+    """
+    n = len(lon)
+    best = np.full(n, np.inf)
+    best_segment = np.full(n, -1, dtype=np.int64)
+    best_t = np.zeros(n)
+    cell = float(index["cell"])
+    cell_keys, cell_starts, cell_counts = index["cell_keys"], index["cell_starts"], index["cell_counts"]
+    if not len(cell_keys) or not n:
+        return best_segment, np.where(np.isinf(best), np.nan, best), best_t
+    n_cols = grid_columns(cell)
+    ix = np.floor(lon / cell).astype(np.int64)
+    iy = np.floor(lat / cell).astype(np.int64)
+    start = first_rings(lon, lat, cell_keys, cell, max_distance_km)
+    ring = 0
+    while True:
+        reach = reach_km(lat, ring, cell)
+        pending = (best > reach) & (reach <= max_distance_km) & (start < np.iinfo(np.int64).max)
+        if not pending.any():
+            break
+        active = np.flatnonzero(pending & (start <= ring))
+        if not len(active):
+            ring = int(start[pending].min())
+            continue
+        offsets = ring_offsets(ring)
+        # 1) Occupied cells of the ring for every active point
+        # Columns wrap (as reverse_geocode does with % n_cols), so points near
+        # ±180° also search the cells across the antimeridian
+        keys = cell_key(((ix[active, None] + offsets[:, 0]) % n_cols).ravel(), (iy[active, None] + offsets[:, 1]).ravel())
+        owner = np.repeat(active, len(offsets))
+        slot = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+        found = cell_keys[slot] == keys
+        owner, slot = owner[found], slot[found]
+        # 2) Candidate segments in bounded batches; keep each point's closest
+        totals = np.cumsum(cell_counts[slot])
+        begin = 0
+        while begin < len(slot):
+            base = totals[begin - 1] if begin else 0
+            end = max(int(np.searchsorted(totals, base + chunk, side="right")), begin + 1)
+            members, entries = expand_ranges(cell_starts[slot[begin:end]], cell_counts[slot[begin:end]])
+            points = owner[begin:end][members]
+            segments = index["cell_segments"][entries]
+            dist, t = segment_distance_km(lon[points], lat[points], index["x1"][segments], index["y1"][segments],
+                                          index["x2"][segments], index["y2"][segments])
+            order = np.lexsort((dist, points))
+            first = order[np.r_[True, points[order][1:] != points[order][:-1]]]
+            better = dist[first] < best[points[first]]
+            winners = first[better]
+            best[points[winners]] = dist[winners]
+            best_segment[points[winners]] = segments[winners]
+            best_t[points[winners]] = t[winners]
+            begin = end
+        ring += 1
+    missing = best > max_distance_km
+    best_segment[missing] = -1
+    return best_segment, np.where(missing, np.nan, best), best_t
+
+def nearest_water_sources(df, sources=WATER_SOURCES, max_distance_km=WATER_MAX_DISTANCE_KM, cell=WATER_CELL_DEG):
+    """
+    For every facility (coord_x = longitude, coord_y = latitude) add:
+      <kind>_distance_km          - distance to the nearest source of each kind
+      water_distance_km           - distance to the nearest source of any kind
+      water_source_kind / _name   - which source that is
+      water_source_lon / _lat     - the closest point on it
+    Sources without a local file are skipped; NaN / "" means nothing within
+    'max_distance_km'.
+    """
+    lon = pd.to_numeric(df["coord_x"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    lat = pd.to_numeric(df["coord_y"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat) & (np.abs(lat) <= 90))
+    out = df.copy()
+    n = len(df)
+    best = np.full(n, np.inf)
+    kind = np.full(n, "", dtype=object)
+    name = np.full(n, "", dtype=object)
+    source_lon, source_lat = np.full(n, np.nan), np.full(n, np.nan)
+    for source in sources:
+        if not source.get("path") or not os.path.exists(source["path"]):
+            continue
+        index = load_segment_index(source["path"], cell)
+        segment, distance, t = nearest_segments(lon[valid], lat[valid], index, max_distance_km)
+        column = np.full(n, np.nan)
+        column[valid] = distance
+        out[f"{source['kind']}_distance_km"] = column.round(3)
+        # Keep the overall nearest across kinds
+        improved = np.isfinite(distance) & (distance < best[valid])
+        closer, hit, t_hit = valid[improved], segment[improved], t[improved]
+        best[closer] = column[closer]
+        kind[closer] = source["kind"]
+        name[closer] = index["names"][index["feature"][hit]]
+        source_lon[closer] = index["x1"][hit] + t_hit * (index["x2"][hit] - index["x1"][hit])
+        source_lat[closer] = index["y1"][hit] + t_hit * (index["y2"][hit] - index["y1"][hit])
+    out["water_distance_km"] = np.where(np.isinf(best), np.nan, best).round(3)
+    out["water_source_kind"] = kind
+    out["water_source_name"] = name
+    out["water_source_lon"] = source_lon
+    out["water_source_lat"] = source_lat
+    return out
+
+def water_sources_stage(df, path=WATER_SOURCES_PATH):
+    """
+    Pipeline stage: write each facility's id and water-source columns to
+    'path' (an empty table, with a note, when no hydrography file exists).
+    """
+    if not any(s.get("path") and os.path.exists(s["path"]) for s in WATER_SOURCES):
+        print("No local hydrography files found; skipping nearest water source")
+        pd.DataFrame(columns=["id", "water_distance_km"]).to_csv(path, index=False)
+        return path
+    out = nearest_water_sources(df)
+    columns = ["id"] + [c for c in out.columns if c not in df.columns]
+    out[columns].to_csv(path, index=False)
+    return path
+
+##################################################
+# 5) Run the Batch
+##################################################
+
+# Usage: python water_sources_v1.py [datacenter_map_data.csv]
+#   WATER_RIVERS=rivers.geojson WATER_RESERVOIRS=lakes.geojson WATER_DESALINATION=desal.csv
+if __name__ == "__main__":
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else "datacenter_map_data.csv"
+    facilities = pd.read_csv(snapshot_path, low_memory=False)
+    start_time = time.perf_counter()
+    water_sources_stage(facilities, WATER_SOURCES_PATH)
+    print(f"Nearest water sources for {len(facilities)} facilities in {time.perf_counter() - start_time:.2f}s "
+          f"-> {WATER_SOURCES_PATH}")
@@ -0,0 +1,360 @@
+##################################################
+# 1) Import Packages
+##################################################
+
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from reverse_geocode_v1 import canonical_country
+from shared_dataset_v1 import (SHARED_WORKERS, attach_dataset, call_with_dataset, dataset_version, init_worker,
+                               publish_dataset, unpublish_dataset)
+
+##################################################
+# 2) Define Settings
+##################################################
+
+MC_DRAWS = int(os.environ.get("MC_DRAWS", "10000"))
+MC_SEED = int(os.environ.get("MC_SEED", "0"))
+MC_WORKERS = int(os.environ.get("MC_WORKERS", str(SHARED_WORKERS)))
+# Draws per task (fixed, so results don't depend on the worker count), and
+# facility x draw values simulated at once inside a task (bounds memory)
+MC_TASK_DRAWS = int(os.environ.get("MC_TASK_DRAWS", "5000"))
+MC_CHUNK_VALUES = int(os.environ.get("MC_CHUNK_VALUES", "2000000"))
+MC_FACILITY_PATH = os.environ.get("MC_FACILITY_PATH", "datacenter_water_uncertainty.csv")
+MC_COUNTRY_PATH = os.environ.get("MC_COUNTRY_PATH", "datacenter_water_uncertainty_by_country.csv")
+
+# Annual water use (m3) = IT load (kW) x utilisation x hours x
+#   (WUE + PUE x EWIF) / 1000
+# WUE: on-site water per kWh of IT energy; EWIF: water consumed generating
+# each kWh of grid electricity (so PUE x EWIF is the off-site share).
+# Each parameter is drawn independently per facility and draw.
+PARAMETERS = {
+    "wue_l_per_kwh": {"dist": "lognormal", "median": 1.8, "sigma": 0.4},
+    "pue": {"dist": "triangular", "low": 1.1, "mode": 1.5, "high": 2.0},
+    "utilisation": {"dist": "uniform", "low": 0.4, "high": 0.8},
+    "ewif_l_per_kwh": {"dist": "lognormal", "median": 2.0, "sigma": 0.5},
+}
+HOURS_PER_YEAR = 8766
+
+# Missing (or non-positive) gross_max_power is imputed per draw: from a
+# bootstrap of observed kW per m2 when the facility's m2 is known, else from
+# observed powers in its country (with at least MIN_COUNTRY_SAMPLES of
+# them), else from all observed powers
+MIN_COUNTRY_SAMPLES = 10
+
+# Quantile sketch: per series, SKETCH_BINS log-spaced bins spanning the
+# series' possible range (smallest to largest pool value, lognormal
+# parameters cut at SKETCH_TAIL_SIGMAS), with bin ratio at least
+# SKETCH_GAMMA (relative error ~ (gamma - 1) / 2). The first and last bin
+# count draws outside that range; their share is reported per series.
+SKETCH_GAMMA = 1.02
+SKETCH_BINS = 512
+SKETCH_TAIL_SIGMAS = 6
+QUANTILES = (0.05, 0.5, 0.95)
+
+##################################################
+# 3) Define the Model
+##################################################
+
+def sample_parameter(rng, spec, size):
+    if spec["dist"] == "lognormal":
+        return spec["median"] * np.exp(rng.normal(0.0, spec["sigma"], size))
+    if spec["dist"] == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if spec["dist"] == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if spec["dist"] == "fixed":
+        return np.full(size, float(spec["value"]))
+    raise ValueError(f"Unknown distribution: {spec['dist']}")
+
+def parameter_bounds(spec, tail_sigmas=SKETCH_TAIL_SIGMAS):
+    """(low, high) of a parameter; lognormal tails are cut at 'tail_sigmas'."""
+    if spec["dist"] == "lognormal":
+        spread = np.exp(tail_sigmas * spec["sigma"])
+        return spec["median"] / spread, spec["median"] * spread
+    if spec["dist"] in ("triangular", "uniform"):
+        return spec["low"], spec["high"]
+    return float(spec["value"]), float(spec["value"])
+
+def water_m3(power_kw, params):
+    return power_kw * params["utilisation"] * HOURS_PER_YEAR * (
+        params["wue_l_per_kwh"] + params["pue"] * params["ewif_l_per_kwh"]) / 1000
+
+def prepare_model(df, parameters=PARAMETERS, min_country_samples=MIN_COUNTRY_SAMPLES):
+    """
+    Split 'df' into the per-facility arrays the workers need (published as a
+    shared dataset) and the small imputation pools (sent with each task):
+      frame  - power (NaN = impute), m2, country code, imputation pool per
+               facility (-1: kW/m2 density, else a power pool) and the
+               range of its quantile sketch (lowest value, log bin ratio);
+      model  - pools as one concatenated array with starts/counts, the
+               density sample, parameters, country labels and the
+               countries' sketch ranges.
+    """
+    power = pd.to_numeric(df.get("gross_max_power"), errors="coerce").to_numpy(dtype=float, na_value=np.nan) \
+        if "gross_max_power" in df.columns else np.full(len(df), np.nan)
+    area = pd.to_numeric(df.get("m2"), errors="coerce").to_numpy(dtype=float, na_value=np.nan) \
+        if "m2" in df.columns else np.full(len(df), np.nan)
+    power = np.where(power > 0, power, np.nan)
+    area = np.where(area > 0, area, np.nan)
+    # Group on one spelling per country (geocoded where available), so e.g.
+    # "USA" and "United States" share a pool and a country total
+    countries = canonical_country(df).fillna("Unknown")
+    country_codes, country_labels = pd.factorize(countries)
+    known = np.isfinite(power)
+    if not known.any():
+        raise ValueError("No facility has a gross_max_power to impute from")
+    # 1) kW per m2 from facilities with both, and a power pool per country
+    #    with enough samples (pool 0 is every observed power)
+    both = known & np.isfinite(area)
+    density = power[both] / area[both]
+    per_country = np.bincount(country_codes[known], minlength=len(country_labels))
+    pooled = np.flatnonzero(per_country >= min_country_samples)
+    pool_of_country = np.zeros(len(country_labels), dtype=np.int64)
+    pool_of_country[pooled] = np.arange(1, len(pooled) + 1)
+    pools = [power[known]] + [power[known & (country_codes == c)] for c in pooled]
+    pool_counts = np.array([len(p) for p in pools])
+    pool_starts = np.cumsum(pool_counts) - pool_counts
+    use_density = ~known & np.isfinite(area) & (len(density) > 0)
+    pool = np.where(use_density, -1, pool_of_country[country_codes])
+    # 2) Each facility's possible water use: lowest and highest power it
+    #    can draw, times the lowest and highest parameters (water use grows
+    #    with every parameter); a country's range is the sum of its facilities'
+    pool_low = np.array([p.min() for p in pools])[np.maximum(pool, 0)]
+    pool_high = np.array([p.max() for p in pools])[np.maximum(pool, 0)]
+    if len(density):
+        pool_low = np.where(use_density, area * density.min(), pool_low)
+        pool_high = np.where(use_density, area * density.max(), pool_high)
+    bounds = {name: parameter_bounds(spec) for name, spec in parameters.items()}
+    low = water_m3(np.where(known, power, pool_low), {name: b[0] for name, b in bounds.items()})
+    high = water_m3(np.where(known, power, pool_high), {name: b[1] for name, b in bounds.items()})
+    country_low = np.bincount(country_codes, weights=low, minlength=len(country_labels))
+    country_high = np.bincount(country_codes, weights=high, minlength=len(country_labels))
+    frame = pd.DataFrame({
+        "power": power, "m2": area, "country": country_codes.astype(np.int64),
+        "pool": pool.astype(np.int64), "sketch_low": low, "sketch_log_gamma": sketch_log_gamma(low, high),
+    })
+    model = {
+        "parameters": parameters,
+        "density": density.astype(float),
+        "pool_values": np.concatenate(pools).astype(float),
+        "pool_starts": pool_starts,
+        "pool_counts": pool_counts,
+        "country_labels": np.asarray(country_labels, dtype=object),
+        "country_low": country_low,
+        "country_log_gamma": sketch_log_gamma(country_low, country_high),
+    }
+    return frame, model
+
+##################################################
+# 4) Streaming Reducers
+##################################################
+
+# A reducer state holds, per series (facility or country): draw count,
+# running mean and sum of squared deviations (merged with Chan et al.'s
+# pairwise formula) and a log-binned histogram sketch. States from
+# different chunks merge in any order, so nothing is kept per draw.
+
+def empty_state(n_series, bins=SKETCH_BINS):
+    return {"count": 0, "mean": np.zeros(n_series), "m2": np.zeros(n_series),
+            "sketch": np.zeros((n_series, bins), dtype=np.int64)}
+
+def sketch_log_gamma(low, high, gamma=SKETCH_GAMMA, bins=SKETCH_BINS):
+    """Log bin ratio per series so the inner bins span [low, high] (never finer than 'gamma')."""
+    return np.maximum(np.log(np.maximum(high, low) / low) / (bins - 2), np.log(gamma))
+
+def sketch_bins(values, low, log_gamma, bins=SKETCH_BINS):
+    """
+    Bin of each value in its series' sketch ('values' is draws x series):
+    0 below 'low', bins - 1 beyond the last inner bin, else 1 + the log bin.
+    """
+    ratio = np.maximum(values, 1e-300) / low
+    index = np.floor(np.log(ratio) / log_gamma).astype(np.int64) + 1
+    return np.where(ratio < 1, 0, np.minimum(index, bins - 1))
+
+def chunk_state(values, low, log_gamma, bins=SKETCH_BINS):
+    """Reducer state of one chunk's draws (draws x series)."""
+    n_draws, n_series = values.shape
+    series = np.broadcast_to(np.arange(n_series), values.shape)
+    sketch = np.bincount((series * bins + sketch_bins(values, low, log_gamma, bins)).ravel(),
+                         minlength=n_series * bins).reshape(n_series, bins)
+    mean = values.mean(axis=0)
+    return {"count": n_draws, "mean": mean, "m2": ((values - mean) ** 2).sum(axis=0), "sketch": sketch}
+
+def merge_states(a, b):
+    """Combine two reducer states (in place into 'a', which is returned)."""
+    n = a["count"] + b["count"]
+    if not b["count"]:
+        return a
+    delta = b["mean"] - a["mean"]
+    a["m2"] += b["m2"] + delta ** 2 * a["count"] * b["count"] / n
+    a["mean"] += delta * b["count"] / n
+    a["count"] = n
+    a["sketch"] += b["sketch"]
+    return a
+
+def sketch_quantiles(state, low, log_gamma, quantiles=QUANTILES):
+    """
+    Quantiles per series from the sketch (inner bin midpoints on the log
+    scale; a quantile in an end bin is reported at the edge of the range).
+    """
+    sketch = state["sketch"]
+    bins = sketch.shape[1]
+    cumulative = np.cumsum(sketch, axis=1)
+    result = {}
+    for q in quantiles:
+        target = q * cumulative[:, -1]
+        index = (cumulative < target[:, None]).sum(axis=1)
+        result[q] = low * np.exp(log_gamma * np.clip(index - 0.5, 0, bins - 2))
+    return result
+
+def outside_share(state):
+    """Share of each series' draws that fell outside its sketch range (0 when the range held)."""
+    return (state["sketch"][:, 0] + state["sketch"][:, -1]) / max(state["count"], 1)
+
+##################################################
+# 5) Simulate
+##################################################
+
+def task_rng(seed, task_id):
+    """Generator for one task: depends only on (seed, task id), not on workers or scheduling."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(task_id,)))
+
+def simulate_task(dataset, task_id, n_draws, model, seed, chunk_values=MC_CHUNK_VALUES):
+    """
+    Worker task: 'n_draws' draws for every facility of the shared dataset,
+    simulated in chunks of about 'chunk_values' facility x draw values and
+    reduced locally. Returns this task's facility and country states.
+    """
+    rng = task_rng(seed, task_id)
+    n = dataset["n_rows"]
+    chunk_draws = max(1, chunk_values // max(n, 1))
+    facility_state = empty_state(n)
+    country_state = empty_state(len(model["country_labels"]))
+    for start in range(0, n_draws, chunk_draws):
+        facility, country = simulate_chunk(dataset, rng, min(chunk_draws, n_draws - start), model)
+        merge_states(facility_state, facility)
+        merge_states(country_state, country)
+    return facility_state, country_state
+
+def simulate_chunk(dataset, rng, n_draws, model):
+    """'n_draws' draws for every facility; the reducer states of just these draws."""
+    columns = dataset["columns"]
+    power, area = columns["power"]["values"], columns["m2"]["values"]
+    country, pool = columns["country"]["values"], columns["pool"]["values"]
+    n = len(power)
+    shape = (n_draws, n)
+    # 1) Impute missing power per draw (bootstrap from the facility's pool)
+    draws_power = np.broadcast_to(power, shape).copy()
+    missing = np.flatnonzero(np.isnan(power))
+    if len(missing):
+        by_density = missing[pool[missing] < 0]
+        by_pool = missing[pool[missing] >= 0]
+        if len(by_density):
+            picks = rng.integers(0, len(model["density"]), (n_draws, len(by_density)))
+            draws_power[:, by_density] = area[by_density] * model["density"][picks]
+        if len(by_pool):
+            p = pool[by_pool]
+            offsets = np.floor(rng.random((n_draws, len(by_pool))) * model["pool_counts"][p]).astype(np.int64)
+            draws_power[:, by_pool] = model["pool_values"][model["pool_starts"][p] + offsets]
+    # 2) Parameters per facility and draw, then water use
+    params = {name: sample_parameter(rng, spec, shape) for name, spec in model["parameters"].items()}
+    water = water_m3(draws_power, params)
+    # 3) Per-country totals of each draw
+    n_countries = len(model["country_labels"])
+    keys = np.arange(n_draws)[:, None] * n_countries + country
+    country_water = np.bincount(keys.ravel(), weights=water.ravel(),
+                                minlength=n_draws * n_countries).reshape(n_draws, n_countries)
+    return (chunk_state(water, columns["sketch_low"]["values"], columns["sketch_log_gamma"]["values"]),
+            chunk_state(country_water, model["country_low"], model["country_log_gamma"]))
+
+def run_monte_carlo(df, draws=MC_DRAWS, seed=MC_SEED, workers=MC_WORKERS, task_draws=MC_TASK_DRAWS,
+                    chunk_values=MC_CHUNK_VALUES, parameters=PARAMETERS):
+    """
+    Simulate 'draws' Monte Carlo draws of annual water use for every facility
+    of 'df' and return (facility intervals, country intervals) DataFrames:
+    mean, sd and the QUANTILES (m3/year), plus whether power was imputed.
+    The facility arrays are published once as a shared dataset (named for
+    this run, and removed when the run ends); tasks of
+    'task_draws' draws run in a process pool (inline with workers <= 1) and
+    their reducer states are merged as they complete, with at most two
+    tasks per worker in flight. Results depend on 'seed' and 'task_draws',
+    not on 'workers'.
+    """
+    frame, model = prepare_model(df, parameters)
+    # A per-run name: a concurrent run with the same data can't remove it
+    path = publish_dataset(frame, version=f"mc-{os.getpid()}-{dataset_version(frame)}")
+    n = len(frame)
+    tasks = [(i, min(task_draws, draws - i * task_draws)) for i in range(-(-draws // task_draws))]
+    facility_state = empty_state(n)
+    country_state = empty_state(len(model["country_labels"]))
+    def merge(result):
+        merge_states(facility_state, result[0])
+        merge_states(country_state, result[1])
+    try:
+        if workers <= 1:
+            dataset = attach_dataset(path)
+            for task_id, n_draws in tasks:
+                merge(simulate_task(dataset, task_id, n_draws, model, seed, chunk_values))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(path,)) as pool:
+                pending, queue = set(), list(tasks)
+                while queue or pending:
+                    while queue and len(pending) < 2 * workers:
+                        task_id, n_draws = queue.pop(0)
+                        pending.add(pool.submit(call_with_dataset, simulate_task, task_id, n_draws, model, seed,
+                                                chunk_values))
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(future.result())
+    finally:
+        unpublish_dataset(path)
+    return (
+        summarise_state(facility_state, frame["sketch_low"].to_numpy(), frame["sketch_log_gamma"].to_numpy(), {
+            "id": df["id"].to_numpy() if "id" in df.columns else np.arange(n),
+            "country": model["country_labels"][frame["country"].to_numpy()],
+            "power_imputed": np.isnan(frame["power"].to_numpy()),
+        }),
+        summarise_state(country_state, model["country_low"], model["country_log_gamma"],
+                        {"country": model["country_labels"]}),
+    )
+
+def summarise_state(state, low, log_gamma, columns):
+    """
+    Interval table for a merged reducer state. 'outside_sketch_share' is the
+    share of draws beyond the sketch range (quantiles landing there are only
+    bounds).
+    """
+    out = pd.DataFrame(columns)
+    out["draws"] = state["count"]
+    out["mean_m3"] = state["mean"].round(1)
+    out["sd_m3"] = np.sqrt(state["m2"] / max(state["count"] - 1, 1)).round(1)
+    for q, values in sketch_quantiles(state, low, log_gamma).items():
+        out[f"p{round(q * 100):02d}_m3"] = values.round(1)
+    out["outside_sketch_share"] = outside_share(state)
+    return out
+
+##################################################
+# 6) Run the Simulation
+##################################################
+
+# Usage: python water_uncertainty_v1.py [datacenter_map_data.csv]
+#   MC_DRAWS=1000000 MC_WORKERS=8 MC_SEED=1
+if __name__ == "__main__":
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else "datacenter_map_data.csv"
+    facilities = pd.read_csv(snapshot_path, low_memory=False)
+    start_time = time.perf_counter()
+    by_facility, by_country = run_monte_carlo(facilities)
+    print(f"{MC_DRAWS} draws x {len(facilities)} facilities on {MC_WORKERS} workers "
+          f"in {time.perf_counter() - start_time:.1f}s")
+    by_facility.to_csv(MC_FACILITY_PATH, index=False)
+    by_country.to_csv(MC_COUNTRY_PATH, index=False)
+    outside = (by_facility["outside_sketch_share"] > 0).sum()
+    if outside:
+        print(f"{outside} facilities had draws outside their sketch range (see outside_sketch_share)")
+    print(by_country.sort_values("mean_m3", ascending=False).head(15).to_string(index=False))